@@ -0,0 +1,99 @@
+"""
+Synthetic decks for the benchmarks.
+
+A deck is a state.json dict like the one PromptDeck.save_state() writes, with
+a mix of typed text contexts and file contexts pointing at generated source
+files of a given size.
+"""
+import os
+import random
+from typing import Dict, List
+
+# Roughly source-code shaped lines, so compaction/snippets/outlines have work to do
+_LINES = [
+    "def handle_{n}(request, retries=3):",
+    "    \"\"\"Process request {n} and return the response\"\"\"",
+    "    # Validate the payload before doing anything expensive",
+    "    payload = request.get('payload', {{}})",
+    "    if not payload:",
+    "        raise ValueError('empty payload for {n}')",
+    "    result = [item * {n} for item in payload.get('items', [])]",
+    "    return {{'id': {n}, 'result': result}}",
+    "",
+    "class Worker{n}:",
+    "    timeout = {n}",
+    "",
+]
+
+TEXT_CONTEXT_CHARS = 2000
+
+
+def parse_size(text: str) -> int:
+    """Parse "4KB", "1MB" or a plain byte count"""
+    text = text.strip().upper()
+    for suffix, factor in (("MB", 1024 * 1024), ("KB", 1024), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+
+def format_size(nbytes: int) -> str:
+    if nbytes >= 1024 * 1024 and nbytes % (1024 * 1024) == 0:
+        return f"{nbytes // (1024 * 1024)}MB"
+    if nbytes >= 1024 and nbytes % 1024 == 0:
+        return f"{nbytes // 1024}KB"
+    return f"{nbytes}B"
+
+
+def source_text(size: int, seed: int = 0) -> str:
+    """About `size` bytes of Python-looking text"""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    n = seed * 100000
+    while total < size:
+        n += 1
+        for template in _LINES:
+            line = template.format(n=n + rng.randrange(1000))
+            lines.append(line)
+            total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def write_files(directory: str, count: int, size: int) -> List[str]:
+    """Write `count` distinct files of `size` bytes, reusing ones from earlier runs"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"module_{format_size(size)}_{index:04d}.py")
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, "w", encoding="utf-8", newline="\n") as f:
+                f.write(source_text(size, seed=index))
+        paths.append(path)
+    return paths
+
+
+def make_deck(directory: str, contexts: int, file_size: int, file_ratio: float = 0.5) -> Dict:
+    """
+    State for a deck of `contexts` contexts; `file_ratio` of them are file
+    contexts backed by distinct files of `file_size` bytes under `directory`.
+    """
+    file_count = int(round(contexts * file_ratio))
+    paths = write_files(directory, file_count, file_size)
+    deck_contexts = []
+    for index in range(contexts):
+        if index % 2 == 1 and paths:
+            path = paths.pop()
+            deck_contexts.append({"is_file": True, "file_path": path, "name": os.path.basename(path)})
+        else:
+            deck_contexts.append({"name": f"Notes {index}",
+                                  "content": source_text(TEXT_CONTEXT_CHARS, seed=-index - 1)})
+    # Odd/even interleaving leaves files over when file_ratio > 0.5
+    for path in paths:
+        deck_contexts.append({"is_file": True, "file_path": path, "name": os.path.basename(path)})
+    return {
+        "main_prompt": "Review the following code for {{focus=performance}} issues.",
+        "contexts": deck_contexts,
+        "splitter_sizes": [200, 300],
+        "geometry": {"x": 0, "y": 0, "width": 520, "height": 600},
+    }
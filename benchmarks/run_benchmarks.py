@@ -0,0 +1,316 @@
+"""
+Benchmarks for the operations users wait on, run with Qt offscreen.
+
+    python benchmarks/run_benchmarks.py                  # 10, 100 and 1000 contexts
+    python benchmarks/run_benchmarks.py --quick          # smaller sweeps, for a quick check
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<run>.json
+
+Two sweeps are run: the number of contexts (small files) and the size of the
+files (small deck). Every run is saved under benchmarks/results/ and compared
+with the previous one (or --compare); operations that got more than
+--threshold slower are reported as regressions.
+
+The app's state directory is redirected to a temporary one, so your own
+state.json is never touched.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+sys.path.insert(0, BENCH_DIR)
+
+from PyQt6.QtCore import QT_VERSION_STR, QEventLoop  # noqa: E402
+from PyQt6.QtTest import QTest  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from deck_generator import format_size, make_deck, parse_size  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Operations in report order
+OPERATIONS = (
+    "add_context",          # adding N text contexts one by one
+    "handle_file_drops",    # dropping all of the deck's files at once
+    "clear_contexts",       # removing every context at once
+    "load_state",
+    "save_state",
+    "reorder_contexts",     # moving one context to the end
+    "get_formatted_text",   # warm caches, prompt built ahead
+    "copy_to_clipboard",    # warm caches, prompt built ahead
+    "copy_cold",            # file cache and prepared prompt dropped first
+    "typing_context",       # one keystroke in a context
+    "typing_main_prompt",   # one keystroke in the main prompt
+)
+
+TYPED_TEXT = "benchmark typing "
+
+
+def drain(app: QApplication):
+    """Let queued events, deferred deletes and zero-delay timers run"""
+    for _ in range(3):
+        app.processEvents()
+
+
+def timed(app: QApplication, fn: Callable[[], None], repeat: int,
+          setup: Optional[Callable[[], None]] = None) -> float:
+    """Median wall time of `fn` in milliseconds; event processing between runs isn't counted"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        drain(app)
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    drain(app)
+    return statistics.median(samples)
+
+
+def until_done(app: QApplication, start: Callable[[Callable[[], None]], None]) -> Callable[[], None]:
+    """A call of `start(then)` that returns once it calls `then`, for operations finished on the event loop"""
+    def run():
+        done = []
+        start(lambda: done.append(True))
+        while not done:
+            app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 5)
+    return run
+
+
+def typing_latency(app: QApplication, widget) -> float:
+    """Median time for one keystroke, including everything textChanged runs synchronously"""
+    widget.setFocus()
+    samples = []
+    for char in TYPED_TEXT:
+        start = time.perf_counter()
+        QTest.keyClick(widget, char)
+        samples.append((time.perf_counter() - start) * 1000)
+    drain(app)
+    return statistics.median(samples)
+
+
+def bench_deck(app: QApplication, data_dir: str, files_dir: str, contexts: int,
+               file_size: int, repeat: int) -> Dict[str, float]:
+    """Run every operation against a synthetic deck; returns op -> ms"""
+    from prompt_deck.prompt_deck import PromptDeck
+    from prompt_deck.send_history import CLIPBOARD
+    from prompt_deck.file_cache import file_cache
+
+    state = make_deck(files_dir, contexts, file_size)
+    file_paths = [c["file_path"] for c in state["contexts"] if c.get("is_file")]
+    state_file = os.path.join(data_dir, "state.json")
+    if os.path.exists(state_file):
+        os.remove(state_file)
+
+    results = {}
+    deck = PromptDeck()
+    try:
+        # Building a deck by hand
+        results["add_context"] = timed(app, lambda: [deck.add_context() for _ in range(contexts)], 1)
+        for context in list(deck.contexts):
+            deck.remove_context(context)
+        drain(app)
+
+        results["handle_file_drops"] = timed(app, lambda: deck.handle_file_drops(file_paths), 1)
+        results["clear_contexts"] = timed(app, lambda: deck.remove_contexts(deck.contexts), 1)
+        drain(app)
+
+        # Restoring the generated deck
+        with open(state_file, "w") as f:
+            json.dump(state, f)
+        results["load_state"] = timed(app, deck.load_state, repeat)
+        results["save_state"] = timed(app, deck.save_state, repeat)
+
+        def move_first_to_end():
+            deck.reorder_contexts(deck.contexts[0].id, deck.contexts[-1].id)
+        results["reorder_contexts"] = timed(app, move_first_to_end, repeat)
+
+        results["get_formatted_text"] = timed(app, deck.get_formatted_text, repeat)
+        # Copies finish on the event loop once changed files are read
+        copy = until_done(app, lambda then: deck.copy_for_target(CLIPBOARD, then))
+        results["copy_to_clipboard"] = timed(app, copy, repeat)
+
+        def drop_caches():
+            file_cache.clear()
+            deck.discard_assembly()
+        results["copy_cold"] = timed(app, copy, repeat, setup=drop_caches)
+
+        middle = deck.contexts[len(deck.contexts) // 2]
+        text_context = next((c for c in deck.contexts if not getattr(c, "file_path", None)), middle)
+        results["typing_context"] = typing_latency(app, text_context.content_input)
+        results["typing_main_prompt"] = typing_latency(app, deck.main_prompt)
+    finally:
+        deck.hide()
+        deck.deleteLater()
+        drain(app)
+        file_cache.clear()
+    return results
+
+
+#
+# Reporting
+#
+def scaling_exponent(points: List[float], values: List[Optional[float]]) -> Optional[float]:
+    """Least-squares slope on log-log axes: ~1 is linear, ~2 quadratic"""
+    pairs = [(math.log(x), math.log(y)) for x, y in zip(points, values) if y and y > 0]
+    if len(pairs) < 2:
+        return None
+    mean_x = sum(x for x, _ in pairs) / len(pairs)
+    mean_y = sum(y for _, y in pairs) / len(pairs)
+    denominator = sum((x - mean_x) ** 2 for x, _ in pairs)
+    if not denominator:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in pairs) / denominator
+
+
+def print_sweep(name: str, sweep: Dict):
+    labels = sweep["labels"]
+    width = max(len(op) for op in OPERATIONS) + 2
+    print(f"\n{name} (ms, median)")
+    print("".ljust(width) + "".join(label.rjust(11) for label in labels) + "    scaling")
+    for op in OPERATIONS:
+        values = sweep["results"].get(op)
+        if not values:
+            continue
+        exponent = scaling_exponent(sweep["points"], values)
+        cells = "".join((f"{v:11.2f}" if v is not None else "          -") for v in values)
+        print(op.ljust(width) + cells + (f"    ~n^{exponent:.2f}" if exponent is not None else ""))
+
+
+def compare(current: Dict, previous: Dict, threshold: float, min_delta: float) -> List[str]:
+    """Operations that got slower than `threshold` (relative) and `min_delta` ms"""
+    regressions = []
+    for sweep_name, sweep in current["sweeps"].items():
+        old_sweep = previous.get("sweeps", {}).get(sweep_name)
+        if not old_sweep:
+            continue
+        for op, values in sweep["results"].items():
+            old_values = dict(zip(old_sweep["labels"], old_sweep["results"].get(op, [])))
+            for label, value in zip(sweep["labels"], values):
+                old = old_values.get(label)
+                if value is None or not old:
+                    continue
+                if value > old * (1 + threshold) and value - old > min_delta:
+                    regressions.append(f"{sweep_name} {label} {op}: {old:.2f} -> {value:.2f} ms "
+                                       f"({value / old:.2f}x)")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "-C", BENCH_DIR, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def latest_result(exclude: str = "") -> Optional[str]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    runs = sorted(name for name in os.listdir(RESULTS_DIR)
+                  if name.endswith(".json") and os.path.join(RESULTS_DIR, name) != exclude)
+    return os.path.join(RESULTS_DIR, runs[-1]) if runs else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--contexts", default="10,100,1000",
+                        help="Deck sizes for the context sweep (default: 10,100,1000)")
+    parser.add_argument("--file-sizes", default="4KB,256KB,1MB,4MB",
+                        help="File sizes for the file size sweep (default: 4KB,256KB,1MB,4MB)")
+    parser.add_argument("--small-file", default="4KB", help="File size used in the context sweep")
+    parser.add_argument("--small-deck", type=int, default=10, help="Deck size used in the file size sweep")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per operation, the median is kept")
+    parser.add_argument("--quick", action="store_true", help="Shorthand for --contexts 10,100 "
+                        "--file-sizes 4KB,1MB --repeat 3")
+    parser.add_argument("--compare", help="Result file to compare against (default: the previous run)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Relative slowdown reported as a regression (default: 0.25)")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="Ignore slowdowns smaller than this many ms (default: 1.0)")
+    parser.add_argument("--no-save", action="store_true", help="Don't store this run")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with 1 on regressions")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.contexts, args.file_sizes, args.repeat = "10,100", "4KB,1MB", 3
+    context_points = [int(n) for n in args.contexts.split(",")]
+    size_points = [parse_size(s) for s in args.file_sizes.split(",")]
+
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    # Keep the app away from the real state.json
+    import prompt_deck.prompt_deck as deck_module
+    data_dir = tempfile.mkdtemp(prefix="prompt-deck-bench-")
+    deck_module.user_data_dir = lambda *args, **kwargs: data_dir
+    files_dir = os.path.join(tempfile.gettempdir(), "prompt-deck-bench-files")
+
+    sweeps = {}
+    try:
+        sweeps["contexts"] = {"points": context_points, "labels": [str(n) for n in context_points],
+                              "results": {}}
+        for n in context_points:
+            print(f"Deck of {n} contexts, {args.small_file} files...", flush=True)
+            for op, ms in bench_deck(app, data_dir, files_dir, n, parse_size(args.small_file),
+                                     args.repeat).items():
+                sweeps["contexts"]["results"].setdefault(op, []).append(ms)
+
+        sweeps["file_size"] = {"points": size_points, "labels": [format_size(s) for s in size_points],
+                               "results": {}}
+        for size in size_points:
+            print(f"Deck of {args.small_deck} contexts, {format_size(size)} files...", flush=True)
+            for op, ms in bench_deck(app, data_dir, files_dir, args.small_deck, size, args.repeat).items():
+                sweeps["file_size"]["results"].setdefault(op, []).append(ms)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "sweeps": sweeps,
+    }
+
+    print_sweep("Context count", sweeps["contexts"])
+    print_sweep("File size", sweeps["file_size"])
+
+    saved = ""
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S") + (f"-{run['revision']}" if run["revision"] else "")
+        saved = os.path.join(RESULTS_DIR, name + ".json")
+        with open(saved, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved {saved}")
+
+    baseline = args.compare or latest_result(exclude=saved)
+    if not baseline:
+        return 0
+    with open(baseline) as f:
+        previous = json.load(f)
+    regressions = compare(run, previous, args.threshold, args.min_delta)
+    print(f"\nCompared with {os.path.basename(baseline)} ({previous.get('revision') or 'unknown revision'}):")
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    if not regressions:
+        print("  no regressions")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+The assembled prompt, built ahead of time.
+
+Building the prompt walks every context, reads files, renders templates,
+dedupes, masks secrets and packs. An Assembly is the result of one build,
+together with a key of everything it was built from: the main prompt,
+template values, settings, and per context its record revision, file
+signature or git result. The deck keeps the last one and rebuilds it when
+the user has been idle for IDLE_DELAY_MS after an edit (or comes back to
+the window), resolving git contexts again first, so Copy, Preview and the
+site buttons usually just check the key and hand over the text. If
+anything changed since, they read the changed files on the loader pool
+and rebuild when those are in; git isn't run again for a copy.
+
+Each context's block is cached on its record the same way (see
+PromptDeck.render_key), so a rebuild after one edit only re-renders that
+context. Building ahead reads the file and stored-text blocks on the
+loader pool first and only puts the prompt together on the GUI thread.
+"""
+from typing import List, Optional, Tuple
+
+from .context_block import ContextBlock
+from .packer import PackDecision
+
+# Rebuild this long after the last edit
+IDLE_DELAY_MS = 400
+# How often a copy checks again for contexts still being set up
+LOAD_POLL_MS = 50
+
+
+class Assembly:
+    """One build of the prompt"""
+
+    __slots__ = ("key", "main_text", "blocks", "text", "decisions", "sent", "skipped", "messages", "notes")
+
+    def __init__(self, main_text: str, key: Optional[Tuple] = None):
+        self.key = key  # None if it can't be reused
+        self.main_text = main_text
+        # Blocks as pasted, in order, and the whole prompt
+        self.blocks: List[ContextBlock] = []
+        self.text = ""
+        self.decisions: List[PackDecision] = []
+        # Blocks as they'd be sent in full, and the contexts the packer cut, for the send history
+        self.sent: List[ContextBlock] = []
+        self.skipped: List[int] = []
+        # Status bar messages, and short notes for the copy message
+        self.messages: List[str] = []
+        self.notes: List[str] = []
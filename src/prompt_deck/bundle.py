@@ -0,0 +1,212 @@
+"""
+.deck bundles: a deck and the files it uses, in one file to share or archive.
+
+A bundle is a zip archive:
+
+    manifest.json               format, main prompt, template values, settings and
+                                the saved state of each context
+    contexts/0003.txt           text of context 3 (typed or stored text, or a git snapshot)
+    files/0005/report.log       snapshot of the file behind file context 5
+
+A zip's central directory lists every member and where it starts, so any
+member can be read without touching the rest. Opening a bundle reads the
+directory and the manifest; text contexts are read as they're created and
+each file snapshot is extracted on its own, in the background, into a
+folder per bundle under the cache directory, reused when the same bundle is
+opened again. Snapshots over STORE_THRESHOLD are stored uncompressed, so
+extracting them is a plain copy. Text contexts stored on disk (see
+spill.py) are copied in from their spill file the same way.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+FORMAT = "prompt-deck-bundle"
+VERSION = 1
+EXTENSION = ".deck"
+MANIFEST = "manifest.json"
+
+# Deck settings carried in the manifest; machine-specific ones (and redaction strings) stay behind
+SETTINGS = ("dedupe_contexts", "pack_to_budget", "token_budget", "stable_order")
+
+# Larger snapshots are stored, not deflated
+STORE_THRESHOLD = 4 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+# Extraction folders kept for recently opened bundles
+MAX_CACHED_BUNDLES = 8
+
+# Member names write_bundle produces; a manifest naming anything else isn't trusted
+FILE_MEMBER = re.compile(r"files/\d{4,}/[^/\\]+")
+CONTENT_MEMBER = re.compile(r"contexts/\d{4,}\.txt")
+
+
+class BundleError(ValueError):
+    """Not a deck bundle, or one written by a newer version"""
+
+
+def _safe_name(name: str) -> str:
+    """A file name that can't escape its folder inside the archive"""
+    name = os.path.basename(name.replace("\\", "/")) or "file"
+    return name if name not in (".", "..") else "file"
+
+
+def check_member(member, pattern) -> str:
+    """`member` if it's a name matching `pattern` (FILE_MEMBER or CONTENT_MEMBER), else BundleError"""
+    if not isinstance(member, str) or not pattern.fullmatch(member) or member.rsplit("/", 1)[1] in (".", ".."):
+        raise BundleError(f"Not a valid bundle member: {member!r}")
+    return member
+
+
+def write_bundle(path: str, state: Dict, snapshots: Optional[Dict[int, str]] = None) -> Tuple[int, List[str]]:
+    """
+    Write the deck `state` (as from PromptDeck.get_state) and the files its
+    file contexts use to a bundle at `path`. `snapshots` holds the current
+    text of contexts that can't be re-read elsewhere (git contexts), by
+    index. Returns the number of files included and the paths that were
+    missing (those contexts keep their original path).
+    """
+    snapshots = snapshots or {}
+    contexts = []
+    members: Dict[str, str] = {}  # file path -> member, a file used twice is stored once
+    missing = []
+    temp_path = path + ".tmp"
+    try:
+        with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for index, data in enumerate(state.get("contexts", [])):
+                entry = dict(data)
+                file_path = entry.pop("file_path", "") if entry.get("is_file") else ""
+                if file_path:
+                    member = members.get(file_path)
+                    if member is None and os.path.isfile(file_path):
+                        member = f"files/{index:04d}/{_safe_name(file_path)}"
+                        size = os.path.getsize(file_path)
+                        zf.write(file_path, member,
+                                 zipfile.ZIP_STORED if size > STORE_THRESHOLD else zipfile.ZIP_DEFLATED)
+                        members[file_path] = member
+                    if member is not None:
+                        entry["bundle_file"] = member
+                    else:
+                        missing.append(file_path)
+                    entry["original_path"] = file_path
+                elif entry.get("spill_path"):
+                    spill_path = entry.pop("spill_path")
+                    if os.path.isfile(spill_path):
+                        member = f"contexts/{index:04d}.txt"
+                        size = os.path.getsize(spill_path)
+                        zf.write(spill_path, member,
+                                 zipfile.ZIP_STORED if size > STORE_THRESHOLD else zipfile.ZIP_DEFLATED)
+                        entry["content_file"] = member
+                    else:
+                        missing.append(spill_path)
+                elif "content" in entry or index in snapshots:
+                    member = f"contexts/{index:04d}.txt"
+                    zf.writestr(member, snapshots.get(index, entry.pop("content", "")))
+                    entry["content_file"] = member
+                contexts.append(entry)
+
+            manifest = {
+                "format": FORMAT,
+                "version": VERSION,
+                "main_prompt": state.get("main_prompt", ""),
+                "template_variables": state.get("template_variables", {}),
+                "settings": state.get("settings", {}),
+                "contexts": contexts,
+            }
+            zf.writestr(MANIFEST, json.dumps(manifest, indent=2))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(members), missing
+
+
+class Bundle:
+    """An open bundle; members are read when asked for"""
+
+    def __init__(self, path: str, cache_root: str):
+        self.path = path
+        try:
+            self.zip = zipfile.ZipFile(path)  # Reads the central directory only
+            data = self.zip.read(MANIFEST)
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise BundleError(f"Not a deck bundle: {path} ({e})")
+        try:
+            self.manifest = json.loads(data)
+        except ValueError as e:
+            raise BundleError(f"Damaged manifest in {path}: {e}")
+        if self.manifest.get("format") != FORMAT:
+            raise BundleError(f"Not a deck bundle: {path}")
+        if int(self.manifest.get("version", 0)) > VERSION:
+            raise BundleError(f"{path} was written by a newer version of Prompt Deck")
+
+        # Same manifest and member checksums: same bundle, reuse what was extracted
+        digest = hashlib.sha1(data)
+        for info in self.zip.infolist():
+            digest.update(f"{info.filename}:{info.CRC}:{info.file_size}".encode("utf-8"))
+        self.cache_root = Path(cache_root)
+        self.cache_dir = self.cache_root / digest.hexdigest()[:16]
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        os.utime(self.cache_dir)  # Marks it recently opened for prune_cache
+        self.lock = threading.Lock()
+
+    @property
+    def contexts(self) -> List[Dict]:
+        return list(self.manifest.get("contexts", []))
+
+    def read_text(self, member: str) -> str:
+        check_member(member, CONTENT_MEMBER)
+        with self.lock:
+            return self.zip.read(member).decode("utf-8", errors="replace")
+
+    def extract(self, member: str, token=None) -> str:
+        """
+        Extract one file snapshot (if it isn't already) and return its path.
+        Raises LoadCancelled if the loader `token` is cancelled meanwhile.
+        """
+        check_member(member, FILE_MEMBER)
+        info = self.zip.getinfo(member)
+        target = (self.cache_dir / member).resolve()
+        root = str(self.cache_dir.resolve())
+        if os.path.commonpath([root, str(target)]) != root:
+            raise BundleError(f"Bundle member outside the extraction folder: {member!r}")
+        if target.is_file() and target.stat().st_size == info.file_size:
+            return str(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(target.name + ".part")
+        with self.lock:
+            # Opened members share the archive's file handle, one at a time
+            source = self.zip.open(info)
+        try:
+            with source, open(temp, "wb") as out:
+                while True:
+                    if token is not None:
+                        token.check()
+                    with self.lock:
+                        chunk = source.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            os.replace(temp, target)
+        finally:
+            if temp.exists():
+                temp.unlink()
+        return str(target)
+
+    def close(self):
+        self.zip.close()
+
+
+def prune_cache(cache_root: str, keep: int = MAX_CACHED_BUNDLES):
+    """Remove the extraction folders of all but the `keep` most recently opened bundles"""
+    root = Path(cache_root)
+    if not root.is_dir():
+        return
+    folders = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    for folder in folders[keep:]:
+        shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,92 @@
+import time
+
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QCheckBox,
+                             QListWidget, QListWidgetItem)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont
+
+from .styles import FONT_FAMILY
+from .clipboard_history import MAX_CHARS, MAX_ENTRIES
+from .memory import format_bytes
+
+TOOLTIP_CHARS = 500
+
+
+class ClipboardDialog(QDialog):
+    """
+    Recent clipboard texts; double-click (or Enter on) an entry to add it to
+    the deck as a context.
+    """
+
+    def __init__(self, deck):
+        super().__init__(deck)
+        self.deck = deck
+        self.setWindowTitle("Clipboard History")
+        self.setWindowFlag(Qt.WindowType.Tool)
+        self.setMinimumSize(420, 360)
+        font = QFont(FONT_FAMILY, 9)
+
+        layout = QVBoxLayout(self)
+
+        self.capture_box = QCheckBox("Capture clipboard")
+        self.capture_box.setToolTip(f"Keep the last {MAX_ENTRIES} texts copied in other apps "
+                                    f"(up to {format_bytes(MAX_CHARS)} of text, never saved)")
+        self.capture_box.setChecked(deck.clipboard_watcher.enabled)
+        self.capture_box.toggled.connect(deck.set_clipboard_capture)
+        layout.addWidget(self.capture_box)
+
+        self.list = QListWidget()
+        self.list.setFont(font)
+        self.list.itemActivated.connect(self.add_item)
+        layout.addWidget(self.list)
+
+        self.summary_label = QLabel("")
+        self.summary_label.setFont(font)
+        self.summary_label.setStyleSheet("color: #7f8c8d;")
+        layout.addWidget(self.summary_label)
+
+        buttons_layout = QHBoxLayout()
+        add_btn = QPushButton("Add as Context")
+        add_btn.clicked.connect(lambda: self.add_item(self.list.currentItem()))
+        buttons_layout.addWidget(add_btn)
+        remove_btn = QPushButton("Remove")
+        remove_btn.clicked.connect(self.remove_selected)
+        buttons_layout.addWidget(remove_btn)
+        clear_btn = QPushButton("Clear")
+        clear_btn.clicked.connect(self.clear_history)
+        buttons_layout.addWidget(clear_btn)
+        buttons_layout.addStretch()
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.hide)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+
+        deck.clipboard_watcher.captured.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self, *args):
+        ring = self.deck.clipboard_ring
+        self.list.clear()
+        for entry in ring:
+            when = time.strftime("%H:%M", time.localtime(entry.taken))
+            item = QListWidgetItem(f"{when}  {entry.preview}  ({len(entry.text)} chars)")
+            item.setData(Qt.ItemDataRole.UserRole, entry)
+            item.setToolTip(entry.text[:TOOLTIP_CHARS])
+            self.list.addItem(item)
+        if self.list.count():
+            self.list.setCurrentRow(0)
+        self.summary_label.setText(f"{len(ring)} entries, {ring.chars} chars")
+
+    def add_item(self, item):
+        if item is not None:
+            self.deck.add_clipboard_context(item.data(Qt.ItemDataRole.UserRole))
+
+    def remove_selected(self):
+        item = self.list.currentItem()
+        if item is not None:
+            self.deck.clipboard_ring.remove(item.data(Qt.ItemDataRole.UserRole))
+            self.refresh()
+
+    def clear_history(self):
+        self.deck.clipboard_ring.clear()
+        self.refresh()
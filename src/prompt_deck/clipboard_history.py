@@ -0,0 +1,153 @@
+"""
+Recent clipboard texts, to turn into contexts.
+
+While capture is on, ClipboardWatcher records what other apps copy into a
+ClipboardRing:
+
+    - bursts of clipboard changes are coalesced, the clipboard is read once
+      they settle
+    - entries are deduplicated: copying the same text again moves it to the
+      front instead of storing it twice
+    - the ring is capped both by entry count and by total characters; the
+      oldest entries are dropped first, and single copies larger than the
+      character cap are never kept
+    - the deck's own copies are skipped
+
+Nothing is written to disk.
+"""
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QApplication
+
+MAX_ENTRIES = 50
+MAX_CHARS = 2 * 1024 * 1024  # Total over all entries
+COALESCE_DELAY = 250  # ms
+PREVIEW_CHARS = 80
+
+
+def text_key(text: str) -> Tuple[int, int]:
+    # str hashes are computed once per string and cached, so this is cheap
+    return len(text), hash(text)
+
+
+class ClipEntry:
+    __slots__ = ("text", "key", "taken")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.key = text_key(text)
+        self.taken = time.time()
+
+    @property
+    def preview(self) -> str:
+        """First non-empty line, shortened"""
+        line = next((line.strip() for line in self.text.splitlines() if line.strip()), "")
+        return line if len(line) <= PREVIEW_CHARS else line[:PREVIEW_CHARS - 3] + "..."
+
+
+class ClipboardRing:
+    """Bounded, deduplicated history of texts, newest first"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_chars: int = MAX_CHARS):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        # Oldest first, so eviction pops from the front
+        self.entries: "OrderedDict[Tuple[int, int], ClipEntry]" = OrderedDict()
+        self.chars = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[ClipEntry]:
+        return reversed(self.entries.values())
+
+    def latest(self) -> Optional[ClipEntry]:
+        if not self.entries:
+            return None
+        return next(reversed(self.entries.values()))
+
+    def add(self, text: str) -> Optional[ClipEntry]:
+        """Record `text`; returns its entry, None if it isn't kept (blank or too large)"""
+        if not text or not text.strip() or len(text) > self.max_chars:
+            return None
+        key = text_key(text)
+        entry = self.entries.get(key)
+        if entry is not None and entry.text == text:
+            entry.taken = time.time()
+            self.entries.move_to_end(key)
+            return entry
+        if entry is not None:
+            self.remove(entry)  # Hash collision, the newer text wins
+
+        entry = ClipEntry(text)
+        self.entries[key] = entry
+        self.chars += len(text)
+        while len(self.entries) > self.max_entries or self.chars > self.max_chars:
+            _, oldest = self.entries.popitem(last=False)
+            self.chars -= len(oldest.text)
+        return entry
+
+    def remove(self, entry: ClipEntry):
+        if self.entries.get(entry.key) is entry:
+            del self.entries[entry.key]
+            self.chars -= len(entry.text)
+
+    def clear(self):
+        self.entries.clear()
+        self.chars = 0
+
+
+class ClipboardWatcher(QObject):
+    """Feeds clipboard changes into a ring while enabled"""
+
+    captured = pyqtSignal(object)  # ClipEntry
+
+    def __init__(self, ring: ClipboardRing, parent=None):
+        super().__init__(parent)
+        self.ring = ring
+        self.enabled = False
+        # Key of a text the deck copied itself
+        self.ignored_key = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.capture)
+
+    def set_enabled(self, enabled: bool):
+        enabled = bool(enabled)
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        clipboard = QApplication.clipboard()
+        if enabled:
+            clipboard.dataChanged.connect(self.on_clipboard_changed)
+        else:
+            clipboard.dataChanged.disconnect(self.on_clipboard_changed)
+            self.timer.stop()
+
+    def ignore(self, text: str):
+        """Don't capture `text` when it shows up on the clipboard (the deck's own copy)"""
+        self.ignored_key = text_key(text)
+
+    def on_clipboard_changed(self):
+        # Only restart the timer here; the clipboard is read once changes settle
+        self.timer.start(COALESCE_DELAY)
+
+    def capture(self):
+        try:
+            clipboard = QApplication.clipboard()
+            if clipboard.ownsClipboard():
+                return  # Copied from this app
+            mime = clipboard.mimeData()
+            if mime is None or not mime.hasText():
+                return
+            text = mime.text()
+            if text_key(text) == self.ignored_key:
+                return
+            entry = self.ring.add(text)
+            if entry is not None:
+                self.captured.emit(entry)
+        except Exception as e:
+            print(f"Error capturing clipboard: {e}")
@@ -0,0 +1,423 @@
+"""
+Opt-in compaction of code contexts.
+
+Transforms remove things a model rarely needs: license headers, comments,
+runs of blank lines, wide indentation and trailing whitespace. Comment
+handling is language-aware (chosen by file extension) so strings that look
+like comments are left alone. Results are cached by content hash.
+"""
+import io
+import re
+import threading
+import tokenize
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .file_cache import content_hash
+from .packer import CHARS_PER_TOKEN
+from .perf import perf
+
+# Transform name -> label, in the order they're applied
+TRANSFORMS = OrderedDict([
+    ("license_header", "Strip license header"),
+    ("comments", "Strip comments"),
+    ("trailing_whitespace", "Remove trailing whitespace"),
+    ("blank_lines", "Collapse blank lines"),
+    ("indentation", "Narrow indentation"),
+])
+
+# Comment syntax per language: (line comment prefixes, block comment pairs, string quotes)
+COMMENT_SYNTAX = {
+    "python": (("#",), (), ('"""', "'''", '"', "'")),
+    "c": (("//",), (("/*", "*/"),), ('"', "'", "`")),
+    "css": ((), (("/*", "*/"),), ('"', "'")),
+    "scss": (("//",), (("/*", "*/"),), ('"', "'")),
+    "shell": (("#",), (), ('"', "'")),
+    "sql": (("--",), (("/*", "*/"),), ("'", '"')),
+    "lua": (("--",), (("--[[", "]]"),), ('"', "'")),
+    "html": ((), (("<!--", "-->"),), ()),
+}
+
+# File extension -> language
+LANGUAGES = {
+    ".py": "python", ".pyw": "python", ".pyi": "python",
+    ".c": "c", ".h": "c", ".cc": "c", ".cpp": "c", ".cxx": "c", ".hpp": "c",
+    ".cs": "c", ".java": "c", ".kt": "c", ".kts": "c", ".scala": "c", ".swift": "c",
+    ".go": "c", ".rs": "c", ".js": "c", ".jsx": "c", ".mjs": "c", ".cjs": "c",
+    ".ts": "c", ".tsx": "c", ".css": "css", ".scss": "scss", ".less": "scss", ".dart": "c",
+    ".php": "c", ".proto": "c",
+    ".sh": "shell", ".bash": "shell", ".zsh": "shell", ".rb": "shell", ".pl": "shell",
+    ".r": "shell", ".yaml": "shell", ".yml": "shell", ".toml": "shell", ".ini": "shell",
+    ".cfg": "shell", ".conf": "shell", ".dockerfile": "shell", ".mk": "shell",
+    ".sql": "sql", ".lua": "lua",
+    ".html": "html", ".htm": "html", ".xml": "html", ".svg": "html", ".vue": "html",
+}
+FILE_NAMES = {"dockerfile": "shell", "makefile": "shell", ".gitignore": "shell", ".env": "shell"}
+
+# Unquoted url() values in stylesheets, whose "//" (http://...) isn't a comment
+CSS_URL = r"(?i:url)\(\s*[^\s'\")][^)]*\)"
+CSS_LANGUAGES = ("css", "scss")
+
+# Languages with /regex/ literals (JavaScript and TypeScript are "c"), whose "/*" or "//" isn't a comment.
+# A "/" starts one after these characters or keywords, elsewhere it divides
+REGEX_LANGUAGES = ("c",)
+REGEX_AFTER_CHARS = "(,=:[!&|?{};+-*%<>~^"
+REGEX_AFTER_WORDS = re.compile(r"(?:^|[^\w$])(?:return|typeof|instanceof|case|do|else|in|of|void|yield|await|"
+                               r"throw|delete|new)$")
+
+# Languages where indentation carries meaning beyond nesting depth
+INDENT_SENSITIVE = ("python", "shell")
+
+# What a license header says; a comment merely mentioning a license doesn't count
+LICENSE_PATTERN = re.compile(
+    r"spdx-license-identifier|copyright\s*(?:\(c\)|©)|©|all rights reserved|"
+    r"permission is hereby granted|licensed under the|this program is free software|"
+    r"redistribution and use in source and binary forms",
+    re.IGNORECASE,
+)
+
+CACHE_SIZE = 128
+
+
+def detect_language(path: Optional[str]) -> Optional[str]:
+    """Language key for a file path, None if unknown"""
+    if not path:
+        return None
+    p = Path(path)
+    name = p.name.lower()
+    if name in FILE_NAMES:
+        return FILE_NAMES[name]
+    return LANGUAGES.get(p.suffix.lower())
+
+
+class CompactionResult:
+    """Compacted text plus how much it saved"""
+
+    __slots__ = ("text", "chars_before", "chars_after")
+
+    def __init__(self, text: str, chars_before: int):
+        self.text = text
+        self.chars_before = chars_before
+        self.chars_after = len(text)
+
+    @property
+    def chars_saved(self) -> int:
+        return self.chars_before - self.chars_after
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.chars_saved // CHARS_PER_TOKEN)
+
+    @property
+    def percent_saved(self) -> int:
+        return round(100 * self.chars_saved / self.chars_before) if self.chars_before else 0
+
+
+#
+# Comment handling
+#
+def _regex_end(text: str, i: int) -> Optional[int]:
+    """End of the /regex/ literal (with its flags) starting at `i`, None if that "/" isn't one"""
+    if text.startswith(("//", "/*"), i):
+        return None
+    before = text[:i].rstrip()
+    if before and before[-1] not in REGEX_AFTER_CHARS and not REGEX_AFTER_WORDS.search(before[-12:]):
+        return None
+    j = i + 1
+    in_class = False
+    while j < len(text):
+        char = text[j]
+        if char == "\\":
+            j += 2
+            continue
+        if char == "\n":
+            return None
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            j += 1
+            while j < len(text) and text[j].isalpha():
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def _scan_comments(text: str, language: str, strings: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int]]:
+    """Return (start, end) offsets of comments, skipping over strings (added to `strings` if given)"""
+    line_prefixes, block_pairs, quotes = COMMENT_SYNTAX[language]
+    url = re.compile(CSS_URL) if language in CSS_LANGUAGES else None
+    comments = []
+    i = 0
+    n = len(text)
+    while i < n:
+        if url is not None and text[i] in "uU":
+            match = url.match(text, i)
+            if match:
+                i = match.end()
+                continue
+        if text[i] == "/" and language in REGEX_LANGUAGES:
+            end = _regex_end(text, i)
+            if end is not None:
+                # Skipped like a string
+                if strings is not None:
+                    strings.append((i, end))
+                i = end
+                continue
+        # Strings
+        quote = next((q for q in quotes if text.startswith(q, i)), None)
+        if quote:
+            j = i + len(quote)
+            multiline = len(quote) == 3 or quote == "`"
+            while j < n:
+                if text[j] == "\\":
+                    j += 2
+                    continue
+                if text.startswith(quote, j):
+                    j += len(quote)
+                    break
+                if text[j] == "\n" and not multiline:
+                    break
+                j += 1
+            if strings is not None:
+                strings.append((i, j))
+            i = j
+            continue
+        # Block comments (checked first, "--[[" starts with "--")
+        pair = next((p for p in block_pairs if text.startswith(p[0], i)), None)
+        if pair:
+            end = text.find(pair[1], i + len(pair[0]))
+            end = n if end < 0 else end + len(pair[1])
+            comments.append((i, end))
+            i = end
+            continue
+        # Line comments ("#" only after whitespace, so "$#" or "${#x}" aren't comments)
+        prefix = next((p for p in line_prefixes if text.startswith(p, i)), None)
+        if prefix and not (prefix == "#" and i and not text[i - 1].isspace()):
+            # Keep shebangs
+            if not (i == 0 and text.startswith("#!")):
+                end = text.find("\n", i)
+                end = n if end < 0 else end
+                comments.append((i, end))
+                i = end
+                continue
+        i += 1
+    return comments
+
+
+def _python_tokens(text: str) -> Optional[Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]]:
+    """(comment, string) offsets from Python's own tokenizer, None if it can't tokenize"""
+    line_starts = [0]
+    for line in text.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+    comments = []
+    strings = []
+    # f-strings are several tokens from Python 3.12 on
+    fstring_start = getattr(tokenize, "FSTRING_START", None)
+    fstring_end = getattr(tokenize, "FSTRING_END", None)
+    opened = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(text).readline):
+            (row, col), (end_row, end_col) = token.start, token.end
+            start, end = line_starts[row - 1] + col, line_starts[end_row - 1] + end_col
+            if token.type == tokenize.COMMENT:
+                if row == 1 and token.string.startswith("#!"):
+                    continue
+                comments.append((start, end))
+            elif token.type == tokenize.STRING:
+                strings.append((start, end))
+            elif token.type == fstring_start:
+                opened.append(start)
+            elif token.type == fstring_end and opened:
+                strings.append((opened.pop(), end))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    return comments, strings
+
+
+def _string_spans(text: str, language: Optional[str]) -> List[Tuple[int, int]]:
+    """(start, end) offsets of the string literals in `text`"""
+    if language not in COMMENT_SYNTAX:
+        return []
+    tokens = _python_tokens(text) if language == "python" else None
+    if tokens is not None:
+        return tokens[1]
+    strings = []
+    _scan_comments(text, language, strings)
+    return strings
+
+
+def _remove_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    """Remove spans from text but keep their newlines so lines stay aligned"""
+    pieces = []
+    position = 0
+    for start, end in spans:
+        pieces.append(text[position:start])
+        pieces.append("\n" * text.count("\n", start, end))
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def strip_comments(text: str, language: Optional[str]) -> str:
+    if language not in COMMENT_SYNTAX:
+        return text
+    tokens = _python_tokens(text) if language == "python" else None
+    spans = tokens[0] if tokens is not None else None
+    if spans is None:
+        spans = _scan_comments(text, language)
+    if not spans:
+        return text
+
+    stripped = _remove_spans(text, spans)
+    # Drop lines that only held a comment, keep lines that were blank before
+    result = []
+    for original, line in zip(text.split("\n"), stripped.split("\n")):
+        if line.strip() or not original.strip():
+            result.append(line.rstrip() if line != original else line)
+    return "\n".join(result)
+
+
+def strip_license_header(text: str, language: Optional[str]) -> str:
+    """
+    Remove a leading comment block of several lines that carries a license:
+    an SPDX tag, a "Copyright (c)" line or a license's own wording
+    """
+    if language not in COMMENT_SYNTAX:
+        return text
+    line_prefixes, block_pairs, _ = COMMENT_SYNTAX[language]
+    lines = text.split("\n")
+
+    # Keep shebang / encoding lines
+    start = 0
+    while start < len(lines) and (lines[start].startswith("#!") or
+                                  (lines[start].startswith("#") and "coding" in lines[start][:40])):
+        start += 1
+
+    body = "\n".join(lines[start:])
+    stripped_body = body.lstrip()
+    header_end = None
+
+    pair = next((p for p in block_pairs if stripped_body.startswith(p[0])), None)
+    if pair:
+        close = stripped_body.find(pair[1])
+        if close >= 0:
+            header_end = (len(body) - len(stripped_body)) + close + len(pair[1])
+    elif line_prefixes:
+        end = 0
+        for line in body.split("\n"):
+            candidate = line.strip()
+            if candidate and not any(candidate.startswith(p) for p in line_prefixes):
+                break
+            end += len(line) + 1
+        header_end = min(end, len(body)) if end else None
+
+    if not header_end:
+        return text
+    header = body[:header_end].strip()
+    if "\n" not in header or not LICENSE_PATTERN.search(header):
+        return text
+    return "\n".join(lines[:start] + [body[header_end:].lstrip("\n")])
+
+
+#
+# Whitespace handling
+#
+def strip_trailing_whitespace(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.split("\n"))
+
+
+def collapse_blank_lines(text: str) -> str:
+    """Collapse runs of blank lines into one"""
+    return re.sub(r"\n(?:[ \t]*\n){2,}", "\n\n", text).strip("\n") + ("\n" if text.endswith("\n") else "")
+
+
+def narrow_indentation(text: str, language: Optional[str], width: int = 1) -> str:
+    """
+    Re-indent with `width` spaces per level. The indent unit is detected from
+    the file; lines that aren't a multiple of it keep their extra spaces.
+    Lines that start inside a string literal are part of it and left alone.
+    """
+    lines = text.split("\n")
+    # Offsets of the line starts inside strings
+    inside = set()
+    spans = _string_spans(text, language)
+    if spans:
+        line_start = 0
+        span = 0
+        for index, line in enumerate(lines):
+            while span < len(spans) and spans[span][1] <= line_start:
+                span += 1
+            if span < len(spans) and spans[span][0] < line_start:
+                inside.add(index)
+            line_start += len(line) + 1
+
+    # Line index -> (indent width with tabs as 4 spaces, length of the indent)
+    indented = {}
+    for index, line in enumerate(lines):
+        body = line.lstrip(" \t")
+        if body and index not in inside:
+            size = len(line) - len(body)
+            indented[index] = (len(line[:size].expandtabs(4)), size)
+    indents = [depth for depth, _ in indented.values() if depth]
+    if not indents:
+        return text
+
+    unit = min(indents)
+    # Files with irregular indentation (alignment etc.) in indent-sensitive
+    # languages are left alone rather than risk changing their meaning
+    if language in INDENT_SENSITIVE and any(d % unit for d in indents):
+        return text
+    if unit <= width:
+        return text
+
+    result = list(lines)
+    for index, (depth, size) in indented.items():
+        if depth:
+            levels, extra = divmod(depth, unit)
+            result[index] = " " * (levels * width + extra) + lines[index][size:]
+    return "\n".join(result)
+
+
+_cache: "OrderedDict[Tuple[str, Tuple[str, ...], Optional[str]], CompactionResult]" = OrderedDict()
+# File contexts are also compacted on the loader pool, when the prompt is built ahead
+_cache_lock = threading.Lock()
+
+
+def compact(text: str, transforms: Iterable[str], language: Optional[str] = None) -> CompactionResult:
+    """Apply the selected transforms (in TRANSFORMS order), cached by content hash"""
+    selected = tuple(t for t in TRANSFORMS if t in set(transforms))
+    if not selected or not text:
+        return CompactionResult(text, len(text))
+
+    key = (content_hash(text), selected, language)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            perf.cache_hit("compaction")
+            return cached
+    perf.cache_miss("compaction")
+
+    result = text
+    for transform in selected:
+        if transform == "license_header":
+            result = strip_license_header(result, language)
+        elif transform == "comments":
+            result = strip_comments(result, language)
+        elif transform == "trailing_whitespace":
+            result = strip_trailing_whitespace(result)
+        elif transform == "blank_lines":
+            result = collapse_blank_lines(result)
+        elif transform == "indentation":
+            result = narrow_indentation(result, language)
+
+    compacted = CompactionResult(result, len(text))
+    with _cache_lock:
+        _cache[key] = compacted
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compacted
@@ -0,0 +1,53 @@
+from typing import Optional
+
+from .file_cache import canonical_path, content_hash
+
+
+class ContextBlock:
+    """
+    One formatted context on its way into the final prompt.
+
+    `content` is what gets pasted, `raw` is the underlying text used for
+    comparing blocks (for a loaded file that's the file text without the
+    fence around it). `path` is set for file-backed blocks, `region` when
+    only part of the file is included (snippet, grep filter, truncation).
+    `priority` and `shrink` tell the packer how to cut the block when over
+    budget.
+    """
+
+    __slots__ = ("name", "content", "raw", "path", "region", "priority", "shrink", "context_id",
+                 "_digest", "_canonical")
+
+    def __init__(self, name: str, content: str, raw: Optional[str] = None,
+                 path: Optional[str] = None, region: Optional[str] = None, priority: int = 3,
+                 shrink: str = "truncate_tail", context_id: Optional[int] = None):
+        self.name = name
+        self.content = content
+        self.raw = content if raw is None else raw
+        self.path = path or None
+        self.region = region
+        self.priority = priority
+        self.shrink = shrink
+        self.context_id = context_id
+        self._digest: Optional[str] = None
+        self._canonical: Optional[str] = None
+
+    def with_content(self, content: str) -> "ContextBlock":
+        """A copy pasting `content` instead; the raw text it's compared by stays the same"""
+        block = ContextBlock(self.name, content, raw=self.raw, path=self.path, region=self.region,
+                             priority=self.priority, shrink=self.shrink, context_id=self.context_id)
+        block._digest = self._digest
+        block._canonical = self._canonical
+        return block
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = content_hash(self.raw)
+        return self._digest
+
+    @property
+    def canonical_path(self) -> Optional[str]:
+        if self.path and self._canonical is None:
+            self._canonical = canonical_path(self.path)
+        return self._canonical
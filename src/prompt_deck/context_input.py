@@ -1,49 +1,100 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QTextEdit, 
-                             QPushButton, QLabel, QMessageBox, QSizePolicy, QFrame, QApplication)
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPlainTextEdit, 
+                             QPushButton, QLabel, QMessageBox, QSizePolicy, QFrame, QApplication,
+                             QToolButton, QMenu, QComboBox)
 from PyQt6.QtGui import QFont, QTextCursor, QIcon, QColor, QDrag
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize, QMimeData, QTimer
+from PyQt6.QtCore import Qt, pyqtSignal, QSize, QMimeData, QTimer
 from .styles import FONT_FAMILY, name_input_style, content_input_style
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
 from .styles import (name_input_style, content_input_style, delete_button_style, 
                    add_context_btn_style, drag_handle_style, duplicate_button_style)
+from .extractors import find_extractor
+from .file_cache import PAGE_LINES, file_cache, file_signature, read_file_text
+from .packer import DEFAULT_PRIORITY, DEFAULT_SHRINK
+from .compaction import TRANSFORMS, compact, detect_language
+from .snippets import SnippetSpec, SnippetError, resolve_snippet
+from .truncation import Truncation, TruncationError, truncate_text
+from .grep_filter import MAX_RESULT_CHARS, GrepSpec, GrepError, grep_file, grep_text
+from .git_source import GIT_MODES, GitSpec, resolve
+from .highlighter import CodeHighlighter
+from .loader import PRIORITY_NORMAL, PRIORITY_VISIBLE, CancelToken, load_async
+from .spill import SPILL_CHARS, write_spill
+from . import context_model
+from .context_model import ContextRecord, RecordField
+
+# Inline file preview: height, and how close to the end scrolling reads the next page (in lines)
+PREVIEW_HEIGHT = 160
+PREVIEW_PREFETCH_LINES = 20
+# Pages a paged view keeps in its document, the far end is dropped as it scrolls
+WINDOW_PAGES = 5
+
+
+def read_file_for_context(path: str, token: CancelToken) -> str:
+    """Background job: read a file for a text context"""
+    path_obj = Path(path)
+    if not path_obj.exists():
+        raise FileNotFoundError("File does not exist")
+    try:
+        # Read through the shared cache (handles large files)
+        return read_file_text(path, token)
+    except UnicodeDecodeError:
+        # For binary files
+        return f"[Binary file: {path_obj.name}]"
+
+
+def read_file_context(path: str, snippet=None, grep=None, truncation=None, compaction=(), token=None,
+                      extract_html=False):
+    """
+    The text a file context pastes: the file read through the shared cache
+    (HTML as page text with `extract_html`), cut to its region, filter and
+    limit and then compacted. Safe to run on the loader pool. Returns (content, resolved snippet or None, compaction
+    result or None); a line range `snippet` is re-anchored in place.
+    Raises FileNotFoundError, SnippetError or OSError.
+    """
+    path_obj = Path(path)
+    if not path_obj.exists():
+        raise FileNotFoundError(f"File no longer exists: {path}")
+
+    # Filters and snippets work on the whole file and are cut afterwards
+    whole_file = snippet is None and grep is None
+    try:
+        if grep is not None and snippet is None:
+            # Streamed from the file (and usually cached by the background run)
+            content, signature = grep_file(path, grep, token, opt_in=extract_html), None
+        else:
+            content, signature = file_cache.read(path, token, truncation=truncation if whole_file else None,
+                                                 opt_in=extract_html)
+    except UnicodeDecodeError:
+        # For binary files
+        content, signature = f"[Binary file: {path_obj.name}]", None
+
+    # Cut out the snippet; it's re-resolved (and re-anchored) when the file changes
+    resolved = None
+    if snippet is not None and signature is not None:
+        resolved = resolve_snippet(path, signature, content, snippet, extract_html)
+        content = resolved.text
+        if grep is not None:
+            content = grep_text(content, grep)
+    if truncation is not None and not whole_file:
+        content = truncate_text(content, truncation)
+
+    # Apply compaction transforms (cached by content hash)
+    compacted = None
+    if compaction:
+        compacted = compact(content, compaction, detect_language(path))
+        content = compacted.text
+    return content, resolved, compacted
+
+
+def load_priority(widget: QWidget) -> int:
+    """Contexts on screen load before the ones scrolled out of view"""
+    if widget.isVisible() and not widget.visibleRegion().isEmpty():
+        return PRIORITY_VISIBLE
+    return PRIORITY_NORMAL
+
 
-# New thread class for file loading
-class FileReaderThread(QThread):
-    file_read = pyqtSignal(str, str)  # path, content
-    error_occurred = pyqtSignal(str, str)  # path, error message
-    
-    def __init__(self, path):
-        super().__init__()
-        self.path = path
-        
-    def run(self):
-        try:
-            # Safely read the file
-            path_obj = Path(self.path)
-            if not path_obj.exists():
-                self.error_occurred.emit(self.path, "File does not exist")
-                return
-                
-            # Check file size and handle large files
-            if path_obj.stat().st_size > 5 * 1024 * 1024:  # 5MB limit
-                with path_obj.open(encoding="utf-8", errors="replace") as f:
-                    file_text = f.read(1024 * 1024)  # First MB
-                    file_text += "\n\n[File truncated due to size...]"
-            else:
-                try:
-                    file_text = path_obj.read_text(encoding="utf-8", errors="replace")
-                except UnicodeDecodeError:
-                    # For binary files
-                    self.file_read.emit(self.path, f"[Binary file: {path_obj.name}]")
-                    return
-                
-            self.file_read.emit(self.path, file_text)
-        except Exception as e:
-            self.error_occurred.emit(self.path, str(e))
-            
 # Drag handle widget for context reordering
 class DragHandle(QFrame):
     def __init__(self, parent=None):
@@ -192,20 +243,204 @@ class BaseContextInput(QWidget):
         
         return buttons_layout
 
+
+class PagedView(QPlainTextEdit):
+    """
+    Read-only view of a file that reads it a page at a time as it's
+    scrolled, keeping at most WINDOW_PAGES pages in its document: pages at
+    the far end are dropped and read again when scrolled back to, so even
+    a huge file costs only a few pages
+    """
+    pageLoaded = pyqtSignal(int, int, bool)  # First and last line shown, whether there's more after
+
+    def __init__(self, height: int, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setFixedHeight(height)
+        self.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.setFont(QFont(FONT_FAMILY, 9))
+        self.setStyleSheet(content_input_style)
+        self.document().setUndoRedoEnabled(False)
+        self.highlighter = CodeHighlighter(self.document())
+        # The file shown, where the page after the window starts (None at the end of the
+        # file), the file version shown and the page read in flight
+        self.path = None
+        # Read HTML as page text (see FileCache.read)
+        self.opt_in = False
+        self.offset = None
+        self.signature = None
+        self.token = None
+        # (offset, length in the document, newlines) of the pages shown, and of the ones
+        # dropped before them, nearest last
+        self.pages: List[Tuple[int, int, int]] = []
+        self.dropped: List[Tuple[int, int, int]] = []
+        self.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+
+    def show_file(self, path: Optional[str], language_path: Optional[str] = None, opt_in: bool = False):
+        """
+        Show `path` from the start, highlighted as `language_path` (default:
+        `path` itself); `opt_in` shows HTML as page text
+        """
+        self.cancel()
+        # Nothing to read while it's cleared (clearing scrolls it to the top)
+        self.offset = None
+        self.pages = []
+        self.dropped = []
+        self.clear()
+        self.path = path
+        self.opt_in = opt_in
+        self.offset = 0 if path else None
+        self.signature = None
+        self.highlighter.set_path(language_path or path)
+
+    def is_stale(self) -> bool:
+        """Not read yet, or the file changed since"""
+        return self.signature is None or file_signature(self.path or "") != self.signature
+
+    def load_page(self, backward: bool = False):
+        """Read the page after the window (or before it), in the background"""
+        if self.token is not None or not self.path:
+            return
+        if backward:
+            if not self.dropped:
+                return
+            offset = self.dropped[-1][0]
+        elif self.offset is None:
+            return
+        else:
+            offset = self.offset
+        token = self.token = CancelToken()
+        path, opt_in = self.path, self.opt_in
+
+        def done(page):
+            self.token = None
+            text, next_offset, signature = page
+            if self.signature is not None and signature != self.signature:
+                # The file changed since the first page
+                self.show_file(path, self.highlighter.path, opt_in)
+                self.load_page()
+                return
+            if offset == 0 and "\0" in text:
+                text, next_offset = "[Binary file, no preview]", None
+            self.signature = signature
+            if backward:
+                self.prepend_page(offset, text)
+            else:
+                self.append_page(offset, text, next_offset)
+            document = self.document()
+            first = sum(newlines for _, _, newlines in self.dropped)
+            lines = document.blockCount() - (0 if document.lastBlock().text() else 1)
+            self.pageLoaded.emit(first, first + lines, self.offset is not None)
+            # A short page may not fill the view, so there's nothing to scroll
+            self.on_scrolled()
+
+        def failed(error):
+            self.token = None
+            self.offset = None
+            self.dropped = []
+            self.setPlainText(f"Could not read the file: {error}")
+
+        load_async(file_cache.read_page, path, offset, PAGE_LINES, token, opt_in,
+                   on_done=done, on_error=failed, priority=PRIORITY_VISIBLE, token=token)
+
+    @staticmethod
+    def page_entry(offset: int, text: str) -> Tuple[int, int, int]:
+        # Document positions count UTF-16 code units
+        return offset, len(text.encode("utf-16-le")) // 2, text.count("\n")
+
+    def append_page(self, offset: int, text: str, next_offset: Optional[int]):
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        self.pages.append(self.page_entry(offset, text))
+        self.offset = next_offset
+        if len(self.pages) > WINDOW_PAGES:
+            # Drop the first page, keeping the same lines in view
+            bar = self.verticalScrollBar()
+            top = bar.value()
+            page = self.pages.pop(0)
+            cursor = QTextCursor(self.document())
+            cursor.setPosition(page[1], QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+            self.dropped.append(page)
+            bar.setValue(top - page[2])
+
+    def prepend_page(self, offset: int, text: str):
+        bar = self.verticalScrollBar()
+        top = bar.value()
+        cursor = QTextCursor(self.document())
+        cursor.insertText(text)
+        self.pages.insert(0, self.dropped.pop())
+        if len(self.pages) > WINDOW_PAGES:
+            # Drop the last page; it's read again when scrolled back to
+            page = self.pages.pop()
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.setPosition(self.document().characterCount() - 1 - page[1], QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+            self.offset = page[0]
+        bar.setValue(top + self.pages[0][2])
+
+    def on_scrolled(self, *args):
+        bar = self.verticalScrollBar()
+        if bar.value() >= bar.maximum() - PREVIEW_PREFETCH_LINES:
+            self.load_page()
+        elif bar.value() <= PREVIEW_PREFETCH_LINES and self.dropped:
+            self.load_page(backward=True)
+
+    def cancel(self):
+        if self.token is not None:
+            self.token.cancel()
+            self.token = None
+
+
+class ContextEditor(QPlainTextEdit):
+    """Text context editor; pastes too large to edit are handed to the context instead"""
+    largePaste = pyqtSignal(object)  # The text; not str, that would copy it through a QString
+
+    def insertFromMimeData(self, source):
+        if source.hasText():
+            text = source.text()
+            if len(text) + self.document().characterCount() > SPILL_CHARS:
+                self.largePaste.emit(text)
+                return
+        super().insertFromMimeData(source)
+
+
 class ContextInput(QWidget):
+    duplicateRequested = pyqtSignal(object)  # Signal to request duplication
+
+    # Stored on the context's record
+    file_name = RecordField()
+    file_path = RecordField()
+    spill_path = RecordField()
+    priority = RecordField()
+    shrink = RecordField()
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        # The data behind this widget, read by the deck
+        self.record = ContextRecord(id(self), context_model.TEXT)
+        # Show the text instead of the editor when it's stored on disk, created when first needed
+        self.spill_view = None
+        self.clear_button = None
 
         # Track if we have a file loaded
         self.file_name = None
+        self.file_path = None
+        # Packing settings used when fitting the deck into a token budget
+        self.priority = DEFAULT_PRIORITY
+        self.shrink = DEFAULT_SHRINK
         # Unique ID for this context (used for callbacks)
         self.id = id(self)
-        # File loading thread
-        self.file_thread = None
+        # Cancels the background file load in flight, if any
+        self.load_token = None
+        # Whether the load in flight is writing the text to disk; closing waits for it
+        self.spilling = False
         # Add a status timer attribute to track active status timers
         self.status_timer = None
         
         self.setup_ui()
+        self.name_input.textChanged.connect(self.record.set_name)
 
         # Enable drag-and-drop on this widget
         self.setAcceptDrops(True)
@@ -223,13 +458,17 @@ class ContextInput(QWidget):
         layout.addWidget(self.name_input)
 
         # Content input / text area
-        self.content_input = QTextEdit()
+        # Plain text: contexts are pasted as text, and it stays fast with long documents
+        self.content_input = ContextEditor()
         self.content_input.setFixedHeight(150)  # Increased from 80 to 150
         self.content_input.setPlaceholderText("Content")
         self.content_input.setFont(QFont(FONT_FAMILY, 10))
         self.content_input.textChanged.connect(self.update_char_count)
+        self.content_input.largePaste.connect(self.on_large_paste)
         modified_content_style = content_input_style + "padding-right: 5px;"
         self.content_input.setStyleSheet(modified_content_style)
+        # Language from the loaded file's extension, or guessed from the text
+        self.highlighter = CodeHighlighter(self.content_input.document())
         layout.addWidget(self.content_input)
 
         # Bottom row (unchanged)
@@ -249,6 +488,7 @@ class ContextInput(QWidget):
         bottom_row.addWidget(self.status_indicator)
 
         bottom_row.addStretch()
+        self.bottom_row = bottom_row
 
         # "Add File" button
         self.file_button = QPushButton("Add File")
@@ -337,11 +577,13 @@ class ContextInput(QWidget):
             # Use our new safe status method instead of direct timers
             self.set_status("Loading file...")
             
-            # Start file reading in background thread
-            self.file_thread = FileReaderThread(filepath)
-            self.file_thread.file_read.connect(self.on_file_read)
-            self.file_thread.error_occurred.connect(self.on_file_error)
-            self.file_thread.start()
+            # Read the file on the shared loader pool; a newer load replaces this one
+            self.cancel_load()
+            token = self.load_token = CancelToken()
+            load_async(read_file_for_context, filepath, token,
+                       on_done=lambda content: self.on_file_read(filepath, content),
+                       on_error=lambda error: self.on_file_error(filepath, str(error)),
+                       priority=load_priority(self), token=token)
             
             return True
         except Exception as e:
@@ -349,13 +591,24 @@ class ContextInput(QWidget):
             QMessageBox.critical(self, "Error", f"Failed to load file: {e}")
             return False
     
+    def cancel_load(self):
+        """Cancel the background load (or write to disk) in flight; its result is dropped"""
+        if self.load_token is not None:
+            self.load_token.cancel()
+            self.load_token = None
+            self.spilling = False
+            self.content_input.setReadOnly(False)
+
     def on_file_read(self, path, content):
         """Handle successful file read"""
+        self.load_token = None
         try:
             path_obj = Path(path)
             self.file_name = path_obj.name
+            self.file_path = path
             self.name_input.setText(self.file_name)
-            self.content_input.setPlainText(content)
+            self.highlighter.set_path(path)
+            self.set_text(content)
             self.update_char_count()
             # Use our new safe status method instead of direct timers
             self.set_status("File loaded successfully!", 3000)
@@ -365,11 +618,95 @@ class ContextInput(QWidget):
     
     def on_file_error(self, path, error_msg):
         """Handle file read error"""
+        self.load_token = None
         self.content_input.setPlainText("")
         # Use our new safe status method
         self.set_status(f"Error: {error_msg}", 5000)
         QMessageBox.critical(self, "Error", f"Error reading file: {error_msg}")
 
+    #
+    # Text too large to edit, stored on disk (see spill.py)
+    #
+    def set_text(self, text: str):
+        """Show `text` in the editor, or store it on disk if it's too large to edit"""
+        if len(text) > SPILL_CHARS:
+            self.spill_text([text])
+        else:
+            self.show_editor()
+            self.content_input.setPlainText(text)
+
+    def on_large_paste(self, text: str):
+        """Store the text with the paste on disk instead of inserting it into the editor"""
+        cursor = self.content_input.textCursor()
+        current = self.content_input.toPlainText()
+        self.spill_text([current[:cursor.selectionStart()], text, current[cursor.selectionEnd():]])
+
+    def spill_text(self, parts):
+        """Write the text (the concatenated `parts`) to disk in the background; it can't be edited meanwhile"""
+        self.cancel_load()
+        self.content_input.setReadOnly(True)
+        self.set_status(f"Storing {sum(len(part) for part in parts)} characters on disk...", 0)
+        token = self.load_token = CancelToken()
+        self.spilling = True
+        load_async(write_spill, parts, token,
+                   on_done=lambda result: self.on_spilled(*result),
+                   on_error=self.on_spill_error,
+                   priority=load_priority(self), token=token)
+
+    def on_spilled(self, path, chars):
+        self.load_token = None
+        self.spilling = False
+        self.show_spill(path, chars)
+        self.set_status("Stored on disk", 3000)
+
+    def on_spill_error(self, error):
+        self.load_token = None
+        self.spilling = False
+        self.content_input.setReadOnly(False)
+        self.set_status(f"Error: {error}", 5000)
+        QMessageBox.critical(self, "Error", f"Failed to store the text on disk: {error}")
+
+    def show_spill(self, path: str, chars: int):
+        """Show the text stored at `path` a page at a time instead of the editor"""
+        self.record.set_spill(path, chars)
+        if self.spill_view is None:
+            self.spill_view = PagedView(self.content_input.minimumHeight())
+            self.spill_view.setToolTip("Too large to edit, shown from disk")
+            layout = self.layout()
+            layout.insertWidget(layout.indexOf(self.content_input) + 1, self.spill_view)
+            # Drops the stored text, back to an empty editor; before "Add File"
+            self.clear_button = QPushButton("Clear")
+            self.clear_button.setFixedWidth(80)
+            self.clear_button.setFont(QFont(FONT_FAMILY, 9))
+            self.clear_button.clicked.connect(self.on_clear_clicked)
+            self.clear_button.setStyleSheet(add_context_btn_style)
+            self.bottom_row.insertWidget(self.bottom_row.indexOf(self.file_button), self.clear_button)
+        self.content_input.setVisible(False)
+        self.content_input.clear()
+        self.content_input.setReadOnly(False)
+        self.spill_view.setVisible(True)
+        self.spill_view.show_file(path, self.file_path)
+        self.spill_view.load_page()
+        self.clear_button.setVisible(True)
+        self.update_char_count()
+
+    def show_editor(self):
+        """Back to the editor, dropping the text stored on disk (if any)"""
+        if not self.spill_path:
+            return
+        self.spill_view.show_file(None)
+        self.spill_view.setVisible(False)
+        self.clear_button.setVisible(False)
+        self.content_input.setVisible(True)
+        self.record.set_spill(None)
+        self.update_char_count()
+
+    def on_clear_clicked(self):
+        self.file_name = None
+        self.file_path = None
+        self.highlighter.set_path(None)
+        self.show_editor()
+
     #
     # Drag-and-drop overrides
     #
@@ -400,10 +737,10 @@ class ContextInput(QWidget):
                 self.status_timer.stop()
                 self.status_timer = None
                 
-            # Cancel any file loading thread that might be running
-            if self.file_thread and self.file_thread.isRunning():
-                self.file_thread.terminate()
-                self.file_thread.wait()
+            # Cancel any file load still in flight (it stops at its next chunk)
+            self.cancel_load()
+            if self.spill_view is not None:
+                self.spill_view.cancel()
                 
             # Remove from parent
             self.setParent(None)
@@ -413,34 +750,16 @@ class ContextInput(QWidget):
 
     def update_char_count(self):
         try:
-            # Define maximum character limit
-            MAX_CHARS = 100000  # 100K character limit
-            
+            if self.spill_path:
+                self.char_count_label.setText(f"Characters: {self.record.char_count} (stored on disk)")
+                return
+
             text = self.content_input.toPlainText()
-            count = len(text)
-            
-            if count > MAX_CHARS:
-                # Truncate text and set cursor at end
-                cursor = self.content_input.textCursor()
-                cursor_pos = cursor.position()
-                
-                # Only truncate if we're at the end to avoid disrupting editing in the middle
-                if cursor_pos > MAX_CHARS:
-                    self.content_input.setPlainText(text[:MAX_CHARS])
-                    cursor = self.content_input.textCursor()
-                    cursor.movePosition(QTextCursor.MoveOperation.End)
-                    self.content_input.setTextCursor(cursor)
-                    count = MAX_CHARS
-                
-            # Update the label with warning if needed
-            self.char_count_label.setText(f"Characters: {count}" + 
-                                     (" (limit reached)" if count >= MAX_CHARS else ""))
-            
-            # Visual indicator when approaching limit
-            if count > MAX_CHARS * 0.9:  # Over 90% of limit
-                self.char_count_label.setStyleSheet("color: #e74c3c; font-weight: bold;")
-            else:
-                self.char_count_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
+            self.record.set_text(text)
+            if len(text) > SPILL_CHARS and self.load_token is None:
+                # Typed or dropped past the limit: store all of it on disk
+                self.spill_text([text])
+            self.char_count_label.setText(f"Characters: {len(text)}")
         except Exception as e:
             print(f"Error updating character count: {e}")
             self.char_count_label.setText("Characters: Error")
@@ -459,20 +778,7 @@ class ContextInput(QWidget):
         Otherwise, just return whatever is in the text box.
         """
         try:
-            notes = self.name_input.text()
-            raw_text = self.content_input.toPlainText()
-
-            if self.file_name:
-                # Construct the special format for file-based context
-                content = f"{self.file_name}\n```text\n{raw_text}\n```"
-            else:
-                # Manual text mode
-                content = raw_text
-
-            return {
-                "name": notes,      # "Context Notes"
-                "content": content  # Possibly file-based
-            }
+            return dict(self.record.to_state())
         except Exception as e:
             print(f"Error getting data: {e}")
             return {
@@ -493,34 +799,102 @@ class ContextInput(QWidget):
             notes = str(data.get("name", "")) if data.get("name") is not None else ""
             content_str = str(data.get("content", "")) if data.get("content") is not None else ""
 
-            self.file_name = None  # Reset
+            # Only set for loaded files stored on disk, the content of others has the name in it
+            self.file_name = data.get("file_name") or None
+            self.file_path = None
+            self.priority = int(data.get("priority", DEFAULT_PRIORITY))
+            self.shrink = str(data.get("shrink", DEFAULT_SHRINK))
 
             # Optional: if the content pattern matches the file-based approach
             # (filename + ```...), we could parse it. For simplicity, we'll just set the text.
             self.name_input.setText(notes)
-            self.content_input.setText(content_str)
+            self.highlighter.set_path(None)
+            spill_path = str(data.get("spill_path") or "")
+            if spill_path:
+                # Stored on disk, shown from there
+                if Path(spill_path).is_file():
+                    self.show_spill(spill_path, int(data.get("char_count", 0)))
+                else:
+                    self.show_editor()
+                    self.content_input.setPlainText(f"[Stored text is missing: {spill_path}]")
+            else:
+                self.set_text(content_str)
             self.update_char_count()
         except Exception as e:
             print(f"Error setting data: {e}")
             self.name_input.setText("Error")
-            self.content_input.setText(f"Error loading content: {e}")
+            self.content_input.setPlainText(f"Error loading content: {e}")
+
+    def create_duplicate(self) -> 'ContextInput':
+        """Create a duplicate of this text context"""
+        dup = ContextInput()
+        dup.name_input.setText(self.name_input.text())
+        dup.highlighter.set_path(self.file_path)
+        dup.file_name = self.file_name
+        dup.file_path = self.file_path
+        if self.spill_path:
+            # Spill files never change, the duplicate shares this one
+            dup.show_spill(self.spill_path, self.record.char_count)
+        else:
+            dup.content_input.setPlainText(self.content_input.toPlainText())
+        dup.priority = self.priority
+        dup.shrink = self.shrink
+        dup.update_char_count()
+        return dup
             
 
 class FileContextInput(BaseContextInput):
     """A special context input type for files that lazy-loads content when needed"""
+    filePathChanged = pyqtSignal(object)  # Emitted with self after a new file is set
+
+    # Stored on the context's record
+    file_path = RecordField()
+    file_name = RecordField()
+    char_count = RecordField(metric=True)
+    priority = RecordField()
+    shrink = RecordField()
+    compaction = RecordField()
+    last_compaction = RecordField(metric=True)
+    # Why the file couldn't be read last time, None after a successful read
+    error = RecordField(metric=True)
+    snippet = RecordField()
+    grep = RecordField()
+    truncation = RecordField()
+    extract_html = RecordField()
     
     def __init__(self, parent=None):
         super().__init__(parent)
+        # The data behind this widget, read by the deck
+        self.record = ContextRecord(id(self), context_model.FILE)
 
         # Track file path and name
         self.file_path = None
         self.file_name = None
-        # File loading thread
-        self.file_thread = None
         # Character count
         self.char_count = 0
+        # Packing settings used when fitting the deck into a token budget
+        self.priority = DEFAULT_PRIORITY
+        self.shrink = DEFAULT_SHRINK
+        # Enabled compaction transforms and the result of the last read
+        self.compaction = []
+        self.last_compaction = None
+        # Region of the file to include (None for the whole file)
+        self.snippet = None
+        # Lines to keep (None for all of them)
+        self.grep = None
+        # Part of a large file to keep (None for the default limit)
+        self.truncation = None
+        # HTML pages: paste the visible text instead of the markup
+        self.extract_html = False
+        # Background filter run (or bundle extraction) in flight
+        self.load_token = None
+        # Set while the file snapshot is extracted from an opened bundle
+        self.extracting = False
+        # Inline preview, created when it's first opened
+        self.preview = None
         
         self.setup_ui()
+        self.name_input.textChanged.connect(self.record.set_name)
         # Enable drag-and-drop
         self.setAcceptDrops(True)
 
@@ -548,6 +922,23 @@ class FileContextInput(BaseContextInput):
         self.file_button.clicked.connect(self.on_add_file_clicked)
         self.file_button.setStyleSheet(duplicate_button_style)
         buttons_layout.addWidget(self.file_button)
+
+        # Compaction menu
+        self.compact_button = QToolButton()
+        self.compact_button.setText("{ }")
+        self.compact_button.setToolTip("Compaction")
+        self.compact_button.setFixedSize(24, 24)
+        self.compact_button.setStyleSheet(duplicate_button_style)
+        self.compact_button.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        self.compact_menu = QMenu(self.compact_button)
+        self.compact_actions = {}
+        for name, label in TRANSFORMS.items():
+            action = self.compact_menu.addAction(label)
+            action.setCheckable(True)
+            action.toggled.connect(self.on_compaction_toggled)
+            self.compact_actions[name] = action
+        self.compact_button.setMenu(self.compact_menu)
+        buttons_layout.addWidget(self.compact_button)
         
         header_layout.addLayout(buttons_layout)
         self.content_layout.addLayout(header_layout)
@@ -573,8 +964,58 @@ class FileContextInput(BaseContextInput):
         self.status_indicator = QLabel("")
         self.status_indicator.setFont(QFont(FONT_FAMILY, 8))
         file_info_layout.addWidget(self.status_indicator)
+
+        # Opens the inline preview of the file
+        self.preview_button = QToolButton()
+        self.preview_button.setText("Preview")
+        self.preview_button.setFont(QFont(FONT_FAMILY, 8))
+        self.preview_button.setCheckable(True)
+        self.preview_button.setAutoRaise(True)
+        self.preview_button.setArrowType(Qt.ArrowType.RightArrow)
+        self.preview_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextBesideIcon)
+        self.preview_button.setEnabled(False)
+        self.preview_button.toggled.connect(self.set_preview_visible)
+        file_info_layout.addWidget(self.preview_button)
         
         self.content_layout.addLayout(file_info_layout)
+
+        # Optional region of the file: line range, symbol or /regex/
+        self.snippet_input = QLineEdit()
+        self.snippet_input.setPlaceholderText("Whole file (or lines 10-40, Class.method, /start/../end/)")
+        self.snippet_input.setFont(QFont(FONT_FAMILY, 9))
+        self.snippet_input.setStyleSheet(name_input_style)
+        self.snippet_input.editingFinished.connect(self.on_snippet_edited)
+
+        # Optional size limit: head, tail, head+tail or sampled lines
+        self.truncation_input = QLineEdit()
+        self.truncation_input.setPlaceholderText("Default size limit (or tail 20000, head+tail 8k tokens)")
+        self.truncation_input.setFont(QFont(FONT_FAMILY, 9))
+        self.truncation_input.setStyleSheet(name_input_style)
+        self.truncation_input.editingFinished.connect(self.on_truncation_edited)
+
+        # HTML pages only: the page text instead of the markup
+        self.extract_button = QToolButton()
+        self.extract_button.setText("Page text")
+        self.extract_button.setFont(QFont(FONT_FAMILY, 8))
+        self.extract_button.setToolTip("Paste the visible text of the page instead of its HTML")
+        self.extract_button.setCheckable(True)
+        self.extract_button.setVisible(False)
+        self.extract_button.toggled.connect(self.set_extract_html)
+
+        region_layout = QHBoxLayout()
+        region_layout.setSpacing(5)
+        region_layout.addWidget(self.snippet_input, 3)
+        region_layout.addWidget(self.truncation_input, 2)
+        region_layout.addWidget(self.extract_button)
+        self.content_layout.addLayout(region_layout)
+
+        # Optional grep filter: only matching lines, with context
+        self.grep_input = QLineEdit()
+        self.grep_input.setPlaceholderText("All lines (or ERROR, \"request 42\" -C 3, WARN -v heartbeat -i)")
+        self.grep_input.setFont(QFont(FONT_FAMILY, 9))
+        self.grep_input.setStyleSheet(name_input_style)
+        self.grep_input.editingFinished.connect(self.on_grep_edited)
+        self.content_layout.addWidget(self.grep_input)
         
         # Add a separator line at the bottom
         separator = QFrame()
@@ -615,7 +1056,7 @@ class FileContextInput(BaseContextInput):
             
             # Update UI
             self.name_input.setText(self.file_name)
-            self.file_label.setText(f"File: {self.file_name}")
+            self.update_file_label()
             
             # Reset char count until file is loaded
             self.char_count = 0
@@ -626,6 +1067,13 @@ class FileContextInput(BaseContextInput):
             self.status_indicator.setText("File selected")
             self.status_indicator.setStyleSheet("color: #27ae60;")
             QTimer.singleShot(3000, lambda: self.status_indicator.setText(""))
+
+            extractor = find_extractor(filepath, opt_in=True)
+            self.extract_button.setVisible(extractor is not None and extractor.opt_in)
+            self.preview_button.setEnabled(True)
+            self.refresh_preview()
+            self.start_filter()
+            self.filePathChanged.emit(self)
             
             return True
         except Exception as e:
@@ -637,6 +1085,164 @@ class FileContextInput(BaseContextInput):
             self.status_indicator.setStyleSheet("color: #e74c3c;")
             return False
 
+    def set_snippet(self, spec):
+        """Include only a region of the file (None for the whole file)"""
+        self.snippet = spec
+        self.snippet_input.setText(spec.describe() if spec else "")
+        self.snippet_input.setToolTip("")
+        self.update_file_label()
+
+    def on_snippet_edited(self):
+        """Parse the region typed by the user"""
+        text = self.snippet_input.text()
+        if text == (self.snippet.describe() if self.snippet else ""):
+            return
+        try:
+            self.set_snippet(SnippetSpec.parse(text))
+        except SnippetError as e:
+            self.snippet_input.setToolTip(str(e))
+            self.status_indicator.setText("Invalid region")
+            self.status_indicator.setStyleSheet("color: #e74c3c;")
+
+    def set_grep(self, spec):
+        """Include only the lines matching `spec` (None for all lines)"""
+        self.grep = spec
+        self.grep_input.setText(spec.describe() if spec else "")
+        self.grep_input.setToolTip("")
+        self.start_filter()
+
+    def on_grep_edited(self):
+        """Parse the filter typed by the user"""
+        text = self.grep_input.text()
+        if text == (self.grep.describe() if self.grep else ""):
+            return
+        try:
+            self.set_grep(GrepSpec.parse(text))
+        except GrepError as e:
+            self.grep_input.setToolTip(str(e))
+            self.status_indicator.setText("Invalid filter")
+            self.status_indicator.setStyleSheet("color: #e74c3c;")
+
+    def start_filter(self):
+        """Filter the file on the loader pool, so it's cached by the time the deck is copied"""
+        self.cancel_load()
+        if self.grep is None or not self.file_path or self.snippet is not None:
+            return
+        token = self.load_token = CancelToken()
+        self.status_indicator.setText("Filtering...")
+        self.status_indicator.setStyleSheet("color: #3498db;")
+
+        def done(text):
+            self.load_token = None
+            self.char_count_label.setText(f"Characters: {len(text)}")
+            self.char_count_label.setVisible(True)
+            self.status_indicator.setText("" if text else "No matching lines")
+            self.status_indicator.setStyleSheet("color: #7f8c8d;")
+
+        def failed(error):
+            self.load_token = None
+            self.status_indicator.setText("Error")
+            self.status_indicator.setToolTip(str(error))
+            self.status_indicator.setStyleSheet("color: #e74c3c;")
+
+        load_async(grep_file, self.file_path, self.grep, token, MAX_RESULT_CHARS, self.extract_html,
+                   on_done=done, on_error=failed,
+                   priority=load_priority(self), token=token)
+
+    def cancel_load(self):
+        """Drop the result of the filter run in flight, if any"""
+        if self.load_token is not None:
+            self.load_token.cancel()
+            self.load_token = None
+        self.extracting = False
+
+    def set_preview_visible(self, visible):
+        """Open or close the inline preview; it reads the first page when opened"""
+        self.preview_button.setArrowType(Qt.ArrowType.DownArrow if visible else Qt.ArrowType.RightArrow)
+        if visible and self.preview is None:
+            self.preview = PagedView(PREVIEW_HEIGHT)
+            self.preview.pageLoaded.connect(self.on_preview_page)
+            # Below the file name row
+            self.content_layout.insertWidget(2, self.preview)
+        if self.preview is None:
+            return
+        self.preview.setVisible(visible)
+        if visible and (self.preview.path != self.file_path or self.preview.opt_in != self.extract_html
+                        or self.preview.is_stale()):
+            # Not read yet, or the file changed since
+            self.refresh_preview()
+
+    def refresh_preview(self):
+        """Show the current file from the start, if the preview is open"""
+        if self.preview is None:
+            return
+        self.preview.show_file(self.file_path, opt_in=self.extract_html)
+        if self.preview_button.isChecked():
+            self.preview.load_page()
+
+    def on_preview_page(self, first, last, more):
+        if first == 0 and not more:
+            self.preview_button.setToolTip(f"Whole file, {last} lines")
+        else:
+            self.preview_button.setToolTip(f"Lines {first + 1}-{last}" + (", scroll for more" if more else ""))
+
+    def cancel_preview(self):
+        if self.preview is not None:
+            self.preview.cancel()
+
+    def set_truncation(self, spec):
+        """Keep only part of the file when it's over budget (None for the default limit)"""
+        self.truncation = spec
+        self.truncation_input.setText(spec.describe() if spec else "")
+        self.truncation_input.setToolTip("")
+
+    def on_truncation_edited(self):
+        """Parse the size limit typed by the user"""
+        text = self.truncation_input.text()
+        if text == (self.truncation.describe() if self.truncation else ""):
+            return
+        try:
+            self.set_truncation(Truncation.parse(text))
+        except TruncationError as e:
+            self.truncation_input.setToolTip(str(e))
+            self.status_indicator.setText("Invalid limit")
+            self.status_indicator.setStyleSheet("color: #e74c3c;")
+
+    def set_extract_html(self, enabled):
+        """Paste the visible text of an HTML page (True) or its markup"""
+        enabled = bool(enabled)
+        self.extract_button.blockSignals(True)
+        self.extract_button.setChecked(enabled)
+        self.extract_button.blockSignals(False)
+        if enabled == self.extract_html:
+            return
+        self.extract_html = enabled
+        self.refresh_preview()
+        self.start_filter()
+
+    def update_file_label(self, region=None):
+        """Show the file name and, for snippets, where the snippet was found"""
+        if not self.file_name:
+            return
+        if self.snippet is None:
+            self.file_label.setText(f"File: {self.file_name}")
+        else:
+            self.file_label.setText(f"File: {self.file_name} ({region or self.snippet.describe()})")
+
+    def set_compaction(self, transforms):
+        """Enable the given compaction transforms"""
+        for name, action in self.compact_actions.items():
+            action.blockSignals(True)
+            action.setChecked(name in transforms)
+            action.blockSignals(False)
+        self.on_compaction_toggled()
+
+    def on_compaction_toggled(self, *args):
+        self.compaction = [name for name, action in self.compact_actions.items() if action.isChecked()]
+        self.compact_button.setStyleSheet(
+            duplicate_button_style + ("QToolButton { color: #27ae60; font-weight: bold; }"
+                                      if self.compaction else ""))
+
     def read_latest_content(self):
         """
         Read the latest content from the file for use in copy/export
@@ -646,56 +1252,80 @@ class FileContextInput(BaseContextInput):
             return "", False
             
         try:
-            path_obj = Path(self.file_path)
-            
             # Show loading indicator
             self.status_indicator.setText("Loading...")
             self.status_indicator.setStyleSheet("color: #3498db;")
             
             # Check if file still exists
-            if not path_obj.exists():
-                self.status_indicator.setText("File missing")
-                self.status_indicator.setStyleSheet("color: #e74c3c;")
+            if not Path(self.file_path).exists():
+                self.show_read_error("File missing", f"File no longer exists: {self.file_path}")
                 QMessageBox.warning(self, "Warning", f"File no longer exists: {self.file_path}")
                 return "", False
-                
-            # Read the file (with size limit)
-            if path_obj.stat().st_size > 5 * 1024 * 1024:  # 5MB limit
-                with path_obj.open(encoding="utf-8", errors="replace") as f:
-                    content = f.read(1024 * 1024)  # First MB
-                    content += "\n\n[File truncated due to size...]"
-            else:
-                try:
-                    content = path_obj.read_text(encoding="utf-8", errors="replace")
-                except UnicodeDecodeError:
-                    # For binary files
-                    content = f"[Binary file: {path_obj.name}]"
-            
-            # Update character count
-            self.char_count = len(content)
-            self.char_count_label.setText(f"Characters: {self.char_count}")
-            self.char_count_label.setVisible(True)
-            
-            # Show success indicator for 3 seconds
-            self.status_indicator.setText("File loaded")
-            self.status_indicator.setStyleSheet("color: #27ae60;")
-            QTimer.singleShot(3000, lambda: self.status_indicator.setText(""))
-            
-            # Format content
+
+            try:
+                content, snippet, compacted = read_file_context(self.file_path, self.snippet, self.grep,
+                                                                self.truncation, self.compaction,
+                                                                extract_html=self.extract_html)
+            except SnippetError as e:
+                self.show_read_error(str(e))
+                return "", False
+            self.show_read(content, snippet, compacted)
             return content, True
         except Exception as e:
             print(f"Error reading file: {e}")
-            
-            # Show error indicator
-            self.status_indicator.setText("Error")
-            self.status_indicator.setStyleSheet("color: #e74c3c;")
-            
+            self.show_read_error("Error", str(e))
             QMessageBox.critical(self, "Error", f"Failed to read file: {e}")
             return "", False
 
+    def show_read(self, content: str, snippet, compacted, spec=None):
+        """
+        Show the result of read_file_context(): where the snippet was found,
+        character count. `spec` is the copy of the snippet spec it was read
+        with, if it wasn't this context's own.
+        """
+        if snippet is not None and self.snippet is not None:
+            if spec is not None and spec.to_dict() != self.snippet.to_dict():
+                # Re-anchored on the copy
+                self.snippet = spec
+            if self.snippet.kind == "lines" and self.snippet_input.text() != self.snippet.describe():
+                # The range moved with the code
+                self.snippet_input.setText(self.snippet.describe())
+                self.record.touch()
+            self.update_file_label(snippet.describe())
+        self.last_compaction = compacted
+
+        # Update character count
+        self.char_count = len(content)
+        if self.last_compaction and self.last_compaction.chars_saved > 0:
+            self.char_count_label.setText(
+                f"Characters: {self.char_count} (-{self.last_compaction.percent_saved}%, "
+                f"~{self.last_compaction.tokens_saved} tokens saved)")
+        else:
+            self.char_count_label.setText(f"Characters: {self.char_count}")
+        self.char_count_label.setVisible(True)
+        if self.error is not None:
+            self.error = None
+        
+        # Show success indicator for 3 seconds
+        self.status_indicator.setText("File loaded")
+        self.status_indicator.setToolTip("")
+        self.status_indicator.setStyleSheet("color: #27ae60;")
+        QTimer.singleShot(3000, lambda: self.status_indicator.setText(""))
+
+    def show_read_error(self, status: str, detail: Optional[str] = None):
+        """Note on the record, and show in the status, that the file couldn't be read"""
+        error = detail or status
+        if error != self.error:
+            self.error = error
+        self.status_indicator.setText(status)
+        self.status_indicator.setToolTip(detail or "")
+        self.status_indicator.setStyleSheet("color: #e74c3c;")
+
     def on_delete(self):
         """Removes itself from the layout and the main list."""
         try:
+            self.cancel_load()  # Ignore any filter result still in flight
+            self.cancel_preview()
             # Remove from parent
             self.setParent(None)
             self.deleteLater()
@@ -739,11 +1369,7 @@ class FileContextInput(BaseContextInput):
     def get_data(self) -> Dict[str, str]:
         """Return the context data structure with file path info"""
         try:
-            return {
-                "name": self.name_input.text(),
-                "file_path": str(self.file_path) if self.file_path else "",
-                "is_file": True  # Flag to identify file context type
-            }
+            return dict(self.record.to_state())
         except Exception as e:
             print(f"Error getting data: {e}")
             return {
@@ -759,9 +1385,16 @@ class FileContextInput(BaseContextInput):
             file_path = str(data.get("file_path", "")) if data.get("file_path") is not None else ""
             
             self.name_input.setText(notes)
+            self.priority = int(data.get("priority", DEFAULT_PRIORITY))
+            self.shrink = str(data.get("shrink", DEFAULT_SHRINK))
+            self.set_compaction(data.get("compaction") or [])
             
             if file_path:
                 self.set_file_path(file_path)
+            self.set_snippet(SnippetSpec.from_dict(data.get("snippet")))
+            self.set_grep(GrepSpec.from_dict(data.get("grep")))
+            self.set_truncation(Truncation.from_dict(data.get("truncation")))
+            self.set_extract_html(data.get("extract_html", False))
         except Exception as e:
             print(f"Error setting file context data: {e}")
             self.name_input.setText("Error")
@@ -771,13 +1404,307 @@ class FileContextInput(BaseContextInput):
             self.status_indicator.setText("Error")
             self.status_indicator.setStyleSheet("color: #e74c3c;")
 
+    def set_bundle_data(self, data: Dict, bundle):
+        """Restore a context from a bundle; its file snapshot is extracted in the background first"""
+        member = data["bundle_file"]
+        self.name_input.setText(str(data.get("name") or ""))
+        self.file_label.setText(f"Extracting {Path(member).name} from the bundle...")
+        self.status_indicator.setText("Extracting...")
+        self.status_indicator.setStyleSheet("color: #3498db;")
+        self.cancel_load()
+        token = self.load_token = CancelToken()
+        self.extracting = True
+
+        def done(path):
+            self.load_token = None
+            self.extracting = False
+            self.set_data(dict(data, file_path=path))
+
+        def failed(error):
+            self.load_token = None
+            self.extracting = False
+            self.file_label.setText(f"Could not extract {Path(member).name}")
+            self.status_indicator.setText("Error")
+            self.status_indicator.setToolTip(str(error))
+            self.status_indicator.setStyleSheet("color: #e74c3c;")
+
+        load_async(bundle.extract, member, token, on_done=done, on_error=failed,
+                   priority=load_priority(self), token=token)
+
     def create_duplicate(self) -> 'FileContextInput':
         """Create a duplicate of this file context"""
         dup = FileContextInput()
         
         # Copy settings
         dup.name_input.setText(self.name_input.text())
+        dup.priority = self.priority
+        dup.shrink = self.shrink
+        dup.set_compaction(self.compaction)
         if self.file_path:
             dup.set_file_path(self.file_path)
+        if self.snippet:
+            dup.set_snippet(SnippetSpec.from_dict(self.snippet.to_dict()))
+        if self.grep:
+            dup.set_grep(GrepSpec.from_dict(self.grep.to_dict()))
+        if self.truncation:
+            dup.set_truncation(Truncation.from_dict(self.truncation.to_dict()))
+        dup.set_extract_html(self.extract_html)
         
-        return dup
\ No newline at end of file
+        return dup
+
+
+class GitContextInput(BaseContextInput):
+    """A context that shows a git diff or a file at a revision, resolved when copying"""
+
+    # Stored on the context's record
+    spec = RecordField()
+    # Results of resolving the spec; render_key compares cached_text itself
+    cached_text = RecordField(metric=True)
+    error = RecordField(metric=True)
+    char_count = RecordField(metric=True)
+    priority = RecordField()
+    shrink = RecordField()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # The data behind this widget, read by the deck
+        self.record = ContextRecord(id(self), context_model.GIT)
+
+        self.spec = GitSpec()
+        # Last resolved text, and the token of the refresh in flight
+        self.cached_text = None
+        self.error = None
+        self.load_token = None
+        self.char_count = 0
+        # Packing settings used when fitting the deck into a token budget
+        self.priority = DEFAULT_PRIORITY
+        self.shrink = DEFAULT_SHRINK
+
+        self.setup_ui()
+        self.name_input.textChanged.connect(self.record.set_name)
+
+    def setup_ui(self):
+        # Header row with notes and buttons
+        header_layout = QHBoxLayout()
+        header_layout.setSpacing(5)
+
+        self.name_input = QLineEdit()
+        self.name_input.setPlaceholderText("Git Context")
+        self.name_input.setFont(QFont(FONT_FAMILY, 10))
+        self.name_input.setStyleSheet(name_input_style)
+        header_layout.addWidget(self.name_input, 1)
+
+        buttons_layout = self.create_header_buttons()
+
+        # Refresh button
+        self.refresh_button = QPushButton()
+        self.refresh_button.setIcon(QIcon.fromTheme("view-refresh",
+                                  QIcon(QApplication.style().standardIcon(QApplication.style().StandardPixmap.SP_BrowserReload))))
+        self.refresh_button.setToolTip("Refresh")
+        self.refresh_button.setFixedSize(24, 24)
+        self.refresh_button.clicked.connect(self.start_refresh)
+        self.refresh_button.setStyleSheet(duplicate_button_style)
+        buttons_layout.addWidget(self.refresh_button)
+
+        header_layout.addLayout(buttons_layout)
+        self.content_layout.addLayout(header_layout)
+
+        # What to show: mode, repository and target
+        spec_layout = QHBoxLayout()
+        spec_layout.setSpacing(5)
+
+        self.mode_input = QComboBox()
+        for mode, label in GIT_MODES.items():
+            self.mode_input.addItem(label, mode)
+        self.mode_input.setFont(QFont(FONT_FAMILY, 9))
+        self.mode_input.currentIndexChanged.connect(self.on_spec_edited)
+        spec_layout.addWidget(self.mode_input)
+
+        self.repo_input = QLineEdit()
+        self.repo_input.setPlaceholderText("Repository folder")
+        self.repo_input.setFont(QFont(FONT_FAMILY, 9))
+        self.repo_input.setStyleSheet(name_input_style)
+        self.repo_input.editingFinished.connect(self.on_spec_edited)
+        spec_layout.addWidget(self.repo_input, 1)
+
+        self.repo_button = QPushButton("...")
+        self.repo_button.setFixedSize(24, 24)
+        self.repo_button.setToolTip("Choose repository")
+        self.repo_button.clicked.connect(self.on_choose_repo_clicked)
+        self.repo_button.setStyleSheet(duplicate_button_style)
+        spec_layout.addWidget(self.repo_button)
+
+        self.target_input = QLineEdit()
+        self.target_input.setFont(QFont(FONT_FAMILY, 9))
+        self.target_input.setStyleSheet(name_input_style)
+        self.target_input.editingFinished.connect(self.on_spec_edited)
+        spec_layout.addWidget(self.target_input, 1)
+
+        self.content_layout.addLayout(spec_layout)
+
+        # Info and status
+        info_layout = QHBoxLayout()
+        info_layout.setSpacing(5)
+
+        self.info_label = QLabel("No repository selected")
+        self.info_label.setFont(QFont(FONT_FAMILY, 9))
+        self.info_label.setStyleSheet("color: #7f8c8d;")
+        info_layout.addWidget(self.info_label, 1)
+
+        self.char_count_label = QLabel("Characters: -")
+        self.char_count_label.setFont(QFont(FONT_FAMILY, 8))
+        self.char_count_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        info_layout.addWidget(self.char_count_label)
+
+        self.status_indicator = QLabel("")
+        self.status_indicator.setFont(QFont(FONT_FAMILY, 8))
+        info_layout.addWidget(self.status_indicator)
+
+        self.content_layout.addLayout(info_layout)
+
+        separator = QFrame()
+        separator.setFrameShape(QFrame.Shape.HLine)
+        separator.setFrameShadow(QFrame.Shadow.Sunken)
+        separator.setStyleSheet("background-color: #e8e8e8; margin: 4px 0;")
+        self.content_layout.addWidget(separator)
+
+        self.update_target_placeholder()
+
+    def update_target_placeholder(self):
+        if self.spec.mode == "revision":
+            self.target_input.setPlaceholderText("path/to/file@rev")
+        else:
+            self.target_input.setPlaceholderText("Limit to path (optional)")
+
+    def on_choose_repo_clicked(self):
+        """Pick the repository folder"""
+        try:
+            from PyQt6.QtWidgets import QFileDialog
+            path = QFileDialog.getExistingDirectory(self, "Select a Repository", self.spec.repo)
+            if path:
+                self.repo_input.setText(path)
+                self.on_spec_edited()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to open folder dialog: {e}")
+
+    def on_spec_edited(self, *args):
+        spec = GitSpec(self.mode_input.currentData(), self.repo_input.text().strip(),
+                       self.target_input.text().strip())
+        if spec.to_dict() != self.spec.to_dict():
+            self.set_spec(spec)
+
+    def set_spec(self, spec: GitSpec):
+        """Show a new spec and resolve it in the background"""
+        self.spec = spec
+        for widget, value in ((self.repo_input, spec.repo), (self.target_input, spec.target)):
+            if widget.text() != value:
+                widget.setText(value)
+        index = self.mode_input.findData(spec.mode)
+        if index != self.mode_input.currentIndex():
+            self.mode_input.blockSignals(True)
+            self.mode_input.setCurrentIndex(index)
+            self.mode_input.blockSignals(False)
+        self.update_target_placeholder()
+
+        self.cached_text = None
+        self.error = None
+        if not self.name_input.text() and spec.repo:
+            self.name_input.setText(f"{Path(spec.repo).name}: {spec.describe()}")
+        self.start_refresh()
+
+    def start_refresh(self):
+        """Resolve the spec on the loader pool; a newer refresh supersedes this one"""
+        if not self.spec.repo:
+            self.info_label.setText("No repository selected")
+            return
+        self.cancel_load()
+        token = self.load_token = CancelToken()
+        self.status_indicator.setText("Loading...")
+        self.status_indicator.setStyleSheet("color: #3498db;")
+
+        def done(text):
+            self.load_token = None
+            self.apply_result(text)
+
+        def failed(error):
+            self.load_token = None
+            self.apply_result("", str(error))
+
+        load_async(resolve, self.spec, on_done=done, on_error=failed,
+                   priority=load_priority(self), token=token)
+
+    def cancel_load(self):
+        """Drop the result of the refresh in flight, if any"""
+        if self.load_token is not None:
+            self.load_token.cancel()
+            self.load_token = None
+
+    def apply_result(self, text, error=None):
+        if error:
+            if self.cached_text is not None or self.error != error:
+                self.cached_text = None
+                self.error = error
+            self.info_label.setText(self.spec.describe())
+            self.status_indicator.setText("Error")
+            self.status_indicator.setToolTip(error)
+            self.status_indicator.setStyleSheet("color: #e74c3c;")
+            return
+
+        # Refreshed before every copy; unchanged results leave the record (and the built prompt) alone
+        if text != self.cached_text or self.error is not None:
+            self.cached_text = text
+            self.error = None
+            self.char_count = len(text)
+        self.char_count_label.setText(f"Characters: {self.char_count}")
+        empty = " (no changes)" if not text and self.spec.mode != "revision" else ""
+        self.info_label.setText(self.spec.describe() + empty)
+        self.status_indicator.setText("")
+        self.status_indicator.setToolTip("")
+
+    def read_latest_content(self):
+        """
+        Return (content, success) from the last resolve. The deck refreshes
+        git contexts in the background right before assembling.
+        """
+        if self.cached_text is None:
+            return "", False
+        return self.cached_text, True
+
+    def on_delete(self):
+        """Removes itself from the layout and the main list."""
+        try:
+            self.cancel_load()  # Ignore any result still in flight
+            self.setParent(None)
+            self.deleteLater()
+        except Exception as e:
+            print(f"Error in context deletion: {e}")
+
+    def get_data(self) -> Dict[str, str]:
+        """Return the context data structure with the git spec"""
+        try:
+            return dict(self.record.to_state())
+        except Exception as e:
+            print(f"Error getting data: {e}")
+            return {"name": "Error", "is_git": True}
+
+    def set_data(self, data: Dict[str, str]):
+        """Load previously saved git context"""
+        try:
+            self.name_input.setText(str(data.get("name") or ""))
+            self.priority = int(data.get("priority", DEFAULT_PRIORITY))
+            self.shrink = str(data.get("shrink", DEFAULT_SHRINK))
+            self.set_spec(GitSpec(str(data.get("mode") or "diff"), str(data.get("repo") or ""),
+                                  str(data.get("target") or "")))
+        except Exception as e:
+            print(f"Error setting git context data: {e}")
+            self.name_input.setText("Error")
+            self.info_label.setText(f"Error loading git context: {e}")
+
+    def create_duplicate(self) -> 'GitContextInput':
+        """Create a duplicate of this git context"""
+        dup = GitContextInput()
+        dup.name_input.setText(self.name_input.text())
+        dup.priority = self.priority
+        dup.shrink = self.shrink
+        dup.set_spec(GitSpec(**self.spec.to_dict()))
+        return dup
@@ -0,0 +1,164 @@
+"""
+The deck's contexts in display order, indexed by context id.
+
+A doubly linked list plus an id -> node map: looking a context up by id,
+checking membership, removing it and moving it before or after another
+context are O(1), so drag-reordering doesn't depend on the deck size.
+Positional access (contexts[i], index()) walks the list and is O(n); it's
+only used for one-off lookups.
+
+Iteration works like a list, and it's safe to remove the current context
+while iterating.
+"""
+from typing import Any, Dict, Iterator, Optional
+
+
+class _Node:
+    __slots__ = ("context", "prev", "next")
+
+    def __init__(self, context: Any):
+        self.context = context
+        self.prev: Optional["_Node"] = None
+        self.next: Optional["_Node"] = None
+
+
+class ContextList:
+    """Ordered contexts keyed by their `id` attribute"""
+
+    def __init__(self, contexts=()):
+        self.nodes: Dict[int, _Node] = {}
+        self.head: Optional[_Node] = None
+        self.tail: Optional[_Node] = None
+        for context in contexts:
+            self.append(context)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __bool__(self) -> bool:
+        return bool(self.nodes)
+
+    def __iter__(self) -> Iterator[Any]:
+        node = self.head
+        while node is not None:
+            following = node.next
+            yield node.context
+            node = following
+
+    def __reversed__(self) -> Iterator[Any]:
+        node = self.tail
+        while node is not None:
+            preceding = node.prev
+            yield node.context
+            node = preceding
+
+    def __contains__(self, context: Any) -> bool:
+        return self._node(context) is not None
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("context index out of range")
+        # Walk from the nearer end
+        if index < len(self) // 2:
+            iterator, steps = iter(self), index
+        else:
+            iterator, steps = reversed(self), len(self) - 1 - index
+        for _ in range(steps):
+            next(iterator)
+        return next(iterator)
+
+    def __repr__(self) -> str:
+        return f"ContextList({list(self)!r})"
+
+    def get(self, context_id: int) -> Optional[Any]:
+        """The context with this id, None if it's not in the deck"""
+        node = self.nodes.get(context_id)
+        return node.context if node is not None else None
+
+    def index(self, context: Any) -> int:
+        for position, other in enumerate(self):
+            if other is context:
+                return position
+        raise ValueError("context is not in the deck")
+
+    def append(self, context: Any):
+        self._link(self._new_node(context), None)
+
+    def insert(self, index: int, context: Any):
+        """list.insert() semantics: indices past the end append"""
+        if index < 0:
+            index = max(0, index + len(self))
+        before = self[index] if index < len(self) else None
+        self._link(self._new_node(context), self._node(before))
+
+    def insert_before(self, context: Any, before: Any):
+        self._link(self._new_node(context), self._require(before))
+
+    def insert_after(self, context: Any, after: Any):
+        self._link(self._new_node(context), self._require(after).next)
+
+    def remove(self, context: Any):
+        node = self._require(context)
+        self._unlink(node)
+        del self.nodes[context.id]
+
+    def move_before(self, context: Any, before: Any):
+        """Move `context` so that it comes right before `before`"""
+        node, target = self._require(context), self._require(before)
+        if node is target or node.next is target:
+            return
+        self._unlink(node)
+        self._link(node, target)
+
+    def clear(self):
+        self.nodes.clear()
+        self.head = self.tail = None
+
+    def _node(self, context: Any) -> Optional[_Node]:
+        node = self.nodes.get(getattr(context, "id", None))
+        return node if node is not None and node.context is context else None
+
+    def _require(self, context: Any) -> _Node:
+        node = self._node(context)
+        if node is None:
+            raise ValueError("context is not in the deck")
+        return node
+
+    def _new_node(self, context: Any) -> _Node:
+        if context.id in self.nodes:
+            raise ValueError("context is already in the deck")
+        node = _Node(context)
+        self.nodes[context.id] = node
+        return node
+
+    def _link(self, node: _Node, before: Optional[_Node]):
+        """Link `node` in front of `before`, or at the end"""
+        if before is None:
+            node.prev, node.next = self.tail, None
+            if self.tail is not None:
+                self.tail.next = node
+            else:
+                self.head = node
+            self.tail = node
+        else:
+            node.prev, node.next = before.prev, before
+            if before.prev is not None:
+                before.prev.next = node
+            else:
+                self.head = node
+            before.prev = node
+
+    def _unlink(self, node: _Node):
+        if node.prev is not None:
+            node.prev.next = node.next
+        else:
+            self.head = node.next
+        if node.next is not None:
+            node.next.prev = node.prev
+        else:
+            self.tail = node.prev
+        node.prev = node.next = None
@@ -0,0 +1,322 @@
+"""
+The deck's contexts as data.
+
+Each context widget owns a ContextRecord holding everything the deck needs
+from it: name, text, file path, git spec, packing options and cached
+metrics. The widget writes through to its record as the user edits (its
+attributes like `priority` or `file_path` are RecordFields), so saving,
+counting and assembling read plain Python objects instead of walking
+widgets:
+
+    ContextModel      QAbstractListModel of the records, in deck order
+    record.to_state() the dict saved in state.json, cached until the record changes
+    record.revision   bumped on every change (not on metrics), for caches keyed on content
+    record.changed_at when the assembled text last changed, for stable ordering
+"""
+from typing import Any, Dict, Iterator, List, Optional
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from .context_list import ContextList
+from .packer import DEFAULT_PRIORITY, DEFAULT_SHRINK
+
+TEXT = "text"
+FILE = "file"
+GIT = "git"
+
+
+class ContextRecord:
+    """Data of one context"""
+
+    __slots__ = ("id", "kind", "name", "text", "spill_path", "file_name", "file_path", "priority", "shrink",
+                 "compaction", "snippet", "grep", "truncation", "extract_html", "spec", "cached_text", "error",
+                 "char_count", "last_compaction", "revision", "content_digest", "changed_at", "rendered",
+                 "state", "model", "__weakref__")  # Qt signals hold their slots weakly
+
+    def __init__(self, context_id: int, kind: str):
+        self.id = context_id
+        self.kind = kind
+        self.name = ""
+        # Typed or loaded text (text contexts only)
+        self.text = ""
+        # Text contexts too large to edit: the file holding their text (see spill.py)
+        self.spill_path: Optional[str] = None
+        self.file_name: Optional[str] = None
+        self.file_path: Optional[str] = None
+        self.priority = DEFAULT_PRIORITY
+        self.shrink = DEFAULT_SHRINK
+        # File contexts: enabled compaction transforms and the region to include
+        self.compaction: List[str] = []
+        self.snippet = None
+        # File contexts: lines to keep (None for all of them)
+        self.grep = None
+        # File contexts: part of a large file to keep (None for the default limit)
+        self.truncation = None
+        # File contexts: paste the visible text of HTML pages instead of the markup
+        self.extract_html = False
+        # Git contexts: what to show and the last resolved text
+        self.spec = None
+        self.cached_text: Optional[str] = None
+        self.error: Optional[str] = None
+        # Metrics from the last read
+        self.char_count = 0
+        self.last_compaction = None
+        self.revision = 0
+        # Hash of the text last assembled and when it last changed, for stable ordering
+        self.content_digest: Optional[str] = None
+        self.changed_at: Optional[float] = None
+        # (render key, block) of the last assembly, see PromptDeck.render_key
+        self.rendered = None
+        # Cached to_state(), None when the record changed since
+        self.state: Optional[Dict] = None
+        self.model: Optional["ContextModel"] = None
+
+    def touch(self):
+        """Note that the record changed"""
+        self.revision += 1
+        self.state = None
+        self.notify()
+
+    def notify(self):
+        """Update the views, e.g. after a metric changed"""
+        if self.model is not None:
+            self.model.record_changed(self)
+
+    def set_name(self, name: str):
+        if name != self.name:
+            self.name = name
+            self.touch()
+
+    def set_text(self, text: str):
+        if text is not self.text:
+            self.text = text
+            self.char_count = len(text)
+            self.touch()
+
+    def set_spill(self, path: Optional[str], chars: int = 0):
+        """Hold the text in the spill file at `path` (None to go back to editing it)"""
+        self.spill_path = path
+        self.text = ""
+        self.char_count = chars
+        self.touch()
+
+    def note_content(self, digest: str, now: float):
+        """Note the hash of the text just assembled; `changed_at` moves when it differs"""
+        if digest != self.content_digest:
+            self.content_digest = digest
+            self.changed_at = now
+            # Saved with the record, but not a change to it
+            self.state = None
+
+    def set_history(self, data: Optional[Dict]):
+        """Restore what note_content() saved"""
+        if isinstance(data, dict) and isinstance(data.get("changed_at"), (int, float)):
+            self.content_digest = data.get("digest")
+            self.changed_at = float(data["changed_at"])
+            self.state = None
+
+    @property
+    def content(self) -> str:
+        """Text as pasted: loaded files are wrapped in a fenced block"""
+        return self.wrap(self.text)
+
+    def wrap(self, text: str) -> str:
+        """`text` as pasted, in a fenced block if it's a loaded file's"""
+        if self.file_name:
+            return f"{self.file_name}\n```text\n{text}\n```"
+        return text
+
+    @property
+    def label(self) -> str:
+        """Short description (file contexts by file name)"""
+        if self.file_name:
+            return self.file_name
+        if self.kind == GIT and self.spec is not None:
+            return self.spec.describe()
+        return self.name
+
+    @property
+    def region(self) -> Optional[str]:
+        """Which part of the file a file context includes, None for the whole file"""
+        parts = [self.snippet.describe() if self.snippet else "",
+                 f"grep {self.grep.describe()}" if self.grep else "",
+                 self.truncation.describe() if self.truncation else ""]
+        return ", ".join(part for part in parts if part) or None
+
+    def to_state(self) -> Dict:
+        """The dict saved in state.json"""
+        if self.state is None:
+            if self.kind == FILE:
+                self.state = {
+                    "name": self.name,
+                    "file_path": str(self.file_path) if self.file_path else "",
+                    "priority": self.priority,
+                    "shrink": self.shrink,
+                    "compaction": list(self.compaction),
+                    "snippet": self.snippet.to_dict() if self.snippet else None,
+                    "grep": self.grep.to_dict() if self.grep else None,
+                    "truncation": self.truncation.to_dict() if self.truncation else None,
+                    "extract_html": self.extract_html,
+                    "is_file": True  # Flag to identify file context type
+                }
+            elif self.kind == GIT:
+                self.state = {
+                    "name": self.name,
+                    "priority": self.priority,
+                    "shrink": self.shrink,
+                    "is_git": True  # Flag to identify git context type
+                }
+                if self.spec is not None:
+                    self.state.update(self.spec.to_dict())
+            elif self.spill_path:
+                self.state = {
+                    "name": self.name,
+                    "spill_path": self.spill_path,
+                    "char_count": self.char_count,
+                    "file_name": self.file_name,
+                    "priority": self.priority,
+                    "shrink": self.shrink
+                }
+            else:
+                self.state = {
+                    "name": self.name,
+                    "content": self.content,
+                    "priority": self.priority,
+                    "shrink": self.shrink
+                }
+            if self.changed_at is not None:
+                self.state["history"] = {"digest": self.content_digest, "changed_at": self.changed_at}
+        return self.state
+
+
+class RecordField:
+    """A widget attribute stored on the widget's ContextRecord"""
+
+    def __init__(self, metric: bool = False):
+        # Metrics from reading the content aren't changes to it and don't bump the revision
+        self.metric = metric
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, widget, owner=None):
+        if widget is None:
+            return self
+        return getattr(widget.record, self.name)
+
+    def __set__(self, widget, value):
+        setattr(widget.record, self.name, value)
+        if self.metric:
+            widget.record.notify()
+        else:
+            widget.record.touch()
+
+
+class ContextModel(QAbstractListModel):
+    """The deck's records in order, looked up by context id"""
+
+    RecordRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = ContextList()
+        # Records by row and row numbers by id, rebuilt after the order changes
+        self.order: Optional[List[ContextRecord]] = None
+        self.rows: Optional[Dict[int, int]] = None
+
+    def __iter__(self) -> Iterator[ContextRecord]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def record(self, context_id: int) -> Optional[ContextRecord]:
+        return self.records.get(context_id)
+
+    def row(self, record: ContextRecord) -> int:
+        self.index_rows()
+        return self.rows[record.id]
+
+    def index_rows(self):
+        if self.rows is None:
+            self.order = list(self.records)
+            self.rows = {r.id: row for row, r in enumerate(self.order)}
+
+    def invalidate_rows(self):
+        self.order = self.rows = None
+
+    #
+    # Qt model
+    #
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.records)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self.records):
+            return None
+        self.index_rows()
+        record = self.order[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return record.label or f"Context {index.row() + 1}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return record.file_path or record.name
+        if role == self.RecordRole:
+            return record
+        return None
+
+    def record_changed(self, record: ContextRecord):
+        index = self.index(self.row(record))
+        self.dataChanged.emit(index, index)
+
+    #
+    # Changes, mirroring the deck's widget list
+    #
+    def add(self, record: ContextRecord, after: Optional[ContextRecord] = None):
+        row = self.row(after) + 1 if after is not None else len(self.records)
+        self.beginInsertRows(QModelIndex(), row, row)
+        if after is not None:
+            self.records.insert_after(record, after)
+        else:
+            self.records.append(record)
+        record.model = self
+        self.invalidate_rows()
+        self.endInsertRows()
+
+    def remove(self, record: ContextRecord):
+        if record not in self.records:
+            return
+        row = self.row(record)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.records.remove(record)
+        record.model = None
+        self.invalidate_rows()
+        self.endRemoveRows()
+
+    def move_before(self, record: ContextRecord, before: ContextRecord):
+        source, target = self.row(record), self.row(before)
+        if not self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), target):
+            return  # Already in place
+        self.records.move_before(record, before)
+        self.invalidate_rows()
+        self.endMoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        for record in self.records:
+            record.model = None
+        self.records.clear()
+        self.invalidate_rows()
+        self.endResetModel()
+
+    #
+    # Deck-wide data
+    #
+    def get_state(self) -> List[Dict]:
+        return [record.to_state() for record in self.records]
+
+    def total_chars(self) -> int:
+        return sum(record.char_count for record in self.records)
+
+    def template_sources(self) -> List[str]:
+        """Typed text, the only text that can hold template placeholders"""
+        return [record.text for record in self.records if record.kind == TEXT and not record.file_name]
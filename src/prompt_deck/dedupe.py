@@ -0,0 +1,164 @@
+"""
+Duplicate and overlap detection for contexts.
+
+Two file contexts are duplicates if they resolve to the same canonical path
+(symlinks, relative spellings), the same inode (hard links) or the same
+content. A block also overlaps another if its whole text appears inside the
+other one, e.g. a snippet pasted from a file that is also attached in full.
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .context_block import ContextBlock
+from .file_cache import canonical_path, file_signature, file_cache
+
+# Shorter blocks aren't checked for overlap, they'd match by accident
+MIN_OVERLAP_CHARS = 80
+
+
+def find_duplicate_file(path: str, others: Iterable[str]) -> Optional[Tuple[str, str]]:
+    """
+    Check `path` against other file paths.
+    Returns (other_path, reason) for the first duplicate, or None.
+    """
+    canonical = canonical_path(path)
+    signature = file_signature(path)
+    same_size = []
+
+    for other in others:
+        if not other:
+            continue
+        if canonical_path(other) == canonical:
+            return other, "same file"
+        other_signature = file_signature(other)
+        if signature is None or other_signature is None:
+            continue
+        if (signature.dev, signature.ino) == (other_signature.dev, other_signature.ino):
+            return other, "hard link"
+        if signature.size == other_signature.size:
+            same_size.append(other)
+
+    # Only hash files that could possibly match
+    if signature is not None and same_size:
+        try:
+            digest = file_cache.digest(path)
+            for other in same_size:
+                if file_cache.digest(other) == digest:
+                    return other, "same content"
+        except OSError:
+            pass
+    return None
+
+
+
+class DuplicateIndex:
+    """
+    find_duplicate_file() for many paths at once: existing paths are indexed
+    by canonical path, inode and size, so checking a batch of N dropped files
+    against a deck of M files is O(N + M) instead of O(N * M).
+    """
+
+    def __init__(self, paths: Iterable[str] = ()):
+        self.by_canonical: Dict[str, str] = {}
+        self.by_inode: Dict[Tuple[int, int], str] = {}
+        # Paths are only hashed once a file of the same size is looked up
+        self.by_size: Dict[int, List[str]] = {}
+        self.by_digest: Dict[str, str] = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path: str):
+        if not path:
+            return
+        self.by_canonical.setdefault(canonical_path(path), path)
+        signature = file_signature(path)
+        if signature is not None:
+            self.by_inode.setdefault((signature.dev, signature.ino), path)
+            self.by_size.setdefault(signature.size, []).append(path)
+
+    def find(self, path: str) -> Optional[Tuple[str, str]]:
+        """Same result as find_duplicate_file(path, <indexed paths>)"""
+        other = self.by_canonical.get(canonical_path(path))
+        if other is not None:
+            return other, "same file"
+        signature = file_signature(path)
+        if signature is None:
+            return None
+        other = self.by_inode.get((signature.dev, signature.ino))
+        if other is not None:
+            return other, "hard link"
+        if signature.size not in self.by_size:
+            return None
+        # Hash the waiting files of this size, each file is hashed at most once
+        for other in self.by_size[signature.size]:
+            try:
+                self.by_digest.setdefault(file_cache.digest(other), other)
+            except OSError:
+                pass
+        self.by_size[signature.size] = []
+        try:
+            other = self.by_digest.get(file_cache.digest(path))
+        except OSError:
+            return None
+        return (other, "same content") if other is not None else None
+
+
+def dedupe_blocks(blocks: List[ContextBlock],
+                  min_overlap: int = MIN_OVERLAP_CHARS) -> Tuple[List[ContextBlock], List[str]]:
+    """
+    Replace duplicated or fully overlapped blocks with a short reference.
+    The first occurrence (or the containing block) is kept.
+    Returns the new block list and a description of each replacement.
+    """
+    replaced: Dict[int, ContextBlock] = {}  # index -> block it duplicates
+    # File identities include the region, different snippets of a file aren't duplicates
+    seen_paths: Dict[Tuple[str, Optional[str]], int] = {}
+    seen_inodes: Dict[Tuple[int, int, Optional[str]], int] = {}
+    seen_digests: Dict[str, int] = {}
+
+    for index, block in enumerate(blocks):
+        original = None
+        if block.path:
+            path_key = (block.canonical_path, block.region)
+            original = seen_paths.get(path_key)
+            signature = file_signature(block.path)
+            inode = (signature.dev, signature.ino, block.region) if signature else None
+            if original is None and inode is not None:
+                original = seen_inodes.get(inode)
+            seen_paths.setdefault(path_key, index)
+            if inode is not None:
+                seen_inodes.setdefault(inode, index)
+        if original is None and block.raw:
+            original = seen_digests.get(block.digest)
+        if block.raw:
+            seen_digests.setdefault(block.digest, index)
+        if original is not None and original != index:
+            replaced[index] = blocks[original]
+
+    # Partial overlap: a block whose text is contained in a longer kept block
+    candidates = sorted((i for i in range(len(blocks)) if i not in replaced),
+                        key=lambda i: len(blocks[i].raw), reverse=True)
+    for position, index in enumerate(candidates):
+        raw = blocks[index].raw.strip()
+        if len(raw) < min_overlap:
+            continue
+        for container in candidates[:position]:
+            if container in replaced or len(blocks[container].raw) <= len(raw):
+                continue
+            if raw in blocks[container].raw:
+                replaced[index] = blocks[container]
+                break
+
+    result = []
+    report = []
+    for index, block in enumerate(blocks):
+        original = replaced.get(index)
+        if original is None:
+            result.append(block)
+            continue
+        result.append(ContextBlock(block.name, f"[Omitted: contained in \"{original.name}\"]",
+                                   raw="", priority=block.priority, shrink=block.shrink,
+                                   context_id=block.context_id))
+        report.append(f"{block.name or os.path.basename(block.path or '') or 'context'}"
+                      f" duplicates {original.name or 'another context'}")
+    return result, report
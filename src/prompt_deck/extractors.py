@@ -0,0 +1,440 @@
+"""
+Text extraction for structured file formats.
+
+Files whose extension (or guessed MIME type) has a registered extractor are
+turned into plain text instead of being decoded as UTF-8:
+
+    .ipynb                  cells as markdown and fenced code, outputs optional
+    .docx                   paragraph text
+    .pptx                   slide text, one section per slide
+    .odt .odp .ods          paragraph text
+    .html .htm .xhtml       visible text, without scripts and styles (opt-in)
+    .epub                   chapter text in reading order
+
+Extraction is CPU bound, so files of PROCESS_MIN_SIZE and more are extracted
+in a small process pool; smaller ones (and extractors that can't be pickled)
+run in the calling thread. Results are cached by the file cache like any
+other read, keyed by file signature and the extraction options.
+
+HTML is as often the source being worked on as a page to read, so its
+extractor is opt-in: only file contexts that ask for the page text use it,
+everything else (text contexts, previews of other contexts, grep) reads
+the markup.
+
+Register more formats with register_extractor(); the function gets the path
+and the current options dict and returns text.
+"""
+import codecs
+import html
+import json
+import mimetypes
+import os
+import pickle
+import posixpath
+import re
+import sys
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from xml.etree import ElementTree
+
+# Smaller files are cheaper to extract than to send to another process
+PROCESS_MIN_SIZE = 256 * 1024
+PROCESS_WORKERS = 2
+# Archives expanding to more XML than this are not extracted (zip bombs)
+MAX_XML_SIZE = 64 * 1024 * 1024
+# Notebook outputs are cut to this many characters each
+MAX_OUTPUT_CHARS = 2000
+# How often a waiting read checks its cancel token
+POLL_INTERVAL = 0.05
+
+
+class ExtractionError(Exception):
+    """The file isn't a valid document of its format"""
+
+
+class Extractor(NamedTuple):
+    name: str
+    function: Callable[[str, Dict[str, Any]], str]
+    extensions: Tuple[str, ...]
+    mime_types: Tuple[str, ...]
+    # Option names the output depends on (part of the cache key)
+    options: Tuple[str, ...]
+    # Only used for reads that ask for it (see find_extractor)
+    opt_in: bool = False
+
+
+_by_extension: Dict[str, Extractor] = {}
+_by_mime: Dict[str, Extractor] = {}
+
+# Settings passed to every extractor
+options: Dict[str, Any] = {
+    "notebook_outputs": False,
+}
+
+
+def register_extractor(name: str, function: Callable[[str, Dict[str, Any]], str],
+                       extensions=(), mime_types=(), option_names=(), opt_in: bool = False) -> Extractor:
+    """
+    Use `function` for files with the given extensions (".ext") or MIME
+    types; with `opt_in` only when the read asks for it
+    """
+    extractor = Extractor(name, function, tuple(e.lower() for e in extensions),
+                          tuple(mime_types), tuple(option_names), opt_in)
+    for extension in extractor.extensions:
+        _by_extension[extension] = extractor
+    for mime_type in extractor.mime_types:
+        _by_mime[mime_type] = extractor
+    return extractor
+
+
+def find_extractor(path: str, opt_in: bool = False) -> Optional[Extractor]:
+    """The extractor for `path`, None for files read as text. Opt-in extractors only with `opt_in`."""
+    extractor = _by_extension.get(os.path.splitext(path)[1].lower())
+    if extractor is None and _by_mime:
+        mime_type, _ = mimetypes.guess_type(path, strict=False)
+        extractor = _by_mime.get(mime_type)
+    if extractor is not None and extractor.opt_in and not opt_in:
+        return None
+    return extractor
+
+
+def cache_key(extractor: Extractor) -> str:
+    """Identifies the extractor output for the current options"""
+    values = ",".join(f"{name}={options.get(name)!r}" for name in extractor.options)
+    return f"{extractor.name}({values})"
+
+
+def set_option(name: str, value: Any):
+    options[name] = value
+
+
+#
+# Running extractors
+#
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+        return _pool
+
+
+def shutdown_process_pool():
+    """Stop the extraction processes (on exit)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    if sys.version_info >= (3, 9):
+        pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        pool.shutdown(wait=False)
+
+
+def _run(function, path: str, opts: Dict[str, Any]) -> str:
+    try:
+        return function(path, opts)
+    except (ExtractionError, OSError, UnicodeDecodeError) as e:
+        return f"[Could not extract text from {os.path.basename(path)}: {e}]"
+    except (ValueError, KeyError, TypeError, ElementTree.ParseError, zipfile.BadZipFile) as e:
+        return f"[Could not extract text from {os.path.basename(path)}: not a valid file ({e})]"
+
+
+def extract_text(path: str, extractor: Extractor, size: int, token=None) -> str:
+    """
+    Run `extractor` on `path`. Big files go to the process pool; the calling
+    thread waits, giving up when the loader `token` is cancelled.
+    """
+    opts = dict(options)
+    if size < PROCESS_MIN_SIZE:
+        return _run(extractor.function, path, opts)
+    try:
+        pickle.dumps(extractor.function)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return _run(extractor.function, path, opts)  # e.g. a lambda
+
+    try:
+        future = _process_pool().submit(_run, extractor.function, path, opts)
+    except (BrokenProcessPool, RuntimeError, OSError) as e:
+        print(f"Extraction process pool unavailable, extracting in this thread: {e}")
+        shutdown_process_pool()
+        return _run(extractor.function, path, opts)
+    while True:
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except FutureTimeout:
+            if token is not None and token.cancelled:
+                future.cancel()
+                token.check()
+        except BrokenProcessPool as e:
+            print(f"Extraction process died, extracting in this thread: {e}")
+            shutdown_process_pool()
+            return _run(extractor.function, path, opts)
+
+
+#
+# Built-in extractors
+#
+def _read_zip_xml(archive: zipfile.ZipFile, name: str) -> ElementTree.Element:
+    info = archive.getinfo(name)
+    if info.file_size > MAX_XML_SIZE:
+        raise ExtractionError(f"{name} is too large ({info.file_size} bytes)")
+    return ElementTree.fromstring(archive.read(name))
+
+
+def _join_lines(paragraphs: List[str]) -> str:
+    return "\n".join(paragraphs).strip("\n")
+
+
+def _source(value) -> str:
+    """Notebook sources and outputs are a string or a list of lines"""
+    return "".join(value) if isinstance(value, list) else str(value or "")
+
+
+def _notebook_output(output: Dict) -> str:
+    kind = output.get("output_type")
+    if kind == "stream":
+        text = _source(output.get("text"))
+    elif kind in ("execute_result", "display_data", "pyout"):
+        data = output.get("data") or output
+        text = _source(data.get("text/plain") or data.get("text"))
+        if not text:
+            kinds = [k for k in data if "/" in k]
+            text = f"[{', '.join(kinds)} output]" if kinds else ""
+    elif kind in ("error", "pyerr"):
+        text = f"{output.get('ename', 'Error')}: {output.get('evalue', '')}"
+    else:
+        text = ""
+    if len(text) > MAX_OUTPUT_CHARS:
+        text = text[:MAX_OUTPUT_CHARS] + "\n[output truncated]"
+    return text.rstrip("\n")
+
+
+def extract_notebook(path: str, opts: Dict[str, Any]) -> str:
+    """Markdown cells as they are, code cells fenced, outputs only if asked for"""
+    with open(path, encoding="utf-8") as f:
+        notebook = json.load(f)
+    metadata = notebook.get("metadata") or {}
+    language = ((metadata.get("kernelspec") or {}).get("language")
+                or (metadata.get("language_info") or {}).get("name") or "")
+    cells = notebook.get("cells")
+    if cells is None:
+        # nbformat 3 keeps cells in worksheets
+        cells = [cell for sheet in notebook.get("worksheets", []) for cell in sheet.get("cells", [])]
+
+    parts = []
+    for cell in cells:
+        kind = cell.get("cell_type")
+        source = _source(cell.get("source", cell.get("input"))).strip("\n")
+        if kind == "code":
+            if source.strip():
+                parts.append(f"```{language}\n{source}\n```")
+            if opts.get("notebook_outputs"):
+                outputs = [text for text in map(_notebook_output, cell.get("outputs") or []) if text]
+                if outputs:
+                    parts.append("Output:\n```\n" + "\n".join(outputs) + "\n```")
+        elif source.strip():
+            parts.append(source)
+    return "\n\n".join(parts)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def extract_docx(path: str, opts: Dict[str, Any]) -> str:
+    with zipfile.ZipFile(path) as archive:
+        root = _read_zip_xml(archive, "word/document.xml")
+    paragraphs = []
+    for paragraph in root.iter(_W + "p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == _W + "t":
+                parts.append(node.text or "")
+            elif node.tag == _W + "tab":
+                parts.append("\t")
+            elif node.tag in (_W + "br", _W + "cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return _join_lines(paragraphs)
+
+
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+
+def extract_pptx(path: str, opts: Dict[str, Any]) -> str:
+    with zipfile.ZipFile(path) as archive:
+        slides = sorted((name for name in archive.namelist()
+                         if re.fullmatch(r"ppt/slides/slide\d+\.xml", name)),
+                        key=lambda name: int(re.search(r"(\d+)\.xml$", name).group(1)))
+        sections = []
+        for number, name in enumerate(slides, 1):
+            root = _read_zip_xml(archive, name)
+            lines = ["".join(node.text or "" for node in paragraph.iter(_A + "t"))
+                     for paragraph in root.iter(_A + "p")]
+            text = _join_lines([line for line in lines if line.strip()])
+            sections.append(f"Slide {number}:\n{text}" if text else f"Slide {number}:")
+    return "\n\n".join(sections)
+
+
+_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+def _odf_text(element: ElementTree.Element) -> str:
+    parts = [element.text or ""]
+    for child in element:
+        if child.tag == _TEXT + "s":
+            parts.append(" " * int(child.get(_TEXT + "c", "1")))
+        elif child.tag == _TEXT + "tab":
+            parts.append("\t")
+        elif child.tag == _TEXT + "line-break":
+            parts.append("\n")
+        elif child.tag not in (_TEXT + "p", _TEXT + "h"):  # Nested paragraphs are listed on their own
+            parts.append(_odf_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def extract_odf(path: str, opts: Dict[str, Any]) -> str:
+    """OpenDocument text, presentations and spreadsheets (cell text per paragraph)"""
+    with zipfile.ZipFile(path) as archive:
+        root = _read_zip_xml(archive, "content.xml")
+    return _join_lines([_odf_text(element) for element in root.iter()
+                        if element.tag in (_TEXT + "p", _TEXT + "h")])
+
+
+class _HTMLText(HTMLParser):
+    """Collects the visible text of an HTML page"""
+
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    # Separated by a blank line
+    PARAGRAPHS = {"p", "pre", "table", "ul", "ol", "dl", "blockquote", "figure", "form", "title",
+                  "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "header", "footer"}
+    # Start a new line
+    LINES = {"div", "br", "li", "tr", "nav", "aside", "main", "dt", "dd", "figcaption", "hr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self.line: List[str] = []
+        self.skip_depth = 0
+        self.pre_depth = 0
+
+    def break_line(self, blank: bool = False):
+        text = "".join(self.line)
+        self.line = []
+        if text.strip():
+            self.lines.append(text.rstrip() if self.pre_depth else " ".join(text.split()))
+        if blank and self.lines and self.lines[-1]:
+            self.lines.append("")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.PARAGRAPHS or tag in self.LINES:
+            self.break_line(blank=tag in self.PARAGRAPHS)
+        if tag in self.SKIP:
+            self.skip_depth += 1
+        elif tag == "pre":
+            self.pre_depth += 1
+        elif tag == "li":
+            self.line.append("- ")
+        elif len(tag) == 2 and tag[0] == "h" and tag[1] in "123456":
+            self.line.append("#" * int(tag[1]) + " ")
+        elif tag in ("td", "th"):
+            self.line.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self.PARAGRAPHS or tag in self.LINES:
+            self.break_line(blank=tag in self.PARAGRAPHS)
+        if tag in self.SKIP:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "pre":
+            self.pre_depth = max(0, self.pre_depth - 1)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if not self.pre_depth:
+            self.line.append(data)
+            return
+        # Preformatted text keeps its lines and indentation
+        first, *rest = data.split("\n")
+        self.line.append(first)
+        for line in rest:
+            self.break_line()
+            self.line.append(line)
+
+    def text(self) -> str:
+        self.break_line()
+        return "\n".join(self.lines).strip("\n")
+
+
+def html_to_text(markup: str) -> str:
+    parser = _HTMLText()
+    parser.feed(markup)
+    parser.close()
+    return parser.text()
+
+
+def _decode_html(data: bytes) -> str:
+    """Decode with the page's declared charset, UTF-8 otherwise"""
+    match = re.search(rb"""<meta[^>]+charset=["']?([\w-]+)""", data[:4096], re.IGNORECASE)
+    encoding = "utf-8"
+    if match:
+        try:
+            encoding = codecs.lookup(match.group(1).decode("ascii")).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return data.decode(encoding, errors="replace")
+
+
+def extract_html(path: str, opts: Dict[str, Any]) -> str:
+    with open(path, "rb") as f:
+        return html_to_text(_decode_html(f.read()))
+
+
+def extract_epub(path: str, opts: Dict[str, Any]) -> str:
+    """Chapters in spine order"""
+    with zipfile.ZipFile(path) as archive:
+        container = _read_zip_xml(archive, "META-INF/container.xml")
+        rootfile = next((e.get("full-path") for e in container.iter() if e.tag.endswith("rootfile")), None)
+        if not rootfile:
+            raise ExtractionError("no package document")
+        package = _read_zip_xml(archive, rootfile)
+        base = posixpath.dirname(rootfile)
+        manifest = {e.get("id"): e.get("href") for e in package.iter() if e.tag.endswith("}item")}
+        chapters = []
+        for itemref in (e for e in package.iter() if e.tag.endswith("}itemref")):
+            href = manifest.get(itemref.get("idref"))
+            if not href:
+                continue
+            name = posixpath.normpath(posixpath.join(base, html.unescape(href)))
+            info = archive.getinfo(name)
+            if info.file_size > MAX_XML_SIZE:
+                raise ExtractionError(f"{name} is too large ({info.file_size} bytes)")
+            text = html_to_text(_decode_html(archive.read(name)))
+            if text:
+                chapters.append(text)
+    return "\n\n".join(chapters)
+
+
+register_extractor("notebook", extract_notebook, extensions=(".ipynb",),
+                   mime_types=("application/x-ipynb+json",), option_names=("notebook_outputs",))
+register_extractor("docx", extract_docx, extensions=(".docx",),
+                   mime_types=("application/vnd.openxmlformats-officedocument.wordprocessingml.document",))
+register_extractor("pptx", extract_pptx, extensions=(".pptx",),
+                   mime_types=("application/vnd.openxmlformats-officedocument.presentationml.presentation",))
+register_extractor("odf", extract_odf, extensions=(".odt", ".odp", ".ods"),
+                   mime_types=("application/vnd.oasis.opendocument.text",
+                               "application/vnd.oasis.opendocument.presentation",
+                               "application/vnd.oasis.opendocument.spreadsheet"))
+register_extractor("html", extract_html, extensions=(".html", ".htm", ".xhtml"),
+                   mime_types=("text/html", "application/xhtml+xml"), opt_in=True)
+register_extractor("epub", extract_epub, extensions=(".epub",), mime_types=("application/epub+zip",))
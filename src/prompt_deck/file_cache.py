@@ -0,0 +1,308 @@
+"""
+Shared file reading with a small in-memory cache.
+
+Files are identified by their canonical path and cached together with their
+stat signature (size, mtime, device, inode), so an unchanged file is only read
+and hashed once no matter how many contexts refer to it. Large files are cut
+while they're read (see truncation.py) and cached per truncation.
+"""
+import codecs
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from .perf import perf
+from .extractors import cache_key, extract_text, find_extractor
+from .truncation import (DEFAULT_TRUNCATION, MAX_FILE_SIZE, READ_CHUNK_SIZE, Truncation,
+                         read_truncated, truncate_text)
+
+# Structured files above this size are read as text instead of being extracted
+MAX_EXTRACT_SIZE = 64 * 1024 * 1024
+
+# Upper bound for the text kept in the cache
+CACHE_MAX_CHARS = 64 * 1024 * 1024
+
+# Inline previews read a page of lines at a time, and at most this much per page
+PAGE_LINES = 200
+PAGE_BYTES = 64 * 1024
+
+
+class FileSignature(NamedTuple):
+    """Identity and version of a file on disk"""
+    size: int
+    mtime_ns: int
+    dev: int
+    ino: int
+
+
+def canonical_path(path: str) -> str:
+    """Resolve symlinks, relative parts and case differences to one spelling"""
+    return os.path.normcase(os.path.realpath(os.path.abspath(os.path.expanduser(path))))
+
+
+def file_signature(path: str) -> Optional[FileSignature]:
+    """Return the signature of `path`, or None if it can't be stat'ed"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return FileSignature(st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino)
+
+
+def content_hash(text: str) -> str:
+    """Hash used to compare context contents"""
+    return hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+class _CacheEntry:
+    __slots__ = ("signature", "text", "digest", "next_offset")
+
+    def __init__(self, signature: FileSignature, text: str):
+        self.signature = signature
+        self.text = text
+        self.digest: Optional[str] = None
+        # For pages: where the next page starts, None after the last one
+        self.next_offset: Optional[int] = None
+
+
+class FileCache:
+    """Thread-safe LRU cache of decoded file contents keyed by canonical path"""
+
+    def __init__(self, max_chars: int = CACHE_MAX_CHARS):
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self.entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _lookup(self, key: str, signature: FileSignature) -> Optional[_CacheEntry]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self.entries.move_to_end(key)
+                perf.cache_hit("files")
+                return entry
+            perf.cache_miss("files")
+            return None
+
+    def _store(self, key: str, signature: FileSignature, text: str) -> _CacheEntry:
+        entry = _CacheEntry(signature, text)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_chars -= len(old.text)
+            self.entries[key] = entry
+            self.total_chars += len(text)
+            while self.total_chars > self.max_chars and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_chars -= len(evicted.text)
+        return entry
+
+    def _cached(self, key: str, signature: FileSignature, load) -> str:
+        """Text cached under `key`, calling load() for it if it's missing or stale"""
+        entry = self._lookup(key, signature)
+        if entry is None:
+            entry = self._store(key, signature, load())
+        return entry.text
+
+    def read(self, path: str, token=None, truncation: Optional[Truncation] = None,
+             opt_in: bool = False) -> Tuple[str, FileSignature]:
+        """
+        Return (text, signature) for `path`, reading it only if it changed.
+        Large files are cut to `truncation` (DEFAULT_TRUNCATION when it's None).
+        With `opt_in`, opt-in extractors are used too (HTML pages as text).
+        Raises FileNotFoundError if the file is gone, and LoadCancelled if
+        the loader `token` is cancelled while reading.
+        """
+        signature = file_signature(path)
+        if signature is None:
+            raise FileNotFoundError(f"File does not exist: {path}")
+
+        extractor = find_extractor(path, opt_in) if signature.size <= MAX_EXTRACT_SIZE else None
+        if extractor is not None:
+            # The whole text is needed to cut it, so it's cached too
+            text = self._cached(self.key(path, extractor), signature,
+                                lambda: _extract(path, extractor, signature.size, token))
+            spec = truncation or (DEFAULT_TRUNCATION if len(text) > MAX_FILE_SIZE else None)
+            if spec is not None and len(text) > spec.max_chars:
+                text = self._cached(self.key(path, extractor, spec), signature, lambda: truncate_text(text, spec))
+            return text, signature
+
+        spec = _file_truncation(signature.size, truncation)
+        if spec is not None:
+            text = self._cached(self.key(path, None, spec), signature,
+                                lambda: _read_truncated(path, spec, signature.size, token))
+        else:
+            text = self._cached(self.key(path), signature, lambda: _read_text(path, signature.size, token))
+        return text, signature
+
+    def read_page(self, path: str, offset: int = 0, max_lines: int = PAGE_LINES,
+                  token=None, opt_in: bool = False) -> Tuple[str, Optional[int], FileSignature]:
+        """
+        Up to `max_lines` lines of `path` from `offset`, without reading the
+        rest of the file. Returns (text, offset of the next page or None
+        after the last one, signature). Offsets are bytes into text files
+        and characters into the text of extracted ones (`opt_in` as for
+        read()). Pages are cached like whole files.
+        """
+        signature = file_signature(path)
+        if signature is None:
+            raise FileNotFoundError(f"File does not exist: {path}")
+
+        extractor = find_extractor(path, opt_in) if signature.size <= MAX_EXTRACT_SIZE else None
+        if extractor is not None:
+            # Extraction needs the whole file anyway, page the cached text
+            text = self._cached(self.key(path, extractor), signature,
+                                lambda: _extract(path, extractor, signature.size, token))
+            end = _lines_end(text, offset, max_lines)
+            return text[offset:end], (end if end < len(text) else None), signature
+
+        key = f"{self.key(path)}\0page:{offset}:{max_lines}"
+        entry = self._lookup(key, signature)
+        if entry is None:
+            text, next_offset = _read_page(path, offset, max_lines, token)
+            entry = self._store(key, signature, text)
+            entry.next_offset = next_offset
+        return entry.text, entry.next_offset, signature
+
+    def key(self, path: str, extractor=None, truncation: Optional[Truncation] = None) -> str:
+        """
+        Cache key: the canonical path, plus the extractor and its options for
+        extracted files and the truncation for files that are cut
+        """
+        key = canonical_path(path)
+        if extractor is not None:
+            key = f"{key}\0{cache_key(extractor)}"
+        if truncation is not None:
+            key = f"{key}\0{truncation.key}"
+        return key
+
+    def key_for(self, path: str, truncation: Optional[Truncation] = None, opt_in: bool = False) -> str:
+        """Key of the text read() returns for `path` (for extracted files, before cutting)"""
+        signature = file_signature(path)
+        size = signature.size if signature else 0
+        extractor = find_extractor(path, opt_in) if signature and size <= MAX_EXTRACT_SIZE else None
+        if extractor is not None:
+            return self.key(path, extractor)
+        return self.key(path, None, _file_truncation(size, truncation))
+
+    def is_cached(self, path: str) -> bool:
+        """Whether the current version of `path` is in the cache"""
+        signature = file_signature(path)
+        with self.lock:
+            entry = self.entries.get(self.key_for(path))
+        return entry is not None and entry.signature == signature
+
+    def digest(self, path: str) -> str:
+        """Content hash of `path`, computed once per file version"""
+        self.read(path)
+        key = self.key_for(path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            # Evicted right away (file larger than the cache), hash directly
+            return content_hash(self.read(path)[0])
+        if entry.digest is None:
+            entry.digest = content_hash(entry.text)
+        return entry.digest
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_chars = 0
+
+
+def _file_truncation(size: int, truncation: Optional[Truncation]) -> Optional[Truncation]:
+    """Truncation applied while reading a text file of `size` bytes, None to read it whole"""
+    spec = truncation or (DEFAULT_TRUNCATION if size > MAX_FILE_SIZE else None)
+    # A file is never longer in characters than in bytes
+    return spec if spec is not None and size > spec.max_chars else None
+
+
+def _read_text(path: str, size: int, token=None) -> str:
+    """Decode a whole file as UTF-8"""
+    name = os.path.basename(path)
+    with perf.stage(name, "read", size):
+        chunks = []
+        with open(path, "rb") as f:
+            while True:
+                if token is not None:
+                    token.check()
+                # Read to the end: the file may have grown since it was stat'ed
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        data = b"".join(chunks)
+    with perf.stage(name, "decode"):
+        # Universal newlines, like reading in text mode
+        return data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _read_truncated(path: str, spec: Truncation, size: int, token=None) -> str:
+    """Read only the part of a file kept by `spec`"""
+    with perf.stage(os.path.basename(path), "read", min(size, spec.max_chars)):
+        return read_truncated(path, spec, size, token)
+
+
+def _lines_end(text: str, start: int, max_lines: int) -> int:
+    """Index just past the `max_lines`th line from `start`, or the end of `text`"""
+    pos = start - 1
+    for _ in range(max_lines):
+        pos = text.find("\n", pos + 1)
+        if pos < 0:
+            return len(text)
+    return pos + 1
+
+
+def _read_page(path: str, offset: int, max_lines: int, token=None) -> Tuple[str, Optional[int]]:
+    """Read up to `max_lines` lines (and PAGE_BYTES) of a text file from byte `offset`"""
+    with perf.stage(os.path.basename(path), "read", PAGE_BYTES):
+        if token is not None:
+            token.check()
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(PAGE_BYTES)
+    if not data:
+        return "", None
+    cut = len(data)
+    pos = -1
+    for _ in range(max_lines):
+        pos = data.find(b"\n", pos + 1)
+        if pos < 0:
+            break
+    if pos >= 0:
+        cut = pos + 1
+    elif len(data) == PAGE_BYTES:
+        # Fewer lines than asked for in a full page: stop after the last whole line,
+        # or for one very long line, after the last whole character
+        last = data.rfind(b"\n")
+        if last >= 0:
+            cut = last + 1
+        else:
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            decoder.decode(data, final=False)
+            cut = len(data) - len(decoder.getstate()[0])
+    at_end = cut == len(data) and len(data) < PAGE_BYTES
+    text = data[:cut].decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    return text, (None if at_end else offset + cut)
+
+
+def _extract(path: str, extractor, size: int, token=None) -> str:
+    """Plain text of a structured file"""
+    name = os.path.basename(path)
+    with perf.stage(name, "read", size):
+        if token is not None:
+            token.check()
+    with perf.stage(name, "decode"):
+        return extract_text(path, extractor, size, token)
+
+
+# Shared by all contexts
+file_cache = FileCache()
+
+
+def read_file_text(path: str, token=None) -> str:
+    """Read a file through the shared cache"""
+    return file_cache.read(path, token)[0]
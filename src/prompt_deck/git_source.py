@@ -0,0 +1,148 @@
+"""
+Resolve git-backed contexts: the working-tree diff, the staged diff or a
+file at a given revision.
+
+Results are cached by the git objects they depend on, so an unchanged diff
+or blob is never regenerated:
+
+    staged diff      HEAD commit + hash of the index entries
+    working diff     hash of the index entries + stat of the changed files
+    path@rev         blob hash of rev:path
+
+Building a key only reads the repository: git runs without optional locks,
+so a refresh never competes with the user's own git commands for the index.
+"""
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+from .file_cache import content_hash, file_signature
+from .loader import PRIORITY_VISIBLE, pool
+from .perf import perf
+
+GIT_MODES = {
+    "diff": "Working tree diff",
+    "staged": "Staged diff",
+    "revision": "File at revision",
+}
+
+GIT_TIMEOUT = 30  # seconds
+CACHE_SIZE = 64
+
+
+class GitError(RuntimeError):
+    """git failed or isn't available"""
+
+
+class GitSpec:
+    """What a git context shows"""
+
+    __slots__ = ("mode", "repo", "target")
+
+    def __init__(self, mode: str = "diff", repo: str = "", target: str = ""):
+        self.mode = mode if mode in GIT_MODES else "diff"
+        self.repo = repo
+        # Pathspec for diffs, "path@rev" for revisions
+        self.target = target
+
+    def describe(self) -> str:
+        if self.mode == "revision":
+            return self.target or "path@rev"
+        label = "git diff --staged" if self.mode == "staged" else "git diff"
+        return f"{label} {self.target}".strip()
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"mode": self.mode, "repo": self.repo, "target": self.target}
+
+
+def run_git(repo: str, *args: str) -> str:
+    """Run git in `repo` and return its stdout"""
+    try:
+        result = subprocess.run(
+            # Read-only: git diff would otherwise refresh and rewrite the index
+            ["git", "--no-optional-locks", "-C", repo, *args],
+            capture_output=True, timeout=GIT_TIMEOUT,
+            # Don't flash console windows on Windows
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+    except FileNotFoundError:
+        raise GitError("git is not installed or not on PATH")
+    except subprocess.TimeoutExpired:
+        raise GitError(f"git {args[0]} timed out")
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode("utf-8", errors="replace").strip() or
+                       f"git {args[0]} failed")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def split_revision(target: str) -> Tuple[str, str]:
+    """Split "path@rev" (rev defaults to HEAD)"""
+    path, sep, rev = target.rpartition("@")
+    if not sep or not path:
+        return target, "HEAD"
+    return path, rev or "HEAD"
+
+
+_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(spec: GitSpec, toplevel: str) -> Tuple:
+    """Key made from the git objects the result depends on"""
+    if spec.mode == "revision":
+        path, rev = split_revision(spec.target)
+        blob = run_git(toplevel, "rev-parse", f"{rev}:{path}").strip()
+        return ("blob", blob)
+
+    # Mode, blob and stage of every index entry (unmerged ones included)
+    index_digest = content_hash(run_git(toplevel, "ls-files", "--stage", "-z"))
+    pathspec = [spec.target] if spec.target else []
+
+    if spec.mode == "staged":
+        try:
+            head = run_git(toplevel, "rev-parse", "HEAD").strip()
+        except GitError:
+            head = ""  # No commits yet
+        return ("staged", head, index_digest, spec.target)
+
+    changed = run_git(toplevel, "diff", "--name-only", "-z", "--", *pathspec).split("\0")
+    stats = tuple((name, file_signature(os.path.join(toplevel, name))) for name in changed if name)
+    return ("diff", index_digest, spec.target, stats)
+
+
+def resolve(spec: GitSpec) -> str:
+    """Return the text for `spec`, regenerating it only if its git objects changed"""
+    if not spec.repo:
+        raise GitError("No repository selected")
+    toplevel = run_git(spec.repo, "rev-parse", "--show-toplevel").strip()
+    key = (toplevel,) + _cache_key(spec, toplevel)
+
+    with _cache_lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+            perf.cache_hit("git")
+            return text
+    perf.cache_miss("git")
+
+    if spec.mode == "revision":
+        text = run_git(toplevel, "cat-file", "-p", key[-1])
+    else:
+        args = ["diff", "--no-color", "--no-ext-diff"]
+        if spec.mode == "staged":
+            args.append("--staged")
+        text = run_git(toplevel, *args, "--", *([spec.target] if spec.target else []))
+
+    with _cache_lock:
+        _cache[key] = text
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return text
+
+
+def resolve_async(specs: List[GitSpec], priority: int = PRIORITY_VISIBLE) -> List[Future]:
+    """Resolve several specs in parallel on the shared loader pool"""
+    return [pool.submit(resolve, spec, priority=priority) for spec in specs]
@@ -0,0 +1,323 @@
+"""
+Grep filters: only the lines of a file that match, like `grep -n`.
+
+A filter is written like a grep command line:
+
+    ERROR                         lines matching the regex ERROR
+    "request 42a" -C 3            ... with 3 lines of context around each match
+    "ERROR|WARN" -v heartbeat     ... leaving out lines that match heartbeat
+    timeout -i                    case-insensitive
+    -v DEBUG                      every line except the DEBUG ones
+
+Files are streamed in chunks with the loader's cancel token polled between
+them, and the regexes run over whole chunks instead of line by line, so a
+multi-GB log is filtered in seconds. Output stops at MAX_RESULT_CHARS.
+Results are cached by file signature and filter, so copying again after an
+unrelated edit doesn't rescan the file.
+"""
+import codecs
+import os
+import re
+import shlex
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from .extractors import find_extractor
+from .file_cache import MAX_EXTRACT_SIZE, canonical_path, file_cache, file_signature
+from .loader import PRIORITY_VISIBLE, pool
+from .perf import perf
+
+# Result budget; a context's own truncation is applied on top
+MAX_RESULT_CHARS = 1024 * 1024
+MAX_CONTEXT_LINES = 100
+CHUNK_SIZE = 4 * 1024 * 1024
+CACHE_SIZE = 32
+
+GROUP_SEPARATOR = "--"
+
+
+class GrepError(ValueError):
+    """The filter doesn't parse"""
+
+
+class GrepSpec:
+    """Which lines of a file a context includes"""
+
+    __slots__ = ("include", "exclude", "context", "ignore_case")
+
+    def __init__(self, include: str = "", exclude: str = "", context: int = 0, ignore_case: bool = False):
+        self.include = include
+        self.exclude = exclude
+        self.context = context  # Lines around each match
+        self.ignore_case = ignore_case
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["GrepSpec"]:
+        """Parse the user's filter text; empty means every line"""
+        if not text or not text.strip():
+            return None
+        try:
+            words = shlex.split(text)
+        except ValueError as e:
+            raise GrepError(f"Invalid filter: {e}")
+
+        spec = cls()
+        patterns = []
+        words.reverse()
+        while words:
+            word = words.pop()
+            if word in ("-v", "-C"):
+                if not words:
+                    raise GrepError(f"{word} needs a value")
+                value = words.pop()
+                if word == "-v":
+                    spec.exclude = value
+                elif not value.isdigit() or int(value) > MAX_CONTEXT_LINES:
+                    raise GrepError(f"-C takes a number of lines up to {MAX_CONTEXT_LINES}: {value}")
+                else:
+                    spec.context = int(value)
+            elif word == "-i":
+                spec.ignore_case = True
+            else:
+                patterns.append(word)
+        if len(patterns) > 1:
+            raise GrepError(f"Quote a pattern with spaces: {text}")
+        spec.include = patterns[0] if patterns else ""
+        if not spec.include and not spec.exclude:
+            raise GrepError(f"No pattern: {text}")
+        for pattern in (spec.include, spec.exclude):
+            if pattern:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise GrepError(f"Invalid regex {pattern}: {e}")
+        return spec
+
+    def describe(self) -> str:
+        """The text form accepted by parse()"""
+        words = [shlex.quote(self.include)] if self.include else []
+        if self.exclude:
+            words += ["-v", shlex.quote(self.exclude)]
+        if self.context:
+            words += ["-C", str(self.context)]
+        if self.ignore_case:
+            words.append("-i")
+        return " ".join(words)
+
+    @property
+    def key(self) -> Tuple:
+        return (self.include, self.exclude, self.context, self.ignore_case)
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> Optional["GrepSpec"]:
+        if not data or not (data.get("include") or data.get("exclude")):
+            return None
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+
+class _Grep:
+    """Matches lines in text fed in chunks of whole lines"""
+
+    def __init__(self, spec: GrepSpec, max_chars: int):
+        flags = re.MULTILINE | (re.IGNORECASE if spec.ignore_case else 0)
+        self.include = re.compile(spec.include, flags) if spec.include else None
+        self.exclude = re.compile(spec.exclude, flags) if spec.exclude else None
+        self.context = spec.context
+        self.max_chars = max_chars
+        self.out: List[str] = []
+        self.chars = 0
+        self.matches = 0
+        self.full = False
+        # Number of lines fed so far
+        self.lines = 0
+        # Last lines of the previous chunk, for context before a match
+        self.previous: "deque[Tuple[int, str]]" = deque(maxlen=spec.context)
+        # Context lines still owed after the last match
+        self.after = 0
+        self.last_printed = 0
+
+    def is_match(self, buf: str, start: int, end: int) -> bool:
+        if self.include is not None and not self.include.search(buf, start, end):
+            return False
+        return self.exclude is None or not self.exclude.search(buf, start, end)
+
+    def next_match(self, buf: str, pos: int) -> Optional[int]:
+        """Start of the next matching line at or after `pos`"""
+        while pos < len(buf):
+            if self.include is not None:
+                found = self.include.search(buf, pos)
+                if found is None:
+                    return None
+                start = buf.rfind("\n", 0, found.start()) + 1
+            else:
+                start = pos
+            end = _line_end(buf, start)
+            if self.exclude is None or not self.exclude.search(buf, start, end):
+                return start
+            pos = end + 1
+        return None
+
+    def emit(self, number: int, line: str, match: bool):
+        if number <= self.last_printed or self.full:
+            return
+        text = f"{number}{':' if match else '-'}{line}"
+        if self.out and number > self.last_printed + 1 and self.context:
+            text = GROUP_SEPARATOR + "\n" + text
+        if self.chars + len(text) + 1 > self.max_chars:
+            self.full = True
+            return
+        self.out.append(text)
+        self.chars += len(text) + 1
+        self.last_printed = number
+        self.matches += match
+
+    def feed(self, buf: str):
+        """Match the lines of `buf`; all but the last one end with a newline"""
+        first = self.lines + 1
+        counted_pos, counted_line = 0, first
+
+        def number_at(pos: int) -> int:
+            nonlocal counted_pos, counted_line
+            counted_line += buf.count("\n", counted_pos, pos)
+            counted_pos = pos
+            return counted_line
+
+        pos = self.emit_after(buf, 0, first)
+        while not self.full:
+            start = self.next_match(buf, pos)
+            if start is None:
+                break
+            number = number_at(start)
+
+            # Context before, reaching back into the previous chunk if needed
+            before = []
+            line_start = start
+            while len(before) < self.context and line_start > 0:
+                previous_start = buf.rfind("\n", 0, line_start - 1) + 1
+                before.append((number - len(before) - 1, buf[previous_start:line_start - 1]))
+                line_start = previous_start
+            missing = self.context - len(before)
+            if missing and self.previous:
+                before.extend(reversed(list(self.previous)[-missing:]))
+            for line_number, line in reversed(before):
+                self.emit(line_number, line, False)
+
+            end = _line_end(buf, start)
+            self.emit(number, buf[start:end], True)
+            self.after = self.context
+            pos = self.emit_after(buf, end + 1, number + 1)
+
+        count = buf.count("\n") + (0 if buf.endswith("\n") else 1)
+        if self.context:
+            lines = (buf[:-1] if buf.endswith("\n") else buf).rsplit("\n", self.context)[-self.context:]
+            last = first + count - 1
+            self.previous.extend(zip(range(last - len(lines) + 1, last + 1), lines))
+        self.lines += count
+
+    def emit_after(self, buf: str, pos: int, number: int) -> int:
+        """Print the context owed after a match, from `pos` on; returns where it stopped"""
+        while self.after and pos < len(buf) and not self.full:
+            end = _line_end(buf, pos)
+            match = self.is_match(buf, pos, end)
+            self.emit(number, buf[pos:end], match)
+            self.after = self.context if match else self.after - 1
+            pos, number = end + 1, number + 1
+        return pos
+
+    def result(self) -> str:
+        text = "\n".join(self.out)
+        if self.full:
+            text += f"\n[... stopped after {self.matches} matching lines, result limit reached ...]"
+        return text
+
+
+def _line_end(buf: str, start: int) -> int:
+    end = buf.find("\n", start)
+    return len(buf) if end == -1 else end
+
+
+def grep_text(text: str, spec: GrepSpec, max_chars: int = MAX_RESULT_CHARS) -> str:
+    """The lines of `text` selected by `spec`, numbered like grep -n"""
+    grep = _Grep(spec, max_chars)
+    grep.feed(text)
+    return grep.result()
+
+
+def _stream(path: str, grep: _Grep, token=None):
+    """Feed a file to `grep` in chunks of whole lines"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    carry = ""
+    with open(path, "rb") as f:
+        while not grep.full:
+            if token is not None:
+                token.check()
+            data = f.read(CHUNK_SIZE)
+            text = carry + decoder.decode(data, final=not data)
+            if data and text.endswith("\r"):
+                # Might be the first half of a \r\n
+                text, carry = text[:-1], "\r"
+            else:
+                carry = ""
+            if "\r" in text:
+                # Universal newlines, like reading in text mode
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            if not data:
+                if text:
+                    grep.feed(text)
+                return
+            last_newline = text.rfind("\n")
+            if last_newline == -1:
+                carry = text + carry
+                continue
+            grep.feed(text[:last_newline + 1])
+            carry = text[last_newline + 1:] + carry
+
+
+_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def grep_file(path: str, spec: GrepSpec, token=None, max_chars: int = MAX_RESULT_CHARS,
+              opt_in: bool = False) -> str:
+    """
+    The lines of `path` selected by `spec`, regenerated only when the file
+    changes; `opt_in` filters the page text of HTML (see FileCache.read).
+    Raises FileNotFoundError if the file is gone, and LoadCancelled if the
+    loader `token` is cancelled while reading.
+    """
+    signature = file_signature(path)
+    if signature is None:
+        raise FileNotFoundError(f"File does not exist: {path}")
+    key = (canonical_path(path), signature, spec.key, max_chars, opt_in)
+    with _cache_lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+            perf.cache_hit("grep")
+            return text
+    perf.cache_miss("grep")
+
+    grep = _Grep(spec, max_chars)
+    if signature.size <= MAX_EXTRACT_SIZE and find_extractor(path, opt_in) is not None:
+        # Notebooks, documents, ...: filter their extracted text
+        grep.feed(file_cache.read(path, token, opt_in=opt_in)[0])
+    else:
+        with perf.stage(os.path.basename(path), "read", signature.size):
+            _stream(path, grep, token)
+    text = grep.result()
+
+    with _cache_lock:
+        _cache[key] = text
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return text
+
+
+def grep_async(jobs: List[Tuple[str, GrepSpec]], priority: int = PRIORITY_VISIBLE) -> List[Future]:
+    """Filter several files in parallel on the shared loader pool"""
+    return [pool.submit(grep_file, path, spec, priority=priority) for path, spec in jobs]
@@ -0,0 +1,436 @@
+"""
+Syntax highlighting for code in context editors.
+
+The language comes from the file extension (the same table compaction
+uses) or, for typed and pasted text, from a look at its first lines; prose
+isn't highlighted. Each line is tokenized on its own, starting in the state
+the line before ended in (inside a block comment or multi-line string), and
+the formats go onto the block's layout the way QSyntaxHighlighter does, so
+they never touch the text, the undo stack or textChanged. It's meant for
+QPlainTextEdit documents, where re-laying out the highlighted blocks is
+cheap; in a big QTextEdit every relayout costs more than the highlighting.
+
+The work is split so the GUI thread never waits on a big document:
+
+- An edit re-highlights the blocks it touched, and the ones after them
+  while their end state keeps changing (a comment was opened), up to
+  EDIT_BLOCKS; the rest is left to a pass.
+- A new or replaced document over SYNC_BLOCKS blocks is tokenized on the
+  loader pool, and the formats are applied SLICE_MS at a time between
+  events. If the text changes meanwhile, the pass goes on tokenizing on the
+  GUI thread, still a slice at a time.
+"""
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import QObject, QTimer
+from PyQt6.QtGui import QColor, QTextBlock, QTextCharFormat, QTextDocument, QTextLayout
+
+from .compaction import COMMENT_SYNTAX, CSS_LANGUAGES, CSS_URL, detect_language
+from .loader import PRIORITY_BACKGROUND, CancelToken, load_async
+from .styles import syntax_colors
+
+# Documents up to this many blocks are highlighted in one go
+SYNC_BLOCKS = 500
+# Blocks past an edit re-highlighted right away when it changes their state
+EDIT_BLOCKS = 200
+# GUI time per slice of a pass
+SLICE_MS = 8
+# Larger documents are left plain
+MAX_CHARS = 8 * 1024 * 1024
+# Text looked at to guess the language of typed or pasted text
+SNIFF_CHARS = 4096
+# Guess again when an edit adds at least this much (a paste), or a line
+SNIFF_MIN_CHANGE = 64
+
+# Quotes whose strings may span lines, per language
+MULTILINE_QUOTES = {
+    "python": ('"""', "'''"),
+    "c": ("`",),
+}
+
+KEYWORDS = {
+    "python": (
+        "False None True and as assert async await break class continue def del elif else except "
+        "finally for from global if import in is lambda match nonlocal not or pass raise return "
+        "self try while with yield"
+    ),
+    "c": (
+        "abstract async await auto bool break case catch char class const continue def default "
+        "defer delete do double else enum export extends false final finally float fn for func "
+        "function go if impl implements import in instanceof int interface let long match mod mut "
+        "namespace new nil null package private protected pub public return self short signed "
+        "sizeof static struct super switch this throw throws true try type typedef typeof union "
+        "unsigned use using val var void volatile where while yield"
+    ),
+    "shell": (
+        "begin case class def do done elif else end esac export false fi for function if in "
+        "local module require return source then true unless until while"
+    ),
+    "sql": (
+        "add all alter and as asc between by case create delete desc distinct drop else end "
+        "exists from group having in index inner insert into is join key left like limit not "
+        "null on or order outer primary references right select set table then union update "
+        "values view when where with"
+    ),
+    "lua": (
+        "and break do else elseif end false for function goto if in local nil not or repeat "
+        "return then true until while"
+    ),
+    "html": "",
+}
+# Languages whose keywords are case-insensitive
+CASELESS = ("sql",)
+
+# ```python, ```ts ... fences at the start of pasted text
+FENCE_LANGUAGES = {
+    "python": "python", "py": "python",
+    "bash": "shell", "sh": "shell", "shell": "shell", "zsh": "shell", "console": "shell",
+    "yaml": "shell", "yml": "shell", "toml": "shell", "ini": "shell", "ruby": "shell", "rb": "shell",
+    "sql": "sql", "lua": "lua",
+    "html": "html", "xml": "html", "svg": "html", "vue": "html",
+    "c": "c", "cpp": "c", "c++": "c", "h": "c", "cs": "c", "csharp": "c", "java": "c",
+    "kotlin": "c", "scala": "c", "swift": "c", "go": "c", "rust": "c", "rs": "c", "js": "c",
+    "javascript": "c", "jsx": "c", "ts": "c", "typescript": "c", "tsx": "c", "css": "css",
+    "scss": "scss", "less": "scss", "json": "c", "dart": "c", "php": "c", "proto": "c",
+}
+
+# Lines that give a language away, for text without a file name
+SNIFF_PATTERNS = {
+    "python": re.compile(r"^\s*(?:def \w+\(|class \w+[(:]|import \w|from [\w.]+ import |@\w|if __name__)", re.M),
+    "c": re.compile(r"^\s*(?:#include\b|(?:public|private|protected|static|func|fn|package|namespace|"
+                    r"using|const|let|var|function|interface|struct)\s)|[;{]\s*$", re.M),
+    "shell": re.compile(r"^\s*(?:export \w+=|echo |if \[|fi$|done$|\$ \w)", re.M),
+    "sql": re.compile(r"^\s*(?:select|insert into|update \w+ set|delete from|create (?:table|index|view))\b",
+                      re.M | re.I),
+    "html": re.compile(r"^\s*<(?:!doctype|!--|/?[a-z][\w-]*[\s>/])", re.M | re.I),
+}
+
+Span = Tuple[int, int, str]  # start, length, kind
+
+
+class Language:
+    """The tokenizer for one language"""
+
+    __slots__ = ("name", "pattern", "multiline")
+
+    def __init__(self, name: str):
+        self.name = name
+        line_prefixes, block_pairs, quotes = COMMENT_SYNTAX[name]
+        multiline_quotes = MULTILINE_QUOTES.get(name, ())
+        # Constructs that may span lines: (open, close, kind); the state is 1 + the index
+        self.multiline = [(start, end, "comment") for start, end in block_pairs]
+        self.multiline += [(quote, quote, "string") for quote in multiline_quotes]
+
+        parts = [f"(?P<open{i}>{re.escape(start)})" for i, (start, _, _) in enumerate(self.multiline)]
+        if line_prefixes:
+            parts.append(f"(?P<comment>(?:{'|'.join(map(re.escape, line_prefixes))}).*)")
+        quotes = [q for q in quotes if q not in multiline_quotes]
+        if quotes:
+            strings = "|".join(f"{q}(?:[^{q}\\\\]|\\\\.)*{q}?" for q in quotes)
+            if name in CSS_LANGUAGES:
+                strings = f"{CSS_URL}|{strings}"
+            parts.append(f"(?P<string>{strings})")
+        if name == "html":
+            parts.append(r"(?P<tag></?[\w:.-]+|/?>)")
+        words = KEYWORDS.get(name, "").split()
+        if words:
+            flags = "(?i:" if name in CASELESS else "(?:"
+            parts.append(f"(?P<keyword>\\b{flags}{'|'.join(words)})\\b)")
+        parts.append(r"(?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\b)")
+        self.pattern = re.compile("|".join(parts))
+
+
+_languages: Dict[str, Language] = {}
+
+
+def get_language(name: Optional[str]) -> Optional[Language]:
+    if name not in COMMENT_SYNTAX:
+        return None
+    if name not in _languages:
+        _languages[name] = Language(name)
+    return _languages[name]
+
+
+def sniff_language(text: str) -> Optional[str]:
+    """Guess the language of typed or pasted text, None for prose or when unsure"""
+    sample = text[:SNIFF_CHARS]
+    fence = re.match(r"\s*```\s*([\w+#.-]+)", sample)
+    if fence:
+        return FENCE_LANGUAGES.get(fence.group(1).lower())
+    if sample.startswith("#!"):
+        first_line = sample.split("\n", 1)[0]
+        if "python" in first_line:
+            return "python"
+        return "c" if "node" in first_line else "shell"
+    lines = sum(1 for line in sample.splitlines() if line.strip())
+    scores = {name: len(pattern.findall(sample)) for name, pattern in SNIFF_PATTERNS.items()}
+    name, score = max(scores.items(), key=lambda item: item[1])
+    return name if score >= max(2, lines // 5) else None
+
+
+def tokenize_line(text: str, language: Language, state: int = 0) -> Tuple[List[Span], int]:
+    """
+    The highlighted spans of one line, and the state the next line starts
+    in: 0, or 1 + the index of the multi-line construct left open
+    """
+    spans = []
+    pos = 0
+    if state > 0:
+        _, close, kind = language.multiline[state - 1]
+        end = text.find(close)
+        if end < 0:
+            return ([(0, len(text), kind)] if text else []), state
+        pos = end + len(close)
+        spans.append((0, pos, kind))
+    search = language.pattern.search
+    while True:
+        match = search(text, pos)
+        if match is None:
+            return spans, 0
+        kind = match.lastgroup
+        start = match.start()
+        if kind.startswith("open"):
+            index = int(kind[4:])
+            _, close, kind = language.multiline[index]
+            end = text.find(close, match.end())
+            if end < 0:
+                spans.append((start, len(text) - start, kind))
+                return spans, index + 1
+            pos = end + len(close)
+        else:
+            pos = max(match.end(), start + 1)
+        spans.append((start, pos - start, kind))
+
+
+def tokenize_text(text: str, language: Language, token: Optional[CancelToken] = None) -> List[Tuple[List[Span], int]]:
+    """Background job: spans and end state of every line of `text`"""
+    results = []
+    state = 0
+    for number, line in enumerate(text.split("\n")):
+        if number % 64 == 0:
+            if token is not None:
+                token.check()
+            # Hand the GIL to the GUI thread, so it doesn't queue behind this loop
+            time.sleep(0)
+        spans, state = tokenize_line(line, language, state)
+        results.append((spans, state))
+    return results
+
+
+_formats: Dict[str, QTextCharFormat] = {}
+
+
+def text_format(kind: str) -> QTextCharFormat:
+    if kind not in _formats:
+        fmt = QTextCharFormat()
+        fmt.setForeground(QColor(syntax_colors[kind]))
+        _formats[kind] = fmt
+    return _formats[kind]
+
+
+def _format_range(start: int, length: int, kind: str) -> QTextLayout.FormatRange:
+    format_range = QTextLayout.FormatRange()
+    format_range.start = start
+    format_range.length = length
+    format_range.format = text_format(kind)
+    return format_range
+
+
+class CodeHighlighter(QObject):
+    """Highlights a document as it's edited; big documents in the background"""
+
+    def __init__(self, document: QTextDocument, path: Optional[str] = None):
+        super().__init__(document)
+        self.document = document
+        self.path = None
+        self.language: Optional[Language] = None
+        # Block count when the language was last guessed
+        self.sniffed_blocks = 0
+        # Formats may be on the document, so turning highlighting off has to clear them
+        self.highlighted = False
+        # The pass in progress: the block it continues from, whether it runs to the end
+        # (or only until the states settle), and the lines tokenized on the loader pool
+        self.next_block: Optional[int] = None
+        self.full_pass = False
+        self.results: Optional[List[Tuple[List[Span], int]]] = None
+        self.load_token: Optional[CancelToken] = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.run_slice)
+        document.contentsChange.connect(self.on_contents_change)
+        self.set_path(path)
+
+    def set_path(self, path: Optional[str]):
+        """Highlight as the language of `path`; None to guess from the text"""
+        self.path = path
+        self.set_language(detect_language(path) if path else self.sniff())
+
+    def set_language(self, name: Optional[str]):
+        language = get_language(name)
+        if language is not self.language:
+            self.language = language
+            self.rehighlight()
+
+    def sniff(self) -> Optional[str]:
+        self.sniffed_blocks = self.document.blockCount()
+        return sniff_language(self.sample())
+
+    def sample(self) -> str:
+        """The start of the text, without copying all of a big document"""
+        parts = []
+        size = 0
+        block = self.document.firstBlock()
+        while block.isValid() and size < SNIFF_CHARS:
+            parts.append(block.text())
+            size += block.length()
+            block = block.next()
+        return "\n".join(parts)
+
+    def active_language(self) -> Optional[Language]:
+        if self.document.characterCount() > MAX_CHARS:
+            return None
+        return self.language
+
+    def cancel(self):
+        """Stop the pass in progress"""
+        if self.load_token is not None:
+            self.load_token.cancel()
+            self.load_token = None
+        self.timer.stop()
+        self.next_block = None
+        self.full_pass = False
+        self.results = None
+
+    def rehighlight(self):
+        """Highlight the whole document again"""
+        self.cancel()
+        language = self.active_language()
+        if language is None and not self.highlighted:
+            return
+        if language is None or self.document.blockCount() <= SYNC_BLOCKS:
+            self.start_pass(0)
+            return
+        token = self.load_token = CancelToken()
+        load_async(tokenize_text, self.document.toPlainText(), language, token,
+                   on_done=self.on_tokenized, on_error=self.on_tokenize_error,
+                   priority=PRIORITY_BACKGROUND, token=token)
+
+    def on_tokenized(self, results):
+        self.load_token = None
+        # Each line of the text is one block
+        self.results = results if len(results) == self.document.blockCount() else None
+        self.start_pass(0)
+
+    def on_tokenize_error(self, error):
+        print(f"Error highlighting: {error}")
+        self.load_token = None
+        self.start_pass(0)
+
+    def start_pass(self, number: int):
+        """Highlight every block from block `number` to the end, a slice at a time"""
+        self.next_block = number
+        self.full_pass = True
+        self.run_slice()
+
+    def run_slice(self):
+        if self.next_block is None:
+            return
+        block = self.document.findBlockByNumber(self.next_block)
+        stop_after = self.document.blockCount() if self.full_pass else -1
+        self.next_block = self.highlight(block, stop_after, deadline=time.perf_counter() + SLICE_MS / 1000)
+        if self.next_block is None:
+            self.full_pass = False
+            self.results = None
+            if self.active_language() is None:
+                self.highlighted = False
+        else:
+            self.timer.start()
+
+    def on_contents_change(self, position: int, removed: int, added: int):
+        sniff = self.path is None and (added >= SNIFF_MIN_CHANGE
+                                       or self.document.blockCount() != self.sniffed_blocks)
+        if self.language is None and not self.highlighted:
+            if sniff:
+                self.set_language(self.sniff())
+            return
+        # Block numbers may have moved, the pass goes on from the text itself
+        self.results = None
+        if self.load_token is not None:
+            self.load_token.cancel()
+            self.load_token = None
+            self.next_block = 0
+            self.full_pass = True
+            self.timer.start()
+        if sniff:
+            language = get_language(self.sniff())
+            if language is not self.language:
+                self.language = language
+                self.rehighlight()
+                return
+
+        first = self.document.findBlock(position)
+        last = self.document.findBlock(min(position + added, self.document.characterCount() - 1))
+        if not first.isValid():
+            return
+        last_number = last.blockNumber() if last.isValid() else first.blockNumber()
+        touched = last_number - first.blockNumber() + 1
+        if touched > SYNC_BLOCKS:
+            # A paste or a new text: the whole document in the background
+            self.rehighlight()
+            return
+        following = self.highlight(first, last_number, max_blocks=touched + EDIT_BLOCKS)
+        if following is not None:
+            # Still changing (a comment was opened): the rest in slices
+            self.next_block = following if self.next_block is None else min(self.next_block, following)
+            self.timer.start()
+
+    def highlight(self, block: QTextBlock, stop_after: int, deadline: Optional[float] = None,
+                  max_blocks: Optional[int] = None) -> Optional[int]:
+        """
+        Highlight blocks from `block` on. Past block number `stop_after` it
+        stops at the first block that ends in the same state as before. It
+        also stops at the `deadline` (a perf_counter time) or after
+        `max_blocks`. Returns the number of the block to go on from, None
+        when there's nothing left to do.
+        """
+        if not block.isValid():
+            return None
+        language = self.active_language()
+        results = self.results
+        previous = block.previous()
+        state = max(previous.userState(), 0) if previous.isValid() else 0
+        start = block.position()
+        end = start
+        count = 0
+        following = None
+        while block.isValid():
+            number = block.blockNumber()
+            if results is not None:
+                spans, end_state = results[number]
+            elif language is not None:
+                spans, end_state = tokenize_line(block.text(), language, state)
+            else:
+                spans, end_state = [], 0
+            previous_state = block.userState()
+            block.layout().setFormats([_format_range(*span) for span in spans])
+            block.setUserState(end_state)
+            end = block.position() + block.length()
+            state = end_state
+            block = block.next()
+            count += 1
+            if number >= stop_after and end_state == previous_state:
+                break
+            if not block.isValid():
+                break
+            if (max_blocks is not None and count >= max_blocks) or \
+                    (deadline is not None and count % 32 == 0 and time.perf_counter() > deadline):
+                following = block.blockNumber()
+                break
+        if language is not None:
+            self.highlighted = True
+        self.document.markContentsDirty(start, end - start)
+        return following
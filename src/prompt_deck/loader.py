@@ -0,0 +1,197 @@
+"""
+Shared background pool for file and git I/O.
+
+All background loads go through one bounded pool instead of a thread per
+file, so dropping 100 files doesn't start 100 OS threads:
+
+    token = CancelToken()
+    load_async(read_file_text, path, token=token, priority=PRIORITY_VISIBLE,
+               on_done=show_text, on_error=show_error)
+    ...
+    token.cancel()   # e.g. when the context is removed
+
+Jobs run in priority order (lower first, visible contexts before the rest).
+Cancellation is cooperative: a cancelled job that hasn't started is skipped,
+a running one can poll its token, and its result is never delivered. Nothing
+is ever killed mid-read, so file handles are always closed.
+
+Callbacks passed to load_async run on the GUI thread.
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+PRIORITY_VISIBLE = 0     # Contexts on screen
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2  # Prefetching, nobody is waiting
+
+# I/O bound (disk, git subprocesses), so not tied to the CPU count
+MAX_WORKERS = 4
+
+
+class LoadCancelled(Exception):
+    """Raised by CancelToken.check() inside a job that was cancelled"""
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared between the GUI and a job"""
+
+    __slots__ = ("_event",)
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        """Stop a running job at a safe point"""
+        if self._event.is_set():
+            raise LoadCancelled()
+
+
+class _Job:
+    __slots__ = ("fn", "args", "token", "future")
+
+    def __init__(self, fn: Callable, args: tuple, token: Optional[CancelToken]):
+        self.fn = fn
+        self.args = args
+        self.token = token
+        self.future: Future = Future()
+
+
+class WorkerPool:
+    """A fixed number of daemon threads working through a priority queue"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, name: str = "loader"):
+        self.max_workers = max_workers
+        self.name = name
+        self.queue: List = []
+        self.counter = itertools.count()  # FIFO within a priority
+        self.condition = threading.Condition()
+        self.workers: List[threading.Thread] = []
+        self.idle = 0
+        self.closed = False
+
+    def submit(self, fn: Callable, *args: Any, priority: int = PRIORITY_NORMAL,
+               token: Optional[CancelToken] = None) -> Future:
+        """Queue fn(*args); the returned future is cancelled if `token` is cancelled first"""
+        job = _Job(fn, args, token)
+        with self.condition:
+            if self.closed:
+                job.future.cancel()
+                return job.future
+            heapq.heappush(self.queue, (priority, next(self.counter), job))
+            # Start threads lazily, never more than max_workers
+            if len(self.queue) > self.idle and len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, daemon=True,
+                                          name=f"{self.name}-{len(self.workers) + 1}")
+                self.workers.append(worker)
+                worker.start()
+            self.condition.notify()
+        return job.future
+
+    def pending(self) -> int:
+        with self.condition:
+            return len(self.queue)
+
+    def _work(self):
+        while True:
+            with self.condition:
+                self.idle += 1
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                self.idle -= 1
+                if not self.queue:
+                    return  # Closed and drained
+                _, _, job = heapq.heappop(self.queue)
+
+            if job.token is not None and job.token.cancelled:
+                job.future.cancel()
+                continue
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job.fn(*job.args)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+
+    def shutdown(self):
+        """Cancel everything still queued and let the workers exit after their current job"""
+        with self.condition:
+            self.closed = True
+            for _, _, job in self.queue:
+                job.future.cancel()
+            self.queue.clear()
+            self.condition.notify_all()
+
+
+class _Dispatcher(QObject):
+    """Hops callbacks from worker threads to the GUI thread"""
+
+    ready = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.ready.connect(self.run)
+
+    def run(self, callback):
+        try:
+            callback()
+        except RuntimeError as e:
+            # The receiving widget was deleted before its result arrived
+            print(f"Dropped background result: {e}")
+        except Exception as e:
+            print(f"Error delivering background result: {e}")
+
+
+# Shared by the whole app
+pool = WorkerPool()
+_dispatcher: Optional[_Dispatcher] = None
+
+
+def load_async(fn: Callable, *args: Any, on_done: Callable[[Any], None],
+               on_error: Optional[Callable[[BaseException], None]] = None,
+               priority: int = PRIORITY_NORMAL, token: Optional[CancelToken] = None) -> Future:
+    """
+    Run fn(*args) on the pool and pass its result (or exception) to
+    on_done/on_error on the GUI thread. Must be called from the GUI thread.
+    Nothing is delivered once `token` is cancelled.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = _Dispatcher()
+    dispatcher = _dispatcher
+
+    def deliver():
+        if token is not None and token.cancelled or future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            on_done(future.result())
+        elif isinstance(error, LoadCancelled):
+            return
+        elif on_error is not None:
+            on_error(error)
+        else:
+            print(f"Error in background load: {error}")
+
+    def queue_delivery(_):
+        try:
+            dispatcher.ready.emit(deliver)
+        except RuntimeError:
+            pass  # The app is shutting down
+
+    future = pool.submit(fn, *args, priority=priority, token=token)
+    future.add_done_callback(queue_delivery)
+    return future
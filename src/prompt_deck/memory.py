@@ -0,0 +1,326 @@
+"""
+Where the memory of a deck goes.
+
+The same text can be held several times: in a context's editor document,
+in the file cache, in compaction/snippet/git caches, in the formatted prompt,
+in get_state() dicts, on the clipboard and in preview dialogs. A report
+attributes bytes to each context, each cache and each transient copy:
+
+    Contexts     Qt documents (estimated) and Python strings held per context
+    Caches       the shared module-level caches
+    Transient    peak allocations while building the prompt and the state,
+                 measured with tracemalloc, plus clipboard and open dialogs
+    Process      resident memory of the whole process
+
+Python-side sizes come from sys.getsizeof; Qt stores text as UTF-16 plus a
+layout per block, so document sizes are estimates.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt6.QtWidgets import QApplication, QDialog, QTextEdit, QPlainTextEdit
+
+from . import compaction, git_source, grep_filter, redaction, snippets, templating
+from .file_cache import file_cache
+
+# Rough cost of one laid-out text block (QTextBlock, QTextLayout, line data)
+QT_BLOCK_OVERHEAD = 200
+TOP_ALLOCATIONS = 10
+
+
+def text_bytes(text: Optional[str]) -> int:
+    return sys.getsizeof(text) if text else 0
+
+
+def document_bytes(document) -> int:
+    """Estimated size of a QTextDocument: UTF-16 text plus per-block layout"""
+    return document.characterCount() * 2 + document.blockCount() * QT_BLOCK_OVERHEAD
+
+
+def process_memory() -> Optional[int]:
+    """Resident set size of this process in bytes, None if it can't be determined"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except (AttributeError, OSError):
+            pass
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak rather than current; kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def measure_peak(fn: Callable[[], object]) -> Tuple[object, int]:
+    """Run `fn` and return (result, bytes allocated at its peak) using tracemalloc"""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return result, max(0, peak - before)
+
+
+class MemoryItem:
+    """One line of the report"""
+
+    __slots__ = ("category", "name", "bytes", "detail")
+
+    def __init__(self, category: str, name: str, nbytes: int, detail: str = ""):
+        self.category = category
+        self.name = name
+        self.bytes = nbytes
+        self.detail = detail
+
+    def to_dict(self) -> Dict:
+        return {"category": self.category, "name": self.name, "bytes": self.bytes, "detail": self.detail}
+
+
+class MemoryReport:
+    CATEGORIES = ("Contexts", "Caches", "Transient")
+
+    def __init__(self):
+        self.taken = time.time()
+        self.items: List[MemoryItem] = []
+        self.process_bytes: Optional[int] = None
+        # Python allocations by source line, only while allocation tracking is on
+        self.top_allocations: List[Tuple[str, int]] = []
+
+    def add(self, category: str, name: str, nbytes: int, detail: str = ""):
+        self.items.append(MemoryItem(category, name, nbytes, detail))
+
+    def total(self, category: str) -> int:
+        return sum(item.bytes for item in self.items if item.category == category)
+
+    def to_dict(self) -> Dict:
+        return {
+            "taken": self.taken,
+            "process_bytes": self.process_bytes,
+            "totals": {category: self.total(category) for category in self.CATEGORIES},
+            "items": [item.to_dict() for item in self.items],
+            "top_allocations": [{"where": where, "bytes": size} for where, size in self.top_allocations],
+        }
+
+    def to_text(self) -> str:
+        lines = [f"Memory report {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.taken))}"]
+        if self.process_bytes is not None:
+            lines.append(f"Process: {format_bytes(self.process_bytes)}")
+        for category in self.CATEGORIES:
+            lines.append(f"\n{category}: {format_bytes(self.total(category))}")
+            for item in self.items:
+                if item.category == category:
+                    detail = f"  ({item.detail})" if item.detail else ""
+                    lines.append(f"  {format_bytes(item.bytes):>10}  {item.name}{detail}")
+        if self.top_allocations:
+            lines.append("\nTop Python allocations:")
+            lines.extend(f"  {format_bytes(size):>10}  {where}" for where, size in self.top_allocations)
+        return "\n".join(lines)
+
+
+def format_bytes(nbytes: int) -> str:
+    if nbytes >= 1024 * 1024:
+        return f"{nbytes / (1024 * 1024):.1f} MB"
+    if nbytes >= 1024:
+        return f"{nbytes / 1024:.1f} KB"
+    return f"{nbytes} B"
+
+
+#
+# Collectors
+#
+def _context_items(deck, report: MemoryReport):
+    with file_cache.lock:
+        file_entries = dict(file_cache.entries)
+    for index, context in enumerate(deck.contexts, 1):
+        name = deck.context_label(context, index)
+        parts = []
+        nbytes = 0
+
+        editor = getattr(context, "content_input", None)
+        if editor is not None:
+            size = document_bytes(editor.document())
+            nbytes += size
+            parts.append(f"editor {format_bytes(size)}")
+
+        preview = getattr(context, "preview", None) or getattr(context, "spill_view", None)
+        if preview is not None:
+            size = document_bytes(preview.document())
+            nbytes += size
+            parts.append(f"preview {format_bytes(size)}")
+
+        spill_path = getattr(context, "spill_path", None)
+        if spill_path:
+            # Not in memory, noted for the comparison
+            try:
+                parts.append(f"stored on disk {format_bytes(os.path.getsize(spill_path))}")
+            except OSError:
+                parts.append("stored text missing")
+
+        cached_text = getattr(context, "cached_text", None)
+        if cached_text:
+            size = text_bytes(cached_text)
+            nbytes += size
+            parts.append(f"git text {format_bytes(size)}")
+
+        last_compaction = getattr(context, "last_compaction", None)
+        if last_compaction is not None:
+            size = text_bytes(last_compaction.text)
+            nbytes += size
+            parts.append(f"compacted {format_bytes(size)}")
+
+        file_path = getattr(context, "file_path", None)
+        if file_path and getattr(context, "content_input", None) is None:
+            entry = file_entries.get(file_cache.key_for(file_path, getattr(context, "truncation", None),
+                                                       bool(getattr(context, "extract_html", False))))
+            if entry is not None:
+                # Shared with other contexts showing the same file
+                parts.append(f"file cache {format_bytes(text_bytes(entry.text))}, shared")
+
+        report.add("Contexts", name, nbytes, ", ".join(parts))
+
+
+def _cache_items(deck, report: MemoryReport):
+    with file_cache.lock:
+        entries = list(file_cache.entries.values())
+    report.add("Caches", "Files", sum(text_bytes(e.text) + text_bytes(e.digest) for e in entries),
+               f"{len(entries)} files")
+
+    with compaction._cache_lock:
+        results = list(compaction._cache.values())
+    report.add("Caches", "Compaction", sum(text_bytes(r.text) for r in results), f"{len(results)} results")
+
+    with snippets._cache_lock:
+        resolved = list(snippets._resolve_cache.values())
+        symbol_tables = list(snippets._symbol_cache.values())
+    report.add("Caches", "Snippets",
+               sum(text_bytes(s.text) for s in resolved) + sum(sys.getsizeof(t) for t in symbol_tables),
+               f"{len(resolved)} snippets, {len(symbol_tables)} symbol tables")
+
+    with grep_filter._cache_lock:
+        filtered = list(grep_filter._cache.values())
+    report.add("Caches", "Grep", sum(text_bytes(t) for t in filtered), f"{len(filtered)} results")
+
+    with git_source._cache_lock:
+        diffs = list(git_source._cache.values())
+    report.add("Caches", "Git", sum(text_bytes(d) for d in diffs), f"{len(diffs)} results")
+
+    sent = deck.send_history.texts()
+    report.add("Caches", "Send history", sum(text_bytes(t) for t in sent), f"{len(sent)} texts")
+
+    assembly = getattr(deck, "assembly", None)
+    rendered = [record.rendered[1] for record in deck.model
+                if record.rendered is not None and record.rendered[1] is not None]
+    report.add("Caches", "Prepared prompt",
+               (text_bytes(assembly.text) if assembly is not None else 0) +
+               sum(text_bytes(block.content) for block in rendered),
+               f"{len(rendered)} rendered contexts, file text shared with the file cache")
+
+    masked = list(redaction._cache.values())
+    report.add("Caches", "Redaction", sum(text_bytes(text) for text, _ in masked), f"{len(masked)} texts")
+
+    templates = list(templating._template_cache.values())
+    report.add("Caches", "Templates",
+               sum(text_bytes(t.source) + sum(text_bytes(s) for s in t.segments if isinstance(s, str))
+                   for t in templates),
+               f"{len(templates)} templates")
+
+    ring = getattr(deck, "clipboard_ring", None)
+    if ring is not None:
+        report.add("Caches", "Clipboard history", sum(text_bytes(e.text) for e in ring),
+                   f"{len(ring)} entries")
+
+
+def _transient_items(deck, report: MemoryReport):
+    text, peak = measure_peak(deck.get_formatted_text)
+    report.add("Transient", "Formatted prompt", peak, f"result {format_bytes(text_bytes(text))}")
+
+    state, peak = measure_peak(lambda: json.dumps(deck.get_state()))
+    report.add("Transient", "Saved state (get_state + JSON)", peak, f"JSON {format_bytes(text_bytes(state))}")
+
+    clipboard = QApplication.clipboard().text()
+    report.add("Transient", "Clipboard", len(clipboard) * 2, f"{len(clipboard)} chars")
+
+    # Dialogs that hold a copy of the prompt (preview) or of the contexts
+    for dialog in deck.findChildren(QDialog):
+        if dialog is getattr(deck, "memory_dialog", None):
+            continue
+        size = sum(document_bytes(editor.document())
+                   for editor in dialog.findChildren((QTextEdit, QPlainTextEdit)))
+        if size:
+            state = "open" if dialog.isVisible() else "hidden"
+            report.add("Transient", f"{dialog.windowTitle() or 'Dialog'} dialog", size, state)
+
+
+def build_report(deck, measure_transients: bool = True) -> MemoryReport:
+    """
+    Collect a report for `deck`. Measuring transients builds the prompt and
+    the saved state once, so periodic snapshots skip it.
+    """
+    report = MemoryReport()
+    _context_items(deck, report)
+    _cache_items(deck, report)
+
+    main_prompt_bytes = document_bytes(deck.main_prompt.document())
+    report.add("Contexts", "Main prompt", main_prompt_bytes, "editor")
+
+    if measure_transients:
+        _transient_items(deck, report)
+
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            # Not the report's own bookkeeping
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        stats = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        report.top_allocations = [(f"{s.traceback[0].filename}:{s.traceback[0].lineno}", s.size)
+                                  for s in stats]
+
+    report.process_bytes = process_memory()
+    return report
+
+
+def append_log(report: MemoryReport, path: str):
+    """Append a report as one JSON line"""
+    with open(path, "a") as f:
+        f.write(json.dumps(report.to_dict()) + "\n")
@@ -0,0 +1,145 @@
+import json
+import tracemalloc
+
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QCheckBox,
+                             QSpinBox, QTreeWidget, QTreeWidgetItem, QHeaderView, QApplication,
+                             QFileDialog, QMessageBox)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont
+
+from .styles import FONT_FAMILY
+from .memory import MemoryReport, build_report, format_bytes
+
+
+class MemoryDialog(QDialog):
+    """
+    On-demand memory report for the deck: per context, per cache and per
+    transient copy, with optional periodic logging to memory.log.
+    """
+
+    def __init__(self, deck):
+        super().__init__(deck)
+        self.deck = deck
+        self.report = None
+        self.setWindowTitle("Memory Report")
+        self.setWindowFlag(Qt.WindowType.Tool)
+        self.setMinimumSize(560, 480)
+        font = QFont(FONT_FAMILY, 9)
+
+        layout = QVBoxLayout(self)
+
+        self.process_label = QLabel("")
+        self.process_label.setFont(font)
+        layout.addWidget(self.process_label)
+
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(3)
+        self.tree.setHeaderLabels(("Item", "Size", "Details"))
+        self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        self.tree.header().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        self.tree.setFont(font)
+        layout.addWidget(self.tree)
+
+        # Options
+        options_row = QHBoxLayout()
+        self.track_allocations = QCheckBox("Track Python allocations")
+        self.track_allocations.setToolTip("Keep tracemalloc running to list the biggest allocation sites "
+                                          "(slows the app down a little)")
+        self.track_allocations.setChecked(tracemalloc.is_tracing())
+        self.track_allocations.toggled.connect(self.set_tracking)
+        options_row.addWidget(self.track_allocations)
+        options_row.addStretch()
+
+        self.log_enabled = QCheckBox("Log a snapshot every")
+        self.log_enabled.setChecked(deck.memory_log_interval > 0)
+        self.log_enabled.setToolTip("Append a snapshot to memory.log in the data folder")
+        options_row.addWidget(self.log_enabled)
+        self.log_interval = QSpinBox()
+        self.log_interval.setRange(1, 240)
+        self.log_interval.setSuffix(" min")
+        self.log_interval.setValue(deck.memory_log_interval or 5)
+        options_row.addWidget(self.log_interval)
+        self.log_enabled.toggled.connect(self.update_logging)
+        self.log_interval.valueChanged.connect(self.update_logging)
+        layout.addLayout(options_row)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.refresh)
+        buttons_layout.addWidget(refresh_btn)
+        buttons_layout.addStretch()
+        copy_btn = QPushButton("Copy Report")
+        copy_btn.clicked.connect(self.copy_report)
+        buttons_layout.addWidget(copy_btn)
+        export_btn = QPushButton("Export...")
+        export_btn.clicked.connect(self.export_report)
+        buttons_layout.addWidget(export_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.hide)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+
+    def refresh(self):
+        try:
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                self.report = build_report(self.deck)
+            finally:
+                QApplication.restoreOverrideCursor()
+            self.show_report(self.report)
+        except Exception as e:
+            print(f"Error building memory report: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to build memory report: {e}")
+
+    def show_report(self, report: MemoryReport):
+        self.tree.clear()
+        process = format_bytes(report.process_bytes) if report.process_bytes is not None else "unknown"
+        self.process_label.setText(f"Process memory: {process}   (Qt document sizes are estimates)")
+
+        for category in MemoryReport.CATEGORIES:
+            items = sorted((i for i in report.items if i.category == category), key=lambda i: -i.bytes)
+            parent = QTreeWidgetItem((category, format_bytes(report.total(category)), f"{len(items)} items"))
+            for item in items:
+                parent.addChild(QTreeWidgetItem((item.name, format_bytes(item.bytes), item.detail)))
+            self.tree.addTopLevelItem(parent)
+            # Contexts can be many, keep them collapsed
+            parent.setExpanded(category != "Contexts" or len(items) <= 20)
+
+        if report.top_allocations:
+            parent = QTreeWidgetItem(("Python allocations", "", "largest source lines"))
+            for where, size in report.top_allocations:
+                parent.addChild(QTreeWidgetItem((where, format_bytes(size), "")))
+            self.tree.addTopLevelItem(parent)
+
+    def set_tracking(self, enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def update_logging(self):
+        self.deck.set_memory_log_interval(self.log_interval.value() if self.log_enabled.isChecked() else 0)
+
+    def copy_report(self):
+        if self.report is None:
+            self.refresh()
+        if self.report is not None:
+            QApplication.clipboard().setText(self.report.to_text())
+            self.deck.show_toast("Memory report copied")
+
+    def export_report(self):
+        if self.report is None:
+            self.refresh()
+        if self.report is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Memory Report",
+                                              "prompt-deck-memory.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            with open(path, "w") as f:
+                json.dump(self.report.to_dict(), f, indent=2)
+        except OSError as e:
+            print(f"Error exporting memory report: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to export memory report: {e}")
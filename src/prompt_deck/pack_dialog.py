@@ -0,0 +1,153 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpinBox,
+                             QComboBox, QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QApplication)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont
+
+from .styles import FONT_FAMILY, copy_btn_style
+from .packer import PRIORITIES, SHRINK_STRATEGIES, DEFAULT_SHRINK, estimate_tokens
+
+
+class PackDialog(QDialog):
+    """
+    Set per-context priority and shrink strategy, pick a token budget and
+    see what the packer cuts before copying the packed prompt.
+    """
+
+    COLUMNS = ("Context", "Tokens", "Priority", "When over budget", "Result")
+
+    def __init__(self, deck):
+        super().__init__(deck)
+        self.deck = deck
+        self.packed_text = ""
+        self.setWindowTitle("Pack to Token Budget")
+        self.setMinimumSize(620, 400)
+
+        layout = QVBoxLayout(self)
+
+        # Budget row
+        budget_row = QHBoxLayout()
+        budget_label = QLabel("Token budget:")
+        budget_label.setFont(QFont(FONT_FAMILY, 9))
+        budget_row.addWidget(budget_label)
+
+        self.budget_input = QSpinBox()
+        self.budget_input.setRange(1000, 2000000)
+        self.budget_input.setSingleStep(1000)
+        self.budget_input.setValue(deck.token_budget)
+        self.budget_input.valueChanged.connect(self.repack)
+        budget_row.addWidget(self.budget_input)
+
+        budget_row.addStretch()
+
+        self.auto_pack = QCheckBox("Pack when copying")
+        self.auto_pack.setChecked(deck.pack_to_budget)
+        self.auto_pack.setToolTip("Apply this budget to Copy and the launch buttons")
+        budget_row.addWidget(self.auto_pack)
+        layout.addLayout(budget_row)
+
+        # One row per context that has content
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        self.table.setFont(QFont(FONT_FAMILY, 9))
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel("")
+        self.summary_label.setFont(QFont(FONT_FAMILY, 9))
+        self.summary_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        layout.addWidget(self.summary_label)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        copy_btn = QPushButton("Copy Packed")
+        copy_btn.setStyleSheet(copy_btn_style)
+        copy_btn.clicked.connect(self.copy_packed)
+        buttons_layout.addWidget(copy_btn)
+
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+
+        self.populate()
+        self.repack()
+
+    def populate(self):
+        """Fill the table from the deck's current contexts"""
+        self.rows = {}  # context id -> row
+        blocks = self.deck.collect_context_blocks()
+        self.table.setRowCount(len(blocks))
+
+        for row, block in enumerate(blocks):
+            self.rows[block.context_id] = row
+
+            name_item = QTableWidgetItem(block.name or "(no notes)")
+            name_item.setFlags(name_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row, 0, name_item)
+
+            tokens_item = QTableWidgetItem(str(estimate_tokens(block.content)))
+            tokens_item.setFlags(tokens_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row, 1, tokens_item)
+
+            priority = QComboBox()
+            priority.addItems([str(p) for p in PRIORITIES])
+            priority.setCurrentText(str(block.priority))
+            priority.setToolTip("Higher priority contexts are cut last")
+            priority.currentTextChanged.connect(
+                lambda value, cid=block.context_id: self.set_context_option(cid, "priority", int(value)))
+            self.table.setCellWidget(row, 2, priority)
+
+            shrink = QComboBox()
+            for key, label in SHRINK_STRATEGIES.items():
+                shrink.addItem(label, key)
+            index = shrink.findData(block.shrink if block.shrink in SHRINK_STRATEGIES else DEFAULT_SHRINK)
+            shrink.setCurrentIndex(max(index, 0))
+            shrink.currentIndexChanged.connect(
+                lambda _, cid=block.context_id, box=shrink: self.set_context_option(cid, "shrink", box.currentData()))
+            self.table.setCellWidget(row, 3, shrink)
+
+            result_item = QTableWidgetItem("")
+            result_item.setFlags(result_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row, 4, result_item)
+
+    def set_context_option(self, context_id, option, value):
+        """Write a packing option back to its context and re-pack"""
+        context = self.deck.contexts.get(context_id)
+        if context is not None:
+            setattr(context, option, value)
+        self.repack()
+
+    def repack(self):
+        """Run the packer with the current budget and show what it cut"""
+        budget = self.budget_input.value()
+        self.packed_text, decisions = self.deck.assemble_text(budget)
+
+        cut = 0
+        for decision in decisions:
+            row = self.rows.get(decision.block.context_id)
+            if row is None:
+                continue
+            self.table.item(row, 4).setText(decision.describe())
+            if decision.action != "kept":
+                cut += 1
+
+        total = estimate_tokens(self.packed_text)
+        status = "fits" if total <= budget else "still over budget"
+        self.summary_label.setText(f"~{total} / {budget} tokens ({status}), {cut} context(s) cut")
+
+    def copy_packed(self):
+        # Our own copy, not something for the clipboard history
+        self.deck.clipboard_watcher.ignore(self.packed_text)
+        QApplication.clipboard().setText(self.packed_text)
+        self.deck.show_toast("Copied packed prompt")
+        self.accept()
+
+    def done(self, result):
+        # Remember the budget and mode for the next copy, however we're closed
+        self.deck.token_budget = self.budget_input.value()
+        self.deck.pack_to_budget = self.auto_pack.isChecked()
+        super().done(result)
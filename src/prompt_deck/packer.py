@@ -0,0 +1,216 @@
+"""
+Fit contexts into a token budget.
+
+Each context has a priority (higher is more important) and a shrink strategy.
+When the deck is over budget the packer shrinks the least important contexts
+first, cutting only as much as needed, and reports what it did. The main
+prompt is never cut.
+"""
+import math
+import re
+from typing import List, Optional, Tuple
+
+from .context_block import ContextBlock
+
+# Rough estimate that works well enough for English text and code
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = 32000
+DEFAULT_PRIORITY = 3
+PRIORITIES = (1, 2, 3, 4, 5)
+
+# Shrink strategies, in the order they're offered in the UI
+SHRINK_STRATEGIES = {
+    "truncate_tail": "Cut end",
+    "truncate_head": "Cut start",
+    "structure": "Outline",
+    "drop": "Drop",
+}
+DEFAULT_SHRINK = "truncate_tail"
+
+# Don't keep a truncated context that would be smaller than this
+MIN_KEEP_TOKENS = 64
+
+# Lines kept by the "structure" strategy: definitions, imports and headings
+OUTLINE_PATTERN = re.compile(
+    r"^\s*(?:"
+    r"(?:async\s+)?def\s|class\s|import\s|from\s+\S+\s+import\s|"
+    r"(?:export\s+)?(?:default\s+)?(?:async\s+)?function\b|interface\s|struct\s|enum\s|"
+    r"(?:pub(?:\([^)]*\))?\s+)?(?:fn|impl|trait|mod)\s|type\s|func\s|package\s|"
+    r"(?:public|private|protected|static)\s|#include\b|#{1,6}\s|@\w+"
+    r")"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in `text`"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_lines(text: str, max_chars: int, keep: str = "head") -> str:
+    """
+    Keep whole lines from the start (`keep="head"`) or the end (`keep="tail"`)
+    of `text` so the result fits in `max_chars`, with a marker for the cut.
+    """
+    if len(text) <= max_chars:
+        return text
+    lines = text.splitlines(keepends=True)
+    if keep == "tail":
+        lines.reverse()
+
+    kept = []
+    size = 0
+    for line in lines:
+        if size + len(line) > max_chars:
+            break
+        kept.append(line)
+        size += len(line)
+
+    if not kept and lines:
+        # A single line longer than the budget, cut inside it
+        line = lines[0]
+        kept.append(line[:max_chars] if keep == "head" else line[-max_chars:])
+
+    omitted = len(lines) - len(kept)
+    marker = f"[... {omitted} lines omitted ...]"
+    if keep == "tail":
+        kept.reverse()
+        return marker + "\n" + "".join(kept)
+    return "".join(kept).rstrip("\n") + "\n" + marker
+
+
+def outline(text: str) -> str:
+    """Summarize `text` as its definition/heading lines, collapsing the rest"""
+    result = []
+    skipped = 0
+    for line in text.splitlines():
+        if OUTLINE_PATTERN.match(line):
+            if skipped:
+                result.append(f"    [... {skipped} lines ...]")
+                skipped = 0
+            result.append(line.rstrip())
+        else:
+            skipped += 1
+    if skipped:
+        result.append(f"    [... {skipped} lines ...]")
+    return "\n".join(result)
+
+
+class PackDecision:
+    """What the packer did with one block"""
+
+    __slots__ = ("block", "action", "tokens_before", "tokens_after")
+
+    def __init__(self, block: ContextBlock, action: str, tokens_before: int, tokens_after: int):
+        self.block = block
+        self.action = action  # "kept", "dropped" or one of SHRINK_STRATEGIES
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+
+    def describe(self) -> str:
+        if self.action == "kept":
+            return "kept"
+        if self.action == "dropped":
+            return f"dropped ({self.tokens_before} tokens)"
+        label = SHRINK_STRATEGIES.get(self.action, self.action).lower()
+        return f"{label}: {self.tokens_before} -> {self.tokens_after} tokens"
+
+
+def _block_overhead(block: ContextBlock) -> int:
+    # "name:" line plus the blank separator line
+    return estimate_tokens(f"{block.name}:\n\n")
+
+
+def pack_blocks(blocks: List[ContextBlock], budget: int,
+                reserved_tokens: int = 0) -> Tuple[List[ContextBlock], List[PackDecision], int]:
+    """
+    Shrink `blocks` to fit `budget` tokens, `reserved_tokens` being used
+    already (the main prompt). Lowest priority goes first; on equal priority
+    later contexts are cut before earlier ones.
+
+    Returns (packed blocks in original order, one decision per input block,
+    estimated total tokens).
+    """
+    tokens = [estimate_tokens(b.content) for b in blocks]
+    overheads = [_block_overhead(b) for b in blocks]
+    contents: List[Optional[str]] = [b.content for b in blocks]
+    actions = ["kept"] * len(blocks)
+
+    total = reserved_tokens + sum(tokens) + sum(overheads)
+    over = total - budget
+
+    order = sorted(range(len(blocks)), key=lambda i: (blocks[i].priority, -i))
+
+    def drop(i):
+        nonlocal over
+        over -= estimate_tokens(contents[i]) + overheads[i]
+        contents[i] = None
+        actions[i] = "dropped"
+
+    # First pass: apply each block's own strategy, cutting just enough
+    for position, i in enumerate(order):
+        if over <= 0:
+            break
+        block = blocks[i]
+        strategy = block.shrink if block.shrink in SHRINK_STRATEGIES else DEFAULT_SHRINK
+
+        if strategy != "structure":
+            # Before cutting deep into (or dropping) this block, give up what's
+            # left of less important blocks that were only shrunk so far
+            needed = over if strategy == "drop" else over - tokens[i] + MIN_KEEP_TOKENS
+            for j in order[:position]:
+                if needed <= 0:
+                    break
+                if contents[j] is not None:
+                    freed = estimate_tokens(contents[j]) + overheads[j]
+                    drop(j)
+                    needed -= freed
+            if over <= 0:
+                break
+
+        if strategy == "structure":
+            summary = outline(block.content)
+            saved = tokens[i] - estimate_tokens(summary)
+            if saved > 0:
+                contents[i] = summary
+                actions[i] = strategy
+                over -= saved
+            continue
+
+        if strategy in ("truncate_tail", "truncate_head"):
+            target = tokens[i] - over
+            if target >= MIN_KEEP_TOKENS:
+                keep = "head" if strategy == "truncate_tail" else "tail"
+                # Leave room for the "[... N lines omitted ...]" marker
+                cut = truncate_lines(block.content, target * CHARS_PER_TOKEN - 32, keep)
+                contents[i] = cut
+                actions[i] = strategy
+                over -= tokens[i] - estimate_tokens(cut)
+                continue
+
+        # "drop", or a truncation that would leave too little to be useful
+        drop(i)
+
+    # Second pass: still over (outlines too long), drop whatever is left
+    for i in order:
+        if over <= 0:
+            break
+        if contents[i] is not None:
+            drop(i)
+
+    packed = []
+    decisions = []
+    for i, block in enumerate(blocks):
+        content = contents[i]
+        after = estimate_tokens(content) if content is not None else 0
+        decisions.append(PackDecision(block, actions[i], tokens[i], after))
+        if content is None:
+            continue
+        if content is block.content:
+            packed.append(block)
+        else:
+            packed.append(ContextBlock(block.name, content, raw=content, path=block.path,
+                                       priority=block.priority, shrink=block.shrink,
+                                       context_id=block.context_id))
+
+    return packed, decisions, budget + over
@@ -0,0 +1,164 @@
+"""
+Lightweight timing and cache statistics for the operations users wait on.
+
+    with perf.operation("copy"):
+        ...
+        with perf.stage(context_name, "read", nbytes):
+            ...
+
+Stages are attributed to the operation running when they finish (or to
+"background" for work done on worker threads outside an operation). Caches
+report hits and misses by name. Everything is cheap enough to stay on all
+the time; the HUD only reads it.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Operations shown in the HUD, in order
+OPERATIONS = ("copy", "preview", "load", "save")
+STAGES = ("read", "decode", "format")
+MAX_ERRORS = 50
+
+
+class OperationTiming:
+    """Timings of one run of an operation, broken down per context and stage"""
+
+    __slots__ = ("name", "started", "duration", "contexts", "context_bytes", "bytes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.duration = 0.0
+        # context name -> stage -> seconds
+        self.contexts: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self.context_bytes: Dict[str, int] = {}
+        self.bytes = 0
+
+    def add_stage(self, context: str, stage: str, seconds: float, nbytes: int = 0):
+        stages = self.contexts.setdefault(context, {})
+        stages[stage] = stages.get(stage, 0.0) + seconds
+        if nbytes:
+            self.context_bytes[context] = self.context_bytes.get(context, 0) + nbytes
+            self.bytes += nbytes
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 2),
+            "bytes": self.bytes,
+            "contexts": {name: dict({stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+                                    bytes=self.context_bytes.get(name, 0))
+                         for name, stages in self.contexts.items()},
+        }
+
+
+class PerfRecorder:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.last: Dict[str, OperationTiming] = {}
+        self.current: Optional[OperationTiming] = None
+        self.background = OperationTiming("background")
+        self.cache_stats: Dict[str, List[int]] = {}  # name -> [hits, misses]
+        self.errors = deque(maxlen=MAX_ERRORS)
+        self.listeners: List[Callable[[], None]] = []
+
+    @contextmanager
+    def operation(self, name: str, started: Optional[float] = None):
+        """
+        Time a user-facing operation; nested operations are folded into the
+        outer one. `started` (a perf_counter() time) counts the wait before it.
+        """
+        with self.lock:
+            if self.current is not None:
+                outer = True
+            else:
+                outer = False
+                self.current = OperationTiming(name)
+        start = time.perf_counter() if started is None else started
+        try:
+            yield
+        finally:
+            if not outer:
+                with self.lock:
+                    timing = self.current
+                    timing.duration = time.perf_counter() - start
+                    self.current = None
+                    self.last[name] = timing
+                self.notify()
+
+    @contextmanager
+    def stage(self, context: str, stage: str, nbytes: int = 0):
+        """Time one stage of work for one context"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(context, stage, time.perf_counter() - start, nbytes)
+
+    def add_stage(self, context: str, stage: str, seconds: float, nbytes: int = 0):
+        with self.lock:
+            in_operation = self.current is not None and threading.current_thread() is threading.main_thread()
+            timing = self.current if in_operation else self.background
+            timing.add_stage(context, stage, seconds, nbytes)
+
+    def cache_hit(self, cache: str):
+        with self.lock:
+            self.cache_stats.setdefault(cache, [0, 0])[0] += 1
+
+    def cache_miss(self, cache: str):
+        with self.lock:
+            self.cache_stats.setdefault(cache, [0, 0])[1] += 1
+
+    def error(self, operation: str, message: str):
+        """Record an error (they used to only be printed)"""
+        with self.lock:
+            self.errors.append((time.time(), operation, str(message)))
+        self.notify()
+
+    def add_listener(self, callback: Callable[[], None]):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in perf listener: {e}")
+
+    def reset(self):
+        with self.lock:
+            self.last.clear()
+            self.background = OperationTiming("background")
+            self.cache_stats.clear()
+            self.errors.clear()
+        self.notify()
+
+    def snapshot(self) -> Dict:
+        """Everything recorded so far, as plain data"""
+        with self.lock:
+            return {
+                "taken": time.time(),
+                "operations": {name: timing.to_dict() for name, timing in self.last.items()},
+                "background": self.background.to_dict(),
+                "caches": {name: {"hits": hits, "misses": misses,
+                                  "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None}
+                           for name, (hits, misses) in self.cache_stats.items()},
+                "errors": [{"time": t, "operation": op, "message": msg} for t, op, msg in self.errors],
+            }
+
+    def export(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+# Shared by the whole app
+perf = PerfRecorder()
@@ -0,0 +1,162 @@
+import time
+
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QPlainTextEdit,
+                             QFileDialog, QMessageBox)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QFont
+
+from .styles import FONT_FAMILY
+from .perf import OPERATIONS, STAGES, perf
+from .memory import format_bytes
+
+# Coalesce bursts of updates (e.g. a copy touching 100 files) into one repaint
+REFRESH_DELAY = 150  # ms
+
+
+class PerfHud(QDialog):
+    """
+    Non-modal window showing how long copy, preview, load and save took, where
+    the time went per context, how well the caches are doing and recent errors.
+    """
+
+    # perf listeners may fire from worker threads, hop to the GUI thread
+    changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance")
+        self.setWindowFlag(Qt.WindowType.Tool)
+        self.setMinimumSize(480, 460)
+        font = QFont(FONT_FAMILY, 9)
+
+        layout = QVBoxLayout(self)
+
+        # Last run of each operation
+        self.operations_table = QTableWidget(len(OPERATIONS), 4)
+        self.operations_table.setHorizontalHeaderLabels(("Operation", "Last run", "Data", "When"))
+        self.operations_table.verticalHeader().setVisible(False)
+        self.operations_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        self.operations_table.setFont(font)
+        self.operations_table.setMaximumHeight(140)
+        layout.addWidget(self.operations_table)
+
+        # Per-context breakdown of one operation
+        breakdown_row = QHBoxLayout()
+        breakdown_label = QLabel("Breakdown of:")
+        breakdown_label.setFont(font)
+        breakdown_row.addWidget(breakdown_label)
+        self.operation_combo = QComboBox()
+        self.operation_combo.addItems(OPERATIONS + ("background",))
+        self.operation_combo.currentIndexChanged.connect(self.refresh)
+        breakdown_row.addWidget(self.operation_combo)
+        breakdown_row.addStretch()
+        layout.addLayout(breakdown_row)
+
+        self.contexts_table = QTableWidget(0, len(STAGES) + 2)
+        self.contexts_table.setHorizontalHeaderLabels(
+            ("Context",) + tuple(f"{stage.capitalize()} (ms)" for stage in STAGES) + ("Data",))
+        self.contexts_table.verticalHeader().setVisible(False)
+        self.contexts_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.contexts_table.setFont(font)
+        self.contexts_table.setSortingEnabled(True)
+        layout.addWidget(self.contexts_table)
+
+        self.caches_label = QLabel("")
+        self.caches_label.setFont(font)
+        self.caches_label.setWordWrap(True)
+        layout.addWidget(self.caches_label)
+
+        self.errors_view = QPlainTextEdit()
+        self.errors_view.setReadOnly(True)
+        self.errors_view.setFont(font)
+        self.errors_view.setMaximumHeight(90)
+        self.errors_view.setPlaceholderText("No errors")
+        layout.addWidget(self.errors_view)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(perf.reset)
+        buttons_layout.addWidget(reset_btn)
+        buttons_layout.addStretch()
+        export_btn = QPushButton("Export Snapshot...")
+        export_btn.clicked.connect(self.export_snapshot)
+        buttons_layout.addWidget(export_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.hide)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(REFRESH_DELAY)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.changed.connect(self.schedule_refresh)
+        listener = self.changed.emit
+        perf.add_listener(listener)
+        self.destroyed.connect(lambda: perf.remove_listener(listener))
+
+        self.refresh()
+
+    def schedule_refresh(self):
+        # Nothing to repaint while hidden, showEvent refreshes
+        if self.isVisible():
+            self.refresh_timer.start()
+
+    def showEvent(self, event):
+        self.refresh()
+        super().showEvent(event)
+
+    def refresh(self):
+        try:
+            snapshot = perf.snapshot()
+            operations = snapshot["operations"]
+
+            for row, name in enumerate(OPERATIONS):
+                timing = operations.get(name)
+                cells = (name.capitalize(),
+                         f"{timing['duration_ms']:.1f} ms" if timing else "-",
+                         format_bytes(timing["bytes"]) if timing else "",
+                         time.strftime("%H:%M:%S", time.localtime(timing["started"])) if timing else "")
+                for column, text in enumerate(cells):
+                    self.operations_table.setItem(row, column, QTableWidgetItem(text))
+
+            selected = self.operation_combo.currentText()
+            timing = snapshot["background"] if selected == "background" else operations.get(selected)
+            contexts = timing["contexts"] if timing else {}
+            self.contexts_table.setSortingEnabled(False)
+            self.contexts_table.setRowCount(len(contexts))
+            for row, (name, stages) in enumerate(contexts.items()):
+                self.contexts_table.setItem(row, 0, QTableWidgetItem(name))
+                for column, stage in enumerate(STAGES, 1):
+                    item = QTableWidgetItem()
+                    if stage in stages:
+                        # Numeric data so sorting by column works
+                        item.setData(Qt.ItemDataRole.DisplayRole, stages[stage])
+                    self.contexts_table.setItem(row, column, item)
+                self.contexts_table.setItem(row, len(STAGES) + 1,
+                                            QTableWidgetItem(format_bytes(stages["bytes"]) if stages["bytes"] else ""))
+            self.contexts_table.setSortingEnabled(True)
+
+            caches = [f"{name}: {stats['hit_rate']:.0%} hits ({stats['hits']}/{stats['hits'] + stats['misses']})"
+                      for name, stats in sorted(snapshot["caches"].items()) if stats["hit_rate"] is not None]
+            self.caches_label.setText("Caches: " + ("   ".join(caches) if caches else "no lookups yet"))
+
+            self.errors_view.setPlainText("\n".join(
+                f"{time.strftime('%H:%M:%S', time.localtime(error['time']))}  {error['operation']}: {error['message']}"
+                for error in reversed(snapshot["errors"])))
+        except Exception as e:
+            print(f"Error refreshing performance HUD: {e}")
+
+    def export_snapshot(self):
+        """Save everything recorded so far as JSON, e.g. to attach to a bug report"""
+        path, _ = QFileDialog.getSaveFileName(self, "Export Performance Snapshot",
+                                              "prompt-deck-perf.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            perf.export(path)
+        except OSError as e:
+            print(f"Error exporting performance snapshot: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to export snapshot: {e}")
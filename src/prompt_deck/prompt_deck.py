@@ -1,9 +1,13 @@
+import copy
+import os
 import sys
 import json
 import time
 from pathlib import Path
-from typing import Dict, List, Union, Optional
+from typing import Callable, Dict, List, Union, Optional, Tuple
 import webbrowser
+from collections import Counter
+from contextlib import contextmanager
 
 from appdirs import user_data_dir
 
@@ -11,10 +15,10 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QHBoxLayout, QTextEdit, QLineEdit, QPushButton,
     QLabel, QScrollArea, QFrame, QSizePolicy, QMessageBox,
-    QSplitter, QStatusBar, QMenu, QDialog
+    QSplitter, QStatusBar, QMenu, QDialog, QInputDialog, QFileDialog
 )
 from PyQt6.QtCore import (
-    Qt, QSize, QTimer, QPoint, QPropertyAnimation
+    Qt, QSize, QTimer, QPoint, QPropertyAnimation, QEventLoop, QEvent
 )
 
 
@@ -27,8 +31,33 @@ from .styles import (ui_style, add_context_btn_style, copy_btn_style, main_promp
                    get_llm_button_style, delete_button_style, clear_all_style,
                    duplicate_context_style, toast_style, context_section_style)
 
-from .context_input import ContextInput, FileContextInput
+from .context_input import ContextInput, FileContextInput, GitContextInput, read_file_context
+from .context_list import ContextList
+from . import context_model
+from .context_model import ContextModel, ContextRecord
 from .file_drop_area import FileDropArea
+from .templating import collect_variables, declarations_key, render_template
+from .context_block import ContextBlock
+from .dedupe import DuplicateIndex, dedupe_blocks, find_duplicate_file
+from .packer import DEFAULT_TOKEN_BUDGET, PackDecision, estimate_tokens, pack_blocks
+from .pack_dialog import PackDialog
+from .git_source import GitSpec, resolve
+from .loader import PRIORITY_BACKGROUND, PRIORITY_VISIBLE, CancelToken, load_async, pool as loader_pool
+from . import extractors
+from .file_cache import content_hash, file_signature
+from .snippets import SnippetError
+from . import redaction
+from .send_history import CLIPBOARD, SendHistory
+from .stability import build_payload, dump_payload, stable_order
+from .assembly import IDLE_DELAY_MS, LOAD_POLL_MS, Assembly
+from . import bundle, spill
+from .variable_panel import VariablePanel
+from .perf import perf
+from .perf_hud import PerfHud
+from .memory import append_log, build_report
+from .memory_dialog import MemoryDialog
+from .clipboard_history import ClipboardRing, ClipboardWatcher
+from .clipboard_dialog import ClipboardDialog
 
 
 
@@ -109,6 +138,45 @@ class PromptDeck(QMainWindow):
         # Store timer for style reset
         self.style_reset_timer = None
         
+        # Replace duplicated/overlapping contexts with a reference when copying
+        self.dedupe_contexts = False
+        # Mask API keys, tokens and passwords (plus the user's own strings) when copying; opt-in,
+        # masking changes what's sent
+        self.redact_secrets = False
+        self.redaction_literals: List[str] = []
+        # Replace contexts unchanged since the last send to the same target with a marker
+        self.elide_unchanged = False
+        self.send_history = SendHistory()
+        # The last opened .deck bundle, file contexts extract their snapshots from it
+        self.bundle = None
+        # Contexts first, least recently changed first, and the main prompt last (prefix caching)
+        self.stable_order = False
+        # Short notes on what the last assembly changed, for the copy status message
+        self.assembly_notes: List[str] = []
+        # The prompt built ahead of the next copy, and the timer rebuilding it after edits
+        self.assembly: Optional[Assembly] = None
+        self.assembly_timer: Optional[QTimer] = None
+        # Cancels the reads of files and stored text for the prompt built ahead
+        self.ahead_token: Optional[CancelToken] = None
+        # Fit contexts into a token budget when copying
+        self.pack_to_budget = False
+        self.token_budget = DEFAULT_TOKEN_BUDGET
+        # Set while restoring state so restored files don't trigger warnings
+        self.loading_state = False
+        # Nesting depth of bulk_update(); per-context updates wait until it's 0
+        self.bulk_depth = 0
+        # Performance HUD, created on first use
+        self.perf_hud = None
+        # Memory report, created on first use; periodic snapshots go to memory.log
+        self.memory_dialog = None
+        self.memory_log_interval = 0  # minutes, 0 = off
+        self.memory_log_timer = QTimer(self)
+        self.memory_log_timer.timeout.connect(self.log_memory_snapshot)
+        # Recent clipboard texts, captured only while clipboard capture is on
+        self.clipboard_ring = ClipboardRing()
+        self.clipboard_watcher = ClipboardWatcher(self.clipboard_ring, self)
+        self.clipboard_dialog = None
+
         # Undo/redo stack for text edits
         self.undo_stack = []
         self.redo_stack = []
@@ -117,7 +185,8 @@ class PromptDeck(QMainWindow):
         # Setup UI
         self.setup_ui()
         self.setup_shortcuts()
-        self.load_state()
+        with perf.operation("load"):
+            self.load_state()
         
         # Show initial tip
         QTimer.singleShot(500, lambda: self.show_toast("Tip: Drag the contexts by their left handles to reorder them"))
@@ -167,7 +236,20 @@ class PromptDeck(QMainWindow):
         self.main_prompt.setFont(QFont(FONT_FAMILY, 10))
         self.main_prompt.setStyleSheet(main_prompt_style)
         self.main_prompt.textChanged.connect(self.update_main_prompt_char_count)
+        self.main_prompt.textChanged.connect(self.schedule_template_refresh)
+        self.main_prompt.textChanged.connect(self.schedule_assembly)
         prompt_layout.addWidget(self.main_prompt)
+
+        # Template variables found in the main prompt and text contexts
+        self.variable_panel = VariablePanel()
+        self.variable_panel.valuesChanged.connect(self.update_total_char_count)
+        self.variable_panel.valuesChanged.connect(self.schedule_assembly)
+        prompt_layout.addWidget(self.variable_panel)
+
+        # Re-scan for template variables shortly after the user stops typing
+        self.template_timer = QTimer(self)
+        self.template_timer.setSingleShot(True)
+        self.template_timer.timeout.connect(self.refresh_template_variables)
         
         # Add top widget to splitter
         self.splitter.addWidget(top_widget)
@@ -255,8 +337,17 @@ class PromptDeck(QMainWindow):
         # Add splitter to main layout
         main_layout.addWidget(self.splitter)
 
-        # Keep track of contexts
-        self.contexts = []
+        # Keep track of contexts: the widgets, and the model of their data in the same order
+        self.contexts = ContextList()
+        self.model = ContextModel(self)
+
+        # Rebuild the prompt ahead of the next copy once edits stop
+        self.assembly_timer = QTimer(self)
+        self.assembly_timer.setSingleShot(True)
+        self.assembly_timer.timeout.connect(self.assemble_ahead)
+        for signal in (self.model.dataChanged, self.model.rowsInserted, self.model.rowsRemoved,
+                       self.model.rowsMoved, self.model.modelReset):
+            signal.connect(self.schedule_assembly)
 
         # Add a separator before buttons
         separator2 = QFrame()
@@ -333,6 +424,30 @@ class PromptDeck(QMainWindow):
         self.shortcut_preview = QShortcut(QKeySequence("Ctrl+P"), self)
         self.shortcut_preview.activated.connect(self.preview_formatted_text)
         
+        # Add git context (Ctrl+Shift+G)
+        self.shortcut_add_git = QShortcut(QKeySequence("Ctrl+Shift+G"), self)
+        self.shortcut_add_git.activated.connect(self.add_git_context)
+        
+        # Pack to token budget (Ctrl+Shift+B)
+        self.shortcut_pack = QShortcut(QKeySequence("Ctrl+Shift+B"), self)
+        self.shortcut_pack.activated.connect(self.show_pack_dialog)
+        
+        # Performance HUD (Ctrl+Shift+P)
+        self.shortcut_perf_hud = QShortcut(QKeySequence("Ctrl+Shift+P"), self)
+        self.shortcut_perf_hud.activated.connect(self.toggle_perf_hud)
+        
+        # Memory report (Ctrl+Shift+M)
+        self.shortcut_memory = QShortcut(QKeySequence("Ctrl+Shift+M"), self)
+        self.shortcut_memory.activated.connect(self.show_memory_report)
+        
+        # Add the clipboard as a context (Ctrl+Shift+V)
+        self.shortcut_clipboard_context = QShortcut(QKeySequence("Ctrl+Shift+V"), self)
+        self.shortcut_clipboard_context.activated.connect(self.add_clipboard_context)
+        
+        # Clipboard history (Ctrl+Shift+H)
+        self.shortcut_clipboard_history = QShortcut(QKeySequence("Ctrl+Shift+H"), self)
+        self.shortcut_clipboard_history.activated.connect(self.show_clipboard_history)
+        
         # Save (Ctrl+S)
         self.shortcut_save = QShortcut(QKeySequence("Ctrl+S"), self)
         self.shortcut_save.activated.connect(self.save_state)
@@ -345,6 +460,69 @@ class PromptDeck(QMainWindow):
         # Update the state to enable undo/redo
         self.update_state()
         
+    def schedule_template_refresh(self):
+        """Debounce template variable scanning while typing"""
+        self.template_timer.start(300)
+
+    def refresh_template_variables(self):
+        """Update the variable panel from the placeholders used in the deck"""
+        try:
+            sources = [self.main_prompt.toPlainText()] + self.model.template_sources()
+            self.variable_panel.set_variables(collect_variables(sources))
+            # Declarations (defaults, types) are part of the prompt built ahead
+            self.schedule_assembly()
+        except Exception as e:
+            print(f"Error refreshing template variables: {e}")
+
+    def setup_context(self, context):
+        """Connect a new context widget to the deck"""
+        context.id = id(context)  # Store unique ID
+        context.delete_button.clicked.connect(self.on_delete_context)
+        context.duplicateRequested.connect(self.duplicate_context)
+        if isinstance(context, ContextInput):
+            context.content_input.textChanged.connect(self.schedule_template_refresh)
+        if isinstance(context, FileContextInput):
+            context.filePathChanged.connect(self.on_context_file_changed)
+
+        # Add special visual styling
+        context.setStyleSheet(context_section_style)
+
+    def find_duplicate_warning(self, context) -> Optional[str]:
+        """Describe which other context holds the same file as `context`, if any"""
+        path = getattr(context, 'file_path', None)
+        if not path:
+            return None
+        try:
+            # Different snippets of the same file are fine
+            region = self.context_region(context)
+            others = {c.file_path: c for c in self.contexts
+                      if c is not context and getattr(c, 'file_path', None)
+                      and self.context_region(c) == region}
+            match = find_duplicate_file(path, others)
+            if match is None:
+                return None
+            other_path, reason = match
+            other_name = others[other_path].name_input.text() or Path(other_path).name
+            return f"Already in deck as \"{other_name}\" ({reason})"
+        except Exception as e:
+            print(f"Error checking for duplicates: {e}")
+            return None
+
+    def context_region(self, context):
+        """Snippet of a file context as text, None for whole files"""
+        snippet = getattr(context, 'snippet', None)
+        return snippet.describe() if snippet else None
+
+    def on_context_file_changed(self, context):
+        """Warn when a context is pointed at a file that's already in the deck"""
+        if self.loading_state or self.bulk_depth:
+            # Bulk operations check all their files at once
+            return
+        warning = self.find_duplicate_warning(context)
+        if warning:
+            self.show_toast(warning, 4000)
+            self.status_bar.showMessage(warning, 5000)
+
     def update_state(self):
         """Store current state for undo/redo"""
         # TODO: Implement full undo/redo functionality later
@@ -353,14 +531,8 @@ class PromptDeck(QMainWindow):
     def update_total_char_count(self):
         """Update the total character count for all contexts"""
         try:
-            total = len(self.main_prompt.toPlainText())
-            
-            # Add character counts from context sections
-            for context in self.contexts:
-                if hasattr(context, 'content_input'):
-                    total += len(context.content_input.toPlainText())
-                elif hasattr(context, 'char_count'):
-                    total += context.char_count
+            # Context counts are kept up to date on their records
+            total = len(self.main_prompt.toPlainText()) + self.model.total_chars()
             
             self.total_char_count.setText(f"Total: {total} chars")
         except Exception as e:
@@ -375,15 +547,8 @@ class PromptDeck(QMainWindow):
             
         context = ContextInput()
         # Configure the context
-        context.id = id(context)  # Store unique ID
-        context.delete_button.clicked.connect(self.on_delete_context)
-        context.duplicateRequested.connect(self.duplicate_context)
-        
-        # Add special visual styling
-        context.setStyleSheet(context_section_style)
-        
-        self.contexts.append(context)
-        self.context_layout.addWidget(context)
+        self.setup_context(context)
+        self.insert_context(context)
         
         # Update char count
         QTimer.singleShot(100, self.update_total_char_count)
@@ -399,16 +564,10 @@ class PromptDeck(QMainWindow):
             
         # Create the file context input
         file_context = FileContextInput()
-        file_context.id = id(file_context)
-        file_context.delete_button.clicked.connect(self.on_delete_context)
-        file_context.duplicateRequested.connect(self.duplicate_context)
-        
-        # Add special visual styling
-        file_context.setStyleSheet(context_section_style)
+        self.setup_context(file_context)
         
         # Add to context list and layout
-        self.contexts.append(file_context)
-        self.context_layout.addWidget(file_context)
+        self.insert_context(file_context)
         
         # Open file dialog immediately
         try:
@@ -428,28 +587,61 @@ class PromptDeck(QMainWindow):
         
         return file_context
 
+    def add_git_context(self):
+        """Add a context that shows the git diff of a repository"""
+        try:
+            from PyQt6.QtWidgets import QFileDialog
+            path = QFileDialog.getExistingDirectory(self, "Select a Repository")
+            if not path:
+                return None
+
+            # Check if placeholder exists and remove it
+            if hasattr(self, 'placeholder') and self.placeholder is not None:
+                self.placeholder.setVisible(False)
+                self.placeholder = None
+
+            git_context = GitContextInput()
+            self.setup_context(git_context)
+            self.insert_context(git_context)
+
+            git_context.set_spec(GitSpec("diff", path))
+
+            # Update char count once the diff is in
+            QTimer.singleShot(1000, self.update_total_char_count)
+            return git_context
+        except Exception as e:
+            print(f"Error adding git context: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to add git context: {e}")
+            return None
+
+    def insert_context(self, context, after=None):
+        """Add a set up context widget to the deck, at the end or right after `after`"""
+        if after is None:
+            self.contexts.append(context)
+            self.model.add(context.record)
+            self.context_layout.addWidget(context)
+        else:
+            self.contexts.insert_after(context, after)
+            self.model.add(context.record, after=after.record)
+            # The layout also holds the (hidden) placeholder, place it by widget
+            self.context_layout.insertWidget(self.context_layout.indexOf(after) + 1, context)
+
     def duplicate_context(self, context):
         """Duplicate a context with its content"""
         if hasattr(context, 'create_duplicate'):
             try:
                 # Create a duplicate
                 duplicate = context.create_duplicate()
-                duplicate.id = id(duplicate)
-                duplicate.delete_button.clicked.connect(self.on_delete_context)
-                duplicate.duplicateRequested.connect(self.duplicate_context)
-                
-                # Add special visual styling
-                duplicate.setStyleSheet(context_section_style)
+                self.setup_context(duplicate)
                 
                 # Insert after the original context
-                index = self.contexts.index(context)
-                self.contexts.insert(index + 1, duplicate)
-                
-                # Add to layout at the correct position
-                self.context_layout.insertWidget(index + 1, duplicate)
+                self.insert_context(duplicate, after=context)
                 
                 # Show notification
-                self.show_toast("Context duplicated")
+                if self.find_duplicate_warning(duplicate) and not self.dedupe_contexts:
+                    self.show_toast("Context duplicated (its file will be pasted twice)")
+                else:
+                    self.show_toast("Context duplicated")
                 
                 # Update char count
                 QTimer.singleShot(100, self.update_total_char_count)
@@ -470,29 +662,18 @@ class PromptDeck(QMainWindow):
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                # Disconnect signals and remove widgets
-                for context in list(self.contexts):
-                    self.remove_context(context)
+                # Disconnect signals and remove widgets in one pass
+                self.remove_contexts(self.contexts)
                     
                 # Show confirmation
                 self.show_toast("All contexts cleared")
-                
-                # Update char count
-                QTimer.singleShot(100, self.update_total_char_count)
         except Exception as e:
             print(f"Error clearing contexts: {e}")
             QMessageBox.critical(self, "Error", f"Failed to clear contexts: {e}")
 
     def on_delete_context(self):
         """Handles delete button clicks from context objects"""
-        sender = self.sender()
-        context_to_remove = None
-        
-        for context in self.contexts:
-            if context.delete_button == sender:
-                context_to_remove = context
-                break
-                
+        context_to_remove = self.context_for_widget(self.sender())
         if context_to_remove:
             self.remove_context(context_to_remove)
             
@@ -502,98 +683,150 @@ class PromptDeck(QMainWindow):
     def reorder_contexts(self, source_id, target_id):
         """Reorder contexts when drag-and-drop occurs"""
         try:
-            # Find source and target indices
-            source_context = None
-            target_context = None
-            
-            for ctx in self.contexts:
-                if ctx.id == source_id:
-                    source_context = ctx
-                elif ctx.id == target_id:
-                    target_context = ctx
+            source_context = self.contexts.get(source_id)
+            target_context = self.contexts.get(target_id)
             
-            if not source_context or not target_context:
+            if not source_context or not target_context or source_context is target_context:
                 return
                 
-            # Get indices
-            source_index = self.contexts.index(source_context)
-            target_index = self.contexts.index(target_context)
-            
-            if source_index == target_index:
-                return
-                
-            # Remove from original position
-            self.contexts.remove(source_context)
-            
             # Insert at new position (before target)
-            insert_index = self.contexts.index(target_context)
-            self.contexts.insert(insert_index, source_context)
+            self.contexts.move_before(source_context, target_context)
+            self.model.move_before(source_context.record, target_context.record)
             
-            # Update the UI (remove and re-add widgets in correct order)
-            for ctx in self.contexts:
-                self.context_layout.removeWidget(ctx)
-                
-            for ctx in self.contexts:
-                self.context_layout.addWidget(ctx)
+            # Move only the dragged widget in the layout
+            self.context_layout.removeWidget(source_context)
+            self.context_layout.insertWidget(self.context_layout.indexOf(target_context), source_context)
                 
             # Show notification
             self.show_toast("Context order updated")
         except Exception as e:
             print(f"Error reordering contexts: {e}")
 
+    def context_for_widget(self, widget):
+        """The context a widget (e.g. one of its buttons) belongs to, None if none"""
+        while widget is not None:
+            context = self.contexts.get(getattr(widget, 'id', None))
+            if context is widget:
+                return context
+            widget = widget.parentWidget()
+        return None
+
     def handle_file_drop(self, filepath):
         """
         Create a new file context and set the file path.
         """
-        from pathlib import Path
-        
+        self.handle_file_drops([filepath])
+
+    def handle_file_drops(self, filepaths: List[str]) -> List[FileContextInput]:
+        """
+        Create a file context for each path in one pass: one layout update,
+        one duplicate check against an index of the deck and one toast.
+        """
+        added = []
+        skipped = []
+        duplicates = []
         try:
-            # Handle case where an invalid or URL-like path is dropped
-            path_obj = Path(filepath)
-            
-            # Skip if it looks like a URL or invalid path
-            if any(proto in str(path_obj) for proto in ['http:', 'https:', 'ftp:', 'file:']):
-                print(f"Skipping URL-like path: {filepath}")
-                self.show_toast(f"Invalid URL: {filepath}", 2000)
-                return
-                
-            # Skip if file doesn't exist
-            if not path_obj.exists():
-                print(f"File does not exist: {filepath}")
-                self.show_toast(f"File not found: {filepath}", 2000)
-                return
-                
-            # Now create a file context and set the path
-            file_context = FileContextInput()
-            file_context.id = id(file_context)
-            file_context.delete_button.clicked.connect(self.on_delete_context)
-            file_context.duplicateRequested.connect(self.duplicate_context)
-            
-            # Add special visual styling
-            file_context.setStyleSheet(context_section_style)
-            
-            # Check if placeholder exists and remove it
-            if hasattr(self, 'placeholder') and self.placeholder is not None:
-                self.placeholder.setVisible(False)
-                self.placeholder = None
-                
-            # Add to context list and layout
-            self.contexts.append(file_context)
-            self.context_layout.addWidget(file_context)
-            
-            # Set the file path
-            file_context.set_file_path(filepath)
-            
-            # Show confirmation toast
-            self.show_toast(f"Added file: {path_obj.name}")
-            
-            # Update char count
-            QTimer.singleShot(1000, self.update_total_char_count)
+            with self.bulk_update():
+                # Dropped files are whole files, compare them with other whole files
+                existing = {c.file_path: c for c in self.contexts
+                            if getattr(c, 'file_path', None) and self.context_region(c) is None}
+                index = DuplicateIndex(existing)
+
+                for filepath in filepaths:
+                    path_obj = Path(filepath)
+
+                    # Skip if it looks like a URL or invalid path
+                    if any(proto in str(path_obj) for proto in ['http:', 'https:', 'ftp:', 'file:']):
+                        print(f"Skipping URL-like path: {filepath}")
+                        skipped.append(f"Invalid URL: {filepath}")
+                        continue
+
+                    # Skip if file doesn't exist
+                    if not path_obj.exists():
+                        print(f"File does not exist: {filepath}")
+                        skipped.append(f"File not found: {filepath}")
+                        continue
+
+                    # Now create a file context and set the path
+                    file_context = FileContextInput()
+                    self.setup_context(file_context)
+                    self.insert_context(file_context)
+                    file_context.set_file_path(filepath)
+                    added.append(file_context)
+
+                    match = index.find(filepath)
+                    if match is not None:
+                        other_path, reason = match
+                        other = existing.get(other_path)
+                        other_name = (other.name_input.text() if other is not None else "") or Path(other_path).name
+                        duplicates.append(f"Already in deck as \"{other_name}\" ({reason})")
+                    index.add(filepath)
+                    existing.setdefault(filepath, file_context)
         except Exception as e:
             print(f"Error handling file drop: {e}")
             # Show error message to user
             QMessageBox.critical(self, "Error", f"Could not load file: {e}")
 
+        # One notification for the whole drop
+        if len(filepaths) == 1 and (skipped or duplicates):
+            message = (skipped or duplicates)[0]
+            self.show_toast(message, 4000 if duplicates else 2000)
+            if duplicates:
+                self.status_bar.showMessage(message, 5000)
+        elif len(added) == 1 and len(filepaths) == 1:
+            self.show_toast(f"Added file: {Path(added[0].file_path).name}")
+        elif filepaths:
+            message = f"Added {len(added)} file{'s' if len(added) != 1 else ''}"
+            if duplicates:
+                message += f", {len(duplicates)} already in deck"
+            if skipped:
+                message += f", {len(skipped)} skipped"
+            self.show_toast(message, 3000)
+            if duplicates or skipped:
+                self.status_bar.showMessage("; ".join(skipped + duplicates), 8000)
+        return added
+
+    @contextmanager
+    def bulk_update(self):
+        """
+        Batch many context changes: repaints are suspended, and the
+        placeholder, template scan and character count are updated once at
+        the end instead of once per context.
+        """
+        self.bulk_depth += 1
+        if self.bulk_depth == 1:
+            self.context_container.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            self.bulk_depth -= 1
+            if self.bulk_depth == 0:
+                self.update_placeholder()
+                self.context_container.setUpdatesEnabled(True)
+                self.schedule_template_refresh()
+                QTimer.singleShot(100, self.update_total_char_count)
+
+    def update_placeholder(self):
+        """Show the drop placeholder only while there are no contexts"""
+        if self.contexts:
+            if hasattr(self, 'placeholder') and self.placeholder is not None:
+                self.placeholder.setVisible(False)
+                self.placeholder = None
+        else:
+            if not hasattr(self, 'placeholder') or self.placeholder is None:
+                from .file_placeholder import FilePlaceholder
+                self.placeholder = FilePlaceholder()
+                self.context_layout.addWidget(self.placeholder)
+
+            # Update status bar
+            self.status_bar.showMessage("No contexts added yet")
+
+    def remove_contexts(self, contexts):
+        """Remove several contexts with a single layout update"""
+        with self.bulk_update():
+            for context in list(contexts):
+                self.remove_context(context)
+
     def remove_context(self, context):
         if context in self.contexts:
             # Disconnect signals first to prevent callbacks on deleted objects
@@ -605,15 +838,15 @@ class PromptDeck(QMainWindow):
                 if hasattr(context, 'duplicateRequested'):
                     context.duplicateRequested.disconnect()
                 
-                # Cancel any running file threads
-                if hasattr(context, 'file_thread') and hasattr(context.file_thread, 'isRunning') and context.file_thread.isRunning():
-                    context.file_thread.terminate()
-                    context.file_thread.wait()
+                # Cancel any background load; it stops at a safe point and its result is dropped
+                if hasattr(context, 'cancel_load'):
+                    context.cancel_load()
             except Exception as e:
                 # Already disconnected or other error
                 print(f"Error disconnecting signals: {e}")
                 
             self.contexts.remove(context)
+            self.model.remove(context.record)
             
             # First, remove from layout
             self.context_layout.removeWidget(context)
@@ -624,41 +857,64 @@ class PromptDeck(QMainWindow):
             # Finally, schedule for deletion
             context.deleteLater()
             
-        # If no contexts left, show placeholder again
-        if not self.contexts:
-            if not hasattr(self, 'placeholder') or self.placeholder is None:
-                from .file_placeholder import FilePlaceholder
-                self.placeholder = FilePlaceholder()
-                self.context_layout.addWidget(self.placeholder)
-                
-            # Update status bar
-            self.status_bar.showMessage("No contexts added yet")
+        # If no contexts left, show placeholder again (bulk updates do this once at the end)
+        if not self.contexts and not self.bulk_depth:
+            self.update_placeholder()
 
     def copy_to_clipboard(self):
+        self.copy_for_target(CLIPBOARD)
+
+    def copy_for_target(self, target: str, then: Optional[Callable[[], None]] = None):
+        """
+        Copy the prompt as sent to `target` (the clipboard or a chat site),
+        once it's ready; `then` runs after it's copied
+        """
         try:
             # Update status
             self.status_bar.showMessage("Preparing content...")
+            started = time.perf_counter()
+            # The prompt built ahead, or rebuilt from the latest file contents if anything changed
+            self.prepare_assembly(target, lambda assembly: self.finish_copy(assembly, started, then))
+        except Exception as e:
+            print(f"Error copying to clipboard: {e}")
+            perf.error("copy", e)
+            self.status_bar.showMessage(f"Error: {e}", 3000)
+            QMessageBox.critical(self, "Error", f"Failed to copy to clipboard: {e}")
+
+    def finish_copy(self, assembly: Assembly, started: float, then: Optional[Callable[[], None]] = None):
+        """Put the prepared prompt on the clipboard"""
+        try:
+            with perf.operation("copy", started):
+                formatted_text = self.formatted_text(assembly)
             
-            # Load latest file content before copying
-            self.reload_file_contents()
-            
-            # Get the formatted text
-            formatted_text = self.get_formatted_text()
-            
-            # Copy to clipboard
-            clipboard = QApplication.clipboard()
-            clipboard.setText(formatted_text)
+                # Copy to clipboard (not into the clipboard history)
+                self.clipboard_watcher.ignore(formatted_text)
+                clipboard = QApplication.clipboard()
+                clipboard.setText(formatted_text)
             
-            # Show success message
-            self.status_bar.showMessage(f"Copied {len(formatted_text)} characters to clipboard", 3000)
+            # Show success message, with what compaction saved if it's on anywhere
+            saved = sum(c.last_compaction.chars_saved for c in self.contexts
+                        if getattr(c, 'last_compaction', None) is not None)
+            notes = list(self.assembly_notes)
+            if saved > 0:
+                notes.insert(0, f"compaction saved {saved}")
+            if notes:
+                self.status_bar.showMessage(
+                    f"Copied {len(formatted_text)} characters to clipboard "
+                    f"({'; '.join(notes)})", 5000)
+            else:
+                self.status_bar.showMessage(f"Copied {len(formatted_text)} characters to clipboard", 3000)
             
             # Show toast notification
             self.show_toast("Copied to clipboard")
             
             # Update character counts
             self.update_total_char_count()
+            if then is not None:
+                then()
         except Exception as e:
             print(f"Error copying to clipboard: {e}")
+            perf.error("copy", e)
             self.status_bar.showMessage(f"Error: {e}", 3000)
             QMessageBox.critical(self, "Error", f"Failed to copy to clipboard: {e}")
 
@@ -667,27 +923,35 @@ class PromptDeck(QMainWindow):
         try:
             # Update status
             self.status_bar.showMessage("Preparing preview...")
+            started = time.perf_counter()
+            # The prompt built ahead, or rebuilt from the latest file contents if anything changed
+            self.prepare_assembly(None, lambda assembly: self.show_preview(assembly, started))
+        except Exception as e:
+            print(f"Error showing preview: {e}")
+            perf.error("preview", e)
+            self.status_bar.showMessage(f"Error: {e}", 3000)
+            QMessageBox.critical(self, "Error", f"Failed to generate preview: {e}")
+
+    def show_preview(self, assembly: Assembly, started: float):
+        """Show the prepared prompt in a dialog"""
+        try:
+            with perf.operation("preview", started):
+                formatted_text = self.formatted_text(assembly)
             
-            # Load latest file content
-            self.reload_file_contents()
-            
-            # Get the formatted text
-            formatted_text = self.get_formatted_text()
-            
-            # Show preview dialog
-            preview = QDialog(self)
-            preview.setWindowTitle("Preview")
-            preview.setMinimumSize(500, 400)
+                # Show preview dialog
+                preview = QDialog(self)
+                preview.setWindowTitle("Preview")
+                preview.setMinimumSize(500, 400)
             
-            # Layout
-            layout = QVBoxLayout(preview)
+                # Layout
+                layout = QVBoxLayout(preview)
             
-            # Preview text area
-            preview_text = QTextEdit()
-            preview_text.setReadOnly(True)
-            preview_text.setFont(QFont(FONT_FAMILY, 10))
-            preview_text.setPlainText(formatted_text)
-            layout.addWidget(preview_text)
+                # Preview text area
+                preview_text = QTextEdit()
+                preview_text.setReadOnly(True)
+                preview_text.setFont(QFont(FONT_FAMILY, 10))
+                preview_text.setPlainText(formatted_text)
+                layout.addWidget(preview_text)
             
             # Info label
             info_label = QLabel(f"Total: {len(formatted_text)} characters")
@@ -717,95 +981,552 @@ class PromptDeck(QMainWindow):
             
             # Show dialog
             preview.exec()
+            # Don't keep a copy of the whole prompt around after closing
+            preview.deleteLater()
             
             # Update status
             self.status_bar.showMessage("Preview closed", 3000)
             
         except Exception as e:
             print(f"Error showing preview: {e}")
+            perf.error("preview", e)
             self.status_bar.showMessage(f"Error: {e}", 3000)
             QMessageBox.critical(self, "Error", f"Failed to generate preview: {e}")
 
-    def reload_file_contents(self):
-        """Reload the latest content from all file contexts"""
-        try:
-            # Update status
-            self.status_bar.showMessage("Reading file contents...", 1000)
-            
-            for context in self.contexts:
-                if isinstance(context, FileContextInput) and hasattr(context, 'read_latest_content'):
-                    context.read_latest_content()
-        except Exception as e:
-            print(f"Error reloading file contents: {e}")
-            self.status_bar.showMessage(f"Error reading files: {e}", 3000)
+    def refresh_git_contexts(self, then: Optional[Callable[[], None]] = None):
+        """
+        Re-resolve all git contexts in parallel on the loader pool; unchanged
+        diffs come straight from the cache. `then` runs once all of them are
+        in (right away without git contexts).
+        """
+        git_contexts = [c for c in self.contexts if isinstance(c, GitContextInput) and c.spec.repo]
+        if not git_contexts:
+            if then is not None:
+                then()
+            return
+
+        start = time.perf_counter()
+        pending = [len(git_contexts)]
+
+        def finished(context, spec, text, error):
+            # Unless the context is gone, has a new spec or is refreshing itself
+            if context in self.contexts and context.spec is spec and context.load_token is None:
+                context.apply_result(text, error)
+            pending[0] -= 1
+            if not pending[0]:
+                perf.add_stage("git contexts", "read", time.perf_counter() - start)
+                if then is not None:
+                    then()
+
+        for context in git_contexts:
+            spec = context.spec
+            load_async(resolve, spec,
+                       on_done=lambda text, c=context, s=spec: finished(c, s, text, None),
+                       on_error=lambda error, c=context, s=spec: finished(c, s, "", str(error)),
+                       priority=PRIORITY_BACKGROUND)
 
     def launch_site(self, url: str, site_name: str):
         try:
             # Update status
             self.status_bar.showMessage(f"Launching {site_name}...")
             
-            # Copy to clipboard
-            self.copy_to_clipboard()
-            
-            # Launch the site
+            # Copy to clipboard, eliding what this site was already sent, then launch the site
+            self.copy_for_target(site_name, lambda: self.open_site(url, site_name))
+        except Exception as e:
+            print(f"Error launching site: {e}")
+            self.status_bar.showMessage(f"Error: {e}", 3000)
+            QMessageBox.critical(self, "Error", f"Failed to open website: {e}")
+
+    def open_site(self, url: str, site_name: str):
+        try:
             webbrowser.open(url)
-            
-            # Update status
             self.status_bar.showMessage(f"Launched {site_name}", 3000)
         except Exception as e:
             print(f"Error launching site: {e}")
             self.status_bar.showMessage(f"Error: {e}", 3000)
             QMessageBox.critical(self, "Error", f"Failed to open website: {e}")
 
-    def get_formatted_text(self) -> str:
-        parts = [self.main_prompt.toPlainText(), ""]
+    def collect_context_blocks(self, ahead: bool = False) -> List[ContextBlock]:
+        """
+        Build one block per context that has something to paste. With
+        `ahead`, the blocks read from disk are the ones read_blocks() kept.
+        """
+        values = self.variable_panel.values
+        blocks = []
+
+        for index, record in enumerate(self.model, 1):
+            if ahead and self.reads_disk(record):
+                if record.rendered is not None and record.rendered[1] is not None:
+                    blocks.append(record.rendered[1])
+                continue
+            # Re-rendered only when the context (or its file, git result or template values) changed
+            key = self.render_key(record, values)
+            if key is not None and record.rendered is not None and record.rendered[0] == key:
+                block = record.rendered[1]
+            else:
+                with perf.stage(self.context_label(record, index), "format"):
+                    block = self.render_block(record, values)
+                record.rendered = (key, block) if key is not None else None
+            if block is not None:
+                blocks.append(block)
+        return blocks
+
+    def context_label(self, context, index: int) -> str:
+        """Name a context (or its record) in the performance HUD, file contexts by file name"""
+        record = getattr(context, 'record', context)
+        if record.file_path:
+            return os.path.basename(record.file_path)
+        return record.label or f"Context {index}"
+
+    def reads_disk(self, record: ContextRecord) -> bool:
+        """Whether a context's block is read from disk (files and stored text)"""
+        return record.kind == context_model.FILE or bool(record.spill_path)
+
+    def render_key(self, record: ContextRecord, values: Dict) -> Optional[Tuple]:
+        """What a context's block is built from, None if it has to be rebuilt every time"""
+        if record.kind == context_model.GIT:
+            return (record.revision, record.cached_text)
+        if record.kind == context_model.FILE:
+            signature = file_signature(record.file_path) if record.file_path else None
+            if signature is None:
+                # Missing: read every time, so the widget shows it
+                return None
+            return (record.revision, signature, tuple(sorted(extractors.options.items())))
+        if record.spill_path:
+            # Spill files never change, they're named by content
+            return (record.revision, record.spill_path, record.char_count)
+        if record.file_name or "{{" not in record.text:
+            return (record.revision,)
+        return (record.revision, tuple(sorted(values.items())), declarations_key(self.variable_panel.variables))
+
+    def render_block(self, record: ContextRecord, values: Dict) -> Optional[ContextBlock]:
+        """The block for one context, None if it has nothing to paste"""
+        if record.kind == context_model.GIT:
+            # Refreshed in the background by assemble_ahead
+            if record.cached_text:
+                return ContextBlock(record.name, record.cached_text,
+                                    priority=record.priority, shrink=record.shrink,
+                                    context_id=record.id)
+        elif record.kind == context_model.FILE:
+            # For file contexts, get the most recent content (the widget shows read errors)
+            content, success = self.contexts.get(record.id).read_latest_content()
+            if success:
+                return self.file_block(record, content)
+        elif record.spill_path:
+            # Too large to edit, read from disk now
+            try:
+                text = spill.read_spill(record.spill_path)
+            except OSError as e:
+                print(f"Error reading stored text: {e}")
+                return None
+            return self.spill_block(record, text)
+        else:
+            # Regular context - check if it has content
+            if record.name or record.text:
+                if record.file_name:
+                    # Loaded files stay verbatim, compare them by their text
+                    return ContextBlock(record.name, record.content,
+                                        raw=record.text,
+                                        path=record.file_path,
+                                        priority=record.priority, shrink=record.shrink,
+                                        context_id=record.id)
+                # Only typed text is a template
+                content = render_template(record.text, values, self.variable_panel.variables)
+                return ContextBlock(record.name, content,
+                                    priority=record.priority, shrink=record.shrink,
+                                    context_id=record.id)
+        return None
+
+    def file_block(self, record: ContextRecord, content: str) -> ContextBlock:
+        """The block of a file context, from the content read_file_context() returned"""
+        return ContextBlock(record.name, content, path=record.file_path,
+                            region=record.region,
+                            priority=record.priority, shrink=record.shrink,
+                            context_id=record.id)
+
+    def spill_block(self, record: ContextRecord, text: str) -> ContextBlock:
+        """The block of a text context stored on disk, from its text"""
+        return ContextBlock(record.name, record.wrap(text), raw=text, path=record.file_path,
+                            priority=record.priority, shrink=record.shrink,
+                            context_id=record.id)
+
+    def assembly_key(self, values: Dict) -> Optional[Tuple]:
+        """Everything the prompt is built from, None if it can't be reused"""
+        contexts = []
+        for record in self.model:
+            key = self.render_key(record, values)
+            if key is None:
+                return None
+            contexts.append((record.id, key))
+        settings = (self.dedupe_contexts, self.redact_secrets, tuple(self.redaction_literals),
+                    self.stable_order, self.token_budget if self.pack_to_budget else None)
+        return (self.main_prompt.toPlainText(), tuple(sorted(values.items())),
+                declarations_key(self.variable_panel.variables), settings, tuple(contexts))
 
+    def current_assembly(self, target: Optional[str] = None) -> Assembly:
+        """
+        The prompt as it's copied now, built right away: the one built ahead
+        if nothing changed since, otherwise it's rebuilt, reading files on
+        the GUI thread. The window uses prepare_assembly() instead.
+        With a `target` the prompt is being sent there and goes into the send
+        history (and unchanged contexts are elided if that's on).
+        """
+        # Elided prompts depend on the send history, they're never reused
+        elide = target is not None and self.elide_unchanged
+        key = None if elide else self.assembly_key(self.variable_panel.values)
+        assembly = self.assembly
+        if key is None or assembly is None or assembly.key != key:
+            budget = self.token_budget if self.pack_to_budget else None
+            assembly = self.assemble(budget, target if elide else None, self.stable_order, key)
+            if assembly.key is not None:
+                self.assembly = assembly
+        if target is not None:
+            self.send_history.record(target, assembly.sent, assembly.skipped)
+        return assembly
+
+    def prepare_assembly(self, target: Optional[str], then: Callable[[Assembly], None]):
+        """
+        Pass the prompt as it's copied now to `then`. The one built ahead is
+        handed over if nothing changed since; otherwise the files and stored
+        text that changed are read on the loader pool and it's rebuilt when
+        they're in. Git contexts aren't resolved again, building ahead keeps
+        them current. With a `target` the prompt is being sent there and goes
+        into the send history (and unchanged contexts are elided if that's on).
+        """
+        if any(isinstance(c, FileContextInput) and c.extracting for c in self.contexts):
+            # Contexts from an opened bundle get their file once it's extracted
+            QTimer.singleShot(LOAD_POLL_MS, lambda: self.prepare_assembly(target, then))
+            return
+
+        def send(assembly):
+            if target is not None:
+                self.send_history.record(target, assembly.sent, assembly.skipped)
+            then(assembly)
+
+        # Elided prompts depend on the send history, they're never reused
+        elide = target is not None and self.elide_unchanged
+        values = self.variable_panel.values
+        key = None if elide else self.assembly_key(values)
+        if key is not None and self.assembly is not None and self.assembly.key == key:
+            send(self.assembly)
+            return
+
+        keys = {record.id: self.render_key(record, values) for record in self.model}
+        unread = [record for record in self.model if self.reads_disk(record) and
+                  (keys[record.id] is None or record.rendered is None or record.rendered[0] != keys[record.id])]
+
+        def build(complete, errors):
+            if errors:
+                QMessageBox.warning(self, "Warning",
+                                    "These contexts couldn't be read and were left out:\n" + "\n".join(errors))
+            budget = self.token_budget if self.pack_to_budget else None
+            assembly = self.assemble(budget, target if elide else None, self.stable_order, key, ahead=True)
+            if complete and assembly.key is not None:
+                self.assembly = assembly
+            send(assembly)
+
+        self.read_blocks(unread, keys, CancelToken(), build)
+
+    def formatted_text(self, assembly: Assembly) -> str:
+        """The text of a prepared prompt, showing what building it did in the status bar"""
+        for message in assembly.messages:
+            self.status_bar.showMessage(message, 5000)
+        self.assembly_notes = assembly.notes
+        return assembly.text
+
+    def schedule_assembly(self):
+        """Build the prompt ahead once the user is idle"""
+        if self.assembly_timer is not None:
+            self.assembly_timer.start(IDLE_DELAY_MS)
+
+    def discard_assembly(self):
+        """Drop the prompt built ahead and the rendered contexts, the next copy rebuilds them"""
+        self.assembly = None
+        if self.ahead_token is not None:
+            self.ahead_token.cancel()
+            self.ahead_token = None
+        for record in self.model:
+            record.rendered = None
+
+    def assemble_ahead(self):
+        """Re-resolve the git contexts, then build the prompt for the next copy (see build_ahead)"""
+        if self.bulk_depth or self.loading_state:
+            return
+        self.refresh_git_contexts(self.build_ahead)
+
+    def build_ahead(self):
+        """
+        Build the prompt for the next copy, unless nothing changed or a
+        context is still loading. Files and stored text are read on the
+        loader pool first (see read_blocks), so the GUI thread never waits on
+        disk. Stored text over KEEP_RENDERED_CHARS is left for a copy to read.
+        """
+        if self.bulk_depth or self.loading_state:
+            return
+        if any(getattr(context, 'load_token', None) is not None for context in self.contexts):
+            # Contexts update their records when their loads finish, which schedules this again
+            return
         try:
-            # Process only contexts that are still in the UI and have content
-            valid_contexts = [
-                c for c in self.contexts
-                if c.parent() is not None
-            ]
-            
-            for context in valid_contexts:
-                data = context.get_data()
-                
-                if isinstance(context, FileContextInput):
-                    # For file contexts, get the most recent content
-                    content, success = context.read_latest_content()
-                    if success:
-                        parts.extend([
-                            f"{data['name']}:",
-                            content,
-                            ""
-                        ])
+            key = self.assembly_key(self.variable_panel.values)
+            if key is None or (self.assembly is not None and self.assembly.key == key):
+                return
+            keys = dict(key[-1])
+            unread = [record for record in self.model if self.reads_disk(record) and
+                      (record.rendered is None or record.rendered[0] != keys[record.id])]
+            if any(record.spill_path and record.char_count > spill.KEEP_RENDERED_CHARS for record in unread):
+                return
+            if unread:
+                if self.ahead_token is not None:
+                    self.ahead_token.cancel()
+                token = self.ahead_token = CancelToken()
+
+                def done(complete, errors):
+                    if token is self.ahead_token:
+                        self.ahead_token = None
+                    # Otherwise building ahead waits for the next change
+                    if complete:
+                        self.build_ahead()
+
+                self.read_blocks(unread, keys, token, done)
+                return
+            budget = self.token_budget if self.pack_to_budget else None
+            assembly = self.assemble(budget, None, self.stable_order, key, ahead=True)
+            if assembly.key is not None:
+                self.assembly = assembly
+        except Exception as e:
+            print(f"Error assembling ahead: {e}")
+
+    def read_blocks(self, records: List[ContextRecord], keys: Dict[int, Optional[Tuple]], token: CancelToken,
+                    then: Callable[[bool, List[str]], None]):
+        """
+        Read the blocks of `records` (files and stored text) on the loader
+        pool and keep them on the records under their render `keys`, then
+        call then(complete, errors): complete is False if a read failed or
+        its context changed meanwhile, errors name the contexts that failed.
+        Errors also go to the context's status, never to a dialog.
+        """
+        pending = {record.id for record in records}
+        complete = [True]
+        errors = []
+
+        def current(record):
+            return (self.model.record(record.id) is record and
+                    self.render_key(record, self.variable_panel.values) == keys[record.id])
+
+        def finished(record):
+            pending.discard(record.id)
+            if not pending:
+                then(complete[0], errors)
+
+        def file_read(record, spec, result):
+            if current(record):
+                content, snippet, compacted = result
+                record.rendered = (keys[record.id], self.file_block(record, content))
+                self.contexts.get(record.id).show_read(content, snippet, compacted, spec)
+            else:
+                complete[0] = False
+            finished(record)
+
+        def spill_read(record, text):
+            if current(record):
+                record.rendered = (keys[record.id], self.spill_block(record, text))
+            else:
+                complete[0] = False
+            finished(record)
+
+        def failed(record, error):
+            complete[0] = False
+            label = self.context_label(record, 0)
+            print(f"Error reading {label}: {error}")
+            perf.error("read", error)
+            errors.append(f"{label}: {error}")
+            if self.model.record(record.id) is record:
+                # Left out until it changes, like a file that fails to read when copying
+                record.rendered = (keys[record.id], None)
+            context = self.contexts.get(record.id)
+            if isinstance(context, FileContextInput):
+                if isinstance(error, FileNotFoundError):
+                    context.show_read_error("File missing", str(error))
+                elif isinstance(error, SnippetError):
+                    context.show_read_error(str(error))
                 else:
-                    # Regular context - check if it has content
-                    if data.get("name") or data.get("content"):
-                        parts.extend([
-                            f"{data['name']}:",
-                            data["content"],
-                            ""
-                        ])
+                    context.show_read_error("Error", str(error))
+            elif context is not None:
+                context.set_status(f"Error: {error}", 5000)
+            finished(record)
+
+        if not records:
+            then(True, errors)
+            return
+        for record in records:
+            if record.kind == context_model.FILE:
+                if not record.file_path:
+                    record.rendered = (keys[record.id], None)
+                    finished(record)
+                    continue
+                # Re-anchoring a line range changes the spec, the context takes the copy over
+                spec = copy.copy(record.snippet)
+                load_async(read_file_context, record.file_path, spec, record.grep, record.truncation,
+                           list(record.compaction), token, record.extract_html,
+                           on_done=lambda result, r=record, s=spec: file_read(r, s, result),
+                           on_error=lambda error, r=record: failed(r, error),
+                           priority=PRIORITY_VISIBLE, token=token)
+            else:
+                load_async(spill.read_spill, record.spill_path, token,
+                           on_done=lambda text, r=record: spill_read(r, text),
+                           on_error=lambda error, r=record: failed(r, error),
+                           priority=PRIORITY_VISIBLE, token=token)
+
+    def assemble_text(self, budget: Optional[int] = None) -> Tuple[str, List[PackDecision]]:
+        """
+        Build the final prompt. With a token budget, contexts are packed into
+        it and the packer's decisions are returned along with the text.
+        """
+        assembly = self.assemble(budget, stable=self.stable_order)
+        for message in assembly.messages:
+            self.status_bar.showMessage(message, 5000)
+        return assembly.text, assembly.decisions
+
+    def assemble(self, budget: Optional[int] = None, target: Optional[str] = None, stable: bool = False,
+                 key: Optional[Tuple] = None, ahead: bool = False) -> Assembly:
+        """
+        Build the prompt. With a token budget, contexts are packed into it.
+        With a `target`, contexts unchanged since the last send there are
+        elided. `stable` puts contexts from least to most recently changed
+        first and the main prompt last. `ahead` of a copy, files and stored
+        text aren't read (see collect_context_blocks).
+        """
+        values = self.variable_panel.values
+        assembly = Assembly(render_template(self.main_prompt.toPlainText(), values, self.variable_panel.variables), key)
+        parts = []
+
+        try:
+            self.assemble_blocks(assembly, budget, target, stable, ahead)
+            for block in assembly.blocks:
+                parts.extend([
+                    f"{block.name}:",
+                    block.content,
+                    ""
+                ])
         except Exception as e:
             print(f"Error formatting text: {e}")
+            perf.error("format", e)
             parts.append(f"[Error formatting context data: {e}]")
+            assembly.key = None
 
-        return "\n".join(parts)
+        # Stable order puts the main prompt, the part edited most, last
+        parts = parts + [assembly.main_text] if stable else [assembly.main_text, ""] + parts
+        assembly.text = "\n".join(parts)
+        return assembly
+
+    def assemble_blocks(self, assembly: Assembly, budget: Optional[int] = None, target: Optional[str] = None,
+                        stable: bool = False, ahead: bool = False):
+        """
+        Fill in the assembly's blocks as they're sent, after dedupe,
+        redaction, elision and packing
+        """
+        blocks = self.collect_context_blocks(ahead)
+
+        if self.dedupe_contexts:
+            blocks, report = dedupe_blocks(blocks)
+            if report:
+                assembly.messages.append(f"Skipped {len(report)} duplicate context(s): " + "; ".join(report))
+                assembly.notes.append(f"{len(report)} duplicate(s) skipped")
+
+        if self.redact_secrets:
+            blocks = self.redact_blocks(assembly, blocks)
+
+        if stable:
+            # Change history, of the text as sent; only kept while it's used, hashing isn't free
+            now = time.time()
+            for block in blocks:
+                record = self.model.record(block.context_id)
+                if record is not None:
+                    record.note_content(content_hash(block.content), now)
+
+        assembly.sent = blocks
+        if target is not None and self.elide_unchanged:
+            blocks, report = self.send_history.elide(target, blocks)
+            if report:
+                assembly.messages.append(f"Since the last send to {target}: " + "; ".join(report))
+                assembly.notes.append(f"{len(report)} context(s) elided or diffed")
+
+        if budget:
+            blocks, assembly.decisions, _ = pack_blocks(blocks, budget, estimate_tokens(assembly.main_text))
+            assembly.skipped = [d.block.context_id for d in assembly.decisions if d.action != "kept"]
+            cut = [d for d in assembly.decisions if d.action != "kept"]
+            if cut:
+                assembly.messages.append(
+                    f"Packed into {budget} tokens: " +
+                    "; ".join(f"{d.block.name or 'context'} {d.describe()}" for d in cut))
+
+        if stable:
+            blocks = stable_order(blocks, self.changed_at())
+        assembly.blocks = blocks
+
+    def changed_at(self) -> Dict[int, float]:
+        """When each context's text last changed, by context id"""
+        return {record.id: record.changed_at for record in self.model if record.changed_at is not None}
+
+    def redact_blocks(self, assembly: Assembly, blocks: List[ContextBlock]) -> List[ContextBlock]:
+        """Mask secrets in the main prompt and `blocks`; returns the masked blocks"""
+        found = Counter()
+        literals = self.redaction_literals
+        with perf.stage("Redaction", "format", len(assembly.main_text) + sum(len(b.content) for b in blocks)):
+            assembly.main_text, masked = redaction.redact(assembly.main_text, literals)
+            found.update(masked)
+            result = []
+            for block in blocks:
+                content, masked = redaction.redact(block.content, literals)
+                # Blocks are cached on their records, masking makes a copy
+                result.append(block.with_content(content) if masked else block)
+                found.update(masked)
+        if found:
+            assembly.messages.append(
+                f"Masked {sum(found.values())} secret(s): " + redaction.describe(found))
+            assembly.notes.append(f"{sum(found.values())} secret(s) masked")
+        return result
+
+    def get_formatted_text(self, target: Optional[str] = None) -> str:
+        return self.formatted_text(self.current_assembly(target))
+
+    def show_pack_dialog(self):
+        """Open the token budget packer"""
+        try:
+            # Files are read first, the dialog packs them
+            self.prepare_assembly(None, lambda assembly: self.open_pack_dialog())
+        except Exception as e:
+            print(f"Error showing pack dialog: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to pack contexts: {e}")
+
+    def open_pack_dialog(self):
+        try:
+            dialog = PackDialog(self)
+            dialog.exec()
+            dialog.deleteLater()
+        except Exception as e:
+            print(f"Error showing pack dialog: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to pack contexts: {e}")
 
     def get_state(self) -> Dict:
         try:
             # Get splitter sizes for proportions
             splitter_sizes = self.splitter.sizes()
             
-            valid_contexts = []
-            for c in self.contexts:
-                if c.parent() is not None:
-                    valid_contexts.append(c.get_data())
-            
             return {
                 "main_prompt": self.main_prompt.toPlainText(),
-                "contexts": valid_contexts,
+                "contexts": self.model.get_state(),
+                "template_variables": dict(self.variable_panel.values),
+                "dedupe_contexts": self.dedupe_contexts,
+                "redact_secrets": self.redact_secrets,
+                "redaction_literals": list(self.redaction_literals),
+                "elide_unchanged": self.elide_unchanged,
+                "stable_order": self.stable_order,
+                "pack_to_budget": self.pack_to_budget,
+                "token_budget": self.token_budget,
+                "memory_log_interval": self.memory_log_interval,
+                "clipboard_capture": self.clipboard_watcher.enabled,
+                "notebook_outputs": bool(extractors.options.get("notebook_outputs")),
                 "splitter_sizes": splitter_sizes,
                 "geometry": {
                     "x": self.x(),
@@ -820,6 +1541,10 @@ class PromptDeck(QMainWindow):
             return {
                 "main_prompt": "",
                 "contexts": [],
+                "template_variables": {},
+                "dedupe_contexts": False,
+                "pack_to_budget": False,
+                "token_budget": DEFAULT_TOKEN_BUDGET,
                 "splitter_sizes": [200, 300],
                 "geometry": {
                     "x": 100,
@@ -832,9 +1557,23 @@ class PromptDeck(QMainWindow):
     def load_state(self):
         state_file = Path(user_data_dir("PromptDeck")) / "state.json"
         if state_file.exists():
+            self.loading_state = True
             try:
                 with open(state_file) as f:
                     state = json.load(f)
+                self.dedupe_contexts = bool(state.get("dedupe_contexts", False))
+                self.redact_secrets = bool(state.get("redact_secrets", False))
+                self.elide_unchanged = bool(state.get("elide_unchanged", False))
+                self.stable_order = bool(state.get("stable_order", False))
+                self.redaction_literals = [s for s in state.get("redaction_literals", []) if isinstance(s, str) and s]
+                self.pack_to_budget = bool(state.get("pack_to_budget", False))
+                self.token_budget = int(state.get("token_budget", DEFAULT_TOKEN_BUDGET))
+                self.set_memory_log_interval(int(state.get("memory_log_interval", 0)))
+                self.clipboard_watcher.set_enabled(bool(state.get("clipboard_capture", False)))
+                extractors.set_option("notebook_outputs", bool(state.get("notebook_outputs", False)))
+                # Template variable values, before the prompt text triggers a scan
+                self.variable_panel.set_values(state.get("template_variables", {}))
+
                 # Main prompt
                 self.main_prompt.setText(state.get("main_prompt", ""))
                 self.update_main_prompt_char_count()
@@ -847,42 +1586,17 @@ class PromptDeck(QMainWindow):
                 for c in self.contexts:
                     c.setParent(None)
                 self.contexts.clear()
+                self.model.clear()
 
                 # Restore splitter sizes if available
                 splitter_sizes = state.get("splitter_sizes", [200, 300])
                 self.splitter.setSizes(splitter_sizes)
 
                 # Load from file
-                contexts_data = state.get("contexts", [])
-                if contexts_data:
-                    for context_data in contexts_data:
-                        # Check if it's a file context
-                        if context_data.get("is_file", False):
-                            # Create file context
-                            file_context = FileContextInput()
-                            file_context.id = id(file_context)
-                            file_context.delete_button.clicked.connect(self.on_delete_context)
-                            file_context.duplicateRequested.connect(self.duplicate_context)
-                            file_context.setStyleSheet(context_section_style)
-                            file_context.set_data(context_data)
-                            self.contexts.append(file_context)
-                            self.context_layout.addWidget(file_context)
-                        else:
-                            # Regular context
-                            context = ContextInput()
-                            context.id = id(context)
-                            context.delete_button.clicked.connect(self.on_delete_context)
-                            context.duplicateRequested.connect(self.duplicate_context)
-                            context.setStyleSheet(context_section_style)
-                            context.set_data(context_data)
-                            self.contexts.append(context)
-                            self.context_layout.addWidget(context)
-                else:
-                    # If no contexts in saved state, show placeholder
-                    if not hasattr(self, 'placeholder') or self.placeholder is None:
-                        from .file_placeholder import FilePlaceholder
-                        self.placeholder = FilePlaceholder()
-                        self.context_layout.addWidget(self.placeholder)
+                self.restore_contexts(state.get("contexts", []))
+                # Stored text of contexts removed last session; text still being stored is written this session
+                saved = [data.get("spill_path") for data in state.get("contexts", []) if isinstance(data, dict)]
+                spill.prune(saved + [record.spill_path for record in self.model])
 
                 # Geometry
                 geometry = state.get("geometry", {})
@@ -894,6 +1608,9 @@ class PromptDeck(QMainWindow):
                         geometry.get("height", 600)
                     )
                     
+                # Show the variable panel right away instead of after the debounce
+                self.refresh_template_variables()
+
                 # Update char count
                 QTimer.singleShot(500, self.update_total_char_count)
                 
@@ -901,8 +1618,27 @@ class PromptDeck(QMainWindow):
                 self.status_bar.showMessage("State loaded", 3000)
             except Exception as e:
                 print(f"Error loading state: {e}")
+                perf.error("load", e)
                 self.status_bar.showMessage(f"Error loading state: {e}", 3000)
                 QMessageBox.warning(self, "Warning", f"Failed to load previous state: {e}")
+            finally:
+                self.loading_state = False
+
+    def restore_contexts(self, contexts_data: List[Dict]):
+        """Create the widgets for saved contexts in one batch"""
+        with self.bulk_update():
+            for context_data in contexts_data:
+                # Check if it's a git or file context
+                if context_data.get("is_git", False):
+                    context = GitContextInput()
+                elif context_data.get("is_file", False):
+                    context = FileContextInput()
+                else:
+                    context = ContextInput()
+                self.setup_context(context)
+                context.set_data(context_data)
+                context.record.set_history(context_data.get("history"))
+                self.insert_context(context)
 
     def save_state(self):
         self.status_bar.showMessage("Saving state...")
@@ -913,27 +1649,29 @@ class PromptDeck(QMainWindow):
         temp_file = state_dir / "state.json.tmp"
 
         try:
-            # Write to temp file first
-            with open(temp_file, "w") as f:
-                json.dump(self.get_state(), f)
+            with perf.operation("save"):
+                # Write to temp file first
+                with open(temp_file, "w") as f:
+                    json.dump(self.get_state(), f)
             
-            # Rename temp file to actual file (atomic operation)
-            if sys.platform == 'win32':
-                # Windows needs special handling for replacing files
-                import os
-                if state_file.exists():
-                    os.replace(str(temp_file), str(state_file))
+                # Rename temp file to actual file (atomic operation)
+                if sys.platform == 'win32':
+                    # Windows needs special handling for replacing files
+                    import os
+                    if state_file.exists():
+                        os.replace(str(temp_file), str(state_file))
+                    else:
+                        temp_file.rename(state_file)
                 else:
-                    temp_file.rename(state_file)
-            else:
-                # Unix-like platforms
-                temp_file.replace(state_file)
+                    # Unix-like platforms
+                    temp_file.replace(state_file)
                 
             # Update status
             self.status_bar.showMessage("State saved", 3000)
             self.show_toast("Settings saved")
         except Exception as e:
             print(f"Error saving state: {e}")
+            perf.error("save", e)
             self.status_bar.showMessage(f"Error saving state: {e}", 3000)
             if temp_file.exists():
                 try:
@@ -941,6 +1679,288 @@ class PromptDeck(QMainWindow):
                 except:
                     pass
 
+    def set_notebook_outputs(self, enabled):
+        """Toggle including cell outputs when reading notebooks"""
+        extractors.set_option("notebook_outputs", bool(enabled))
+        self.status_bar.showMessage(
+            "Notebook outputs will be included" if enabled else "Notebook outputs will be left out", 3000)
+        self.schedule_assembly()
+
+    def set_dedupe_contexts(self, enabled):
+        """Toggle replacing duplicate contexts with a reference when copying"""
+        self.dedupe_contexts = bool(enabled)
+        self.status_bar.showMessage(
+            "Duplicate contexts will be skipped" if enabled else "Duplicate contexts will be pasted", 3000)
+        self.schedule_assembly()
+
+    def set_redact_secrets(self, enabled):
+        """Toggle masking secrets when copying"""
+        self.redact_secrets = bool(enabled)
+        self.status_bar.showMessage(
+            "Secrets will be masked" if enabled else "Secrets will be pasted as they are", 3000)
+        self.schedule_assembly()
+
+    def set_elide_unchanged(self, enabled):
+        """Toggle replacing contexts already sent to the same target with a marker"""
+        self.elide_unchanged = bool(enabled)
+        self.status_bar.showMessage(
+            "Contexts unchanged since the last send will be elided" if enabled
+            else "Every context will be sent in full", 3000)
+
+    def set_stable_order(self, enabled):
+        """Toggle ordering contexts from least to most recently changed, main prompt last"""
+        self.stable_order = bool(enabled)
+        self.status_bar.showMessage(
+            "Stable contexts first, main prompt last" if enabled else "Main prompt first, contexts in deck order",
+            3000)
+        self.schedule_assembly()
+
+    def export_payload(self):
+        """Save the deck as a messages JSON payload with cache breakpoints"""
+        try:
+            path, _ = QFileDialog.getSaveFileName(self, "Export API Payload",
+                                                  "prompt-deck-payload.json", "JSON (*.json)")
+            if not path:
+                return
+            # Files are read first, the payload is built from them
+            self.prepare_assembly(None, lambda assembly: self.write_payload(path))
+        except Exception as e:
+            print(f"Error exporting payload: {e}")
+            perf.error("export", e)
+            QMessageBox.critical(self, "Error", f"Failed to export API payload: {e}")
+
+    def write_payload(self, path: str):
+        try:
+            budget = self.token_budget if self.pack_to_budget else None
+            assembly = self.assemble(budget, stable=True)
+            payload = build_payload(assembly.main_text, assembly.blocks, self.changed_at())
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(dump_payload(payload))
+            self.status_bar.showMessage(f"Exported {len(assembly.blocks)} context(s) to {path}", 3000)
+        except Exception as e:
+            print(f"Error exporting payload: {e}")
+            perf.error("export", e)
+            QMessageBox.critical(self, "Error", f"Failed to export API payload: {e}")
+
+    def export_bundle(self):
+        """Save the deck and the files it uses as one .deck file"""
+        try:
+            path, _ = QFileDialog.getSaveFileName(self, "Export Deck Bundle",
+                                                  "prompt-deck" + bundle.EXTENSION,
+                                                  f"Deck bundles (*{bundle.EXTENSION})")
+            if not path:
+                return
+            if not path.endswith(bundle.EXTENSION):
+                path += bundle.EXTENSION
+            # Git contexts are resolved again first
+            self.refresh_git_contexts(lambda: self.write_bundle(path))
+        except Exception as e:
+            print(f"Error exporting bundle: {e}")
+            perf.error("export", e)
+            QMessageBox.critical(self, "Error", f"Failed to export deck bundle: {e}")
+
+    def write_bundle(self, path: str):
+        try:
+            state = self.get_state()
+            state["settings"] = {key: state[key] for key in bundle.SETTINGS if key in state}
+            # Git contexts travel as their current text, the repo may not exist where it's opened
+            snapshots = {index: record.cached_text for index, record in enumerate(self.model)
+                         if record.kind == context_model.GIT and record.cached_text is not None}
+            with perf.operation("export"):
+                n_files, missing = bundle.write_bundle(path, state, snapshots)
+            self.status_bar.showMessage(
+                f"Exported {len(state['contexts'])} context(s) and {n_files} file(s) to {path}", 5000)
+            if missing:
+                QMessageBox.warning(self, "Missing Files",
+                                    "These files no longer exist and weren't included:\n" + "\n".join(missing))
+        except Exception as e:
+            print(f"Error exporting bundle: {e}")
+            perf.error("export", e)
+            QMessageBox.critical(self, "Error", f"Failed to export deck bundle: {e}")
+
+    def import_bundle(self):
+        """Pick a .deck file and open it"""
+        path, _ = QFileDialog.getOpenFileName(self, "Open Deck Bundle", "",
+                                              f"Deck bundles (*{bundle.EXTENSION})")
+        if path:
+            self.open_bundle(path)
+
+    def open_bundle(self, path: str):
+        """
+        Replace the deck with the one in the bundle at `path`. The manifest
+        and text contexts are read right away; file snapshots are extracted
+        in the background, each context filling in when its file is ready.
+        """
+        if self.contexts or self.main_prompt.toPlainText().strip():
+            answer = QMessageBox.question(self, "Open Deck Bundle",
+                                          "Replace the current prompt and contexts with the bundle?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+        cache_root = str(Path(user_data_dir("PromptDeck")) / "bundles")
+        try:
+            deck_bundle = bundle.Bundle(path, cache_root)
+        except (OSError, bundle.BundleError) as e:
+            QMessageBox.warning(self, "Open Deck Bundle", str(e))
+            return
+        if self.bundle is not None:
+            self.bundle.close()
+        self.bundle = deck_bundle
+        bundle.prune_cache(cache_root)
+
+        self.loading_state = True
+        try:
+            with perf.operation("load"):
+                manifest = deck_bundle.manifest
+                settings = manifest.get("settings", {})
+                self.dedupe_contexts = bool(settings.get("dedupe_contexts", self.dedupe_contexts))
+                self.pack_to_budget = bool(settings.get("pack_to_budget", self.pack_to_budget))
+                self.token_budget = int(settings.get("token_budget", self.token_budget))
+                self.stable_order = bool(settings.get("stable_order", self.stable_order))
+                self.variable_panel.set_values(manifest.get("template_variables", {}))
+                self.main_prompt.setText(manifest.get("main_prompt", ""))
+                self.update_main_prompt_char_count()
+                with self.bulk_update():
+                    self.remove_contexts(self.contexts)
+                    for data in deck_bundle.contexts:
+                        self.insert_context(self.bundle_context(deck_bundle, data))
+                self.send_history.clear()
+                self.refresh_template_variables()
+            self.status_bar.showMessage(f"Opened {len(self.contexts)} context(s) from {path}", 3000)
+        except Exception as e:
+            print(f"Error opening bundle: {e}")
+            perf.error("load", e)
+            QMessageBox.critical(self, "Error", f"Failed to open deck bundle: {e}")
+        finally:
+            self.loading_state = False
+        self.schedule_assembly()
+
+    def bundle_context(self, deck_bundle: "bundle.Bundle", data: Dict):
+        """The context widget for one manifest entry"""
+        data = dict(data)
+        if data.get("is_file") and data.get("bundle_file"):
+            context = FileContextInput()
+            self.setup_context(context)
+            context.set_bundle_data(data, deck_bundle)
+        elif data.get("is_file"):
+            # Not in the bundle (it was missing on export), try where it was
+            context = FileContextInput()
+            self.setup_context(context)
+            context.set_data(dict(data, file_path=data.get("original_path", "")))
+        elif data.get("is_git") and os.path.isdir(data.get("repo") or ""):
+            context = GitContextInput()
+            self.setup_context(context)
+            context.set_data(data)
+        else:
+            # Typed text, or the snapshot of a git context whose repo isn't here
+            if data.get("content_file"):
+                try:
+                    data["content"] = deck_bundle.read_text(data["content_file"])
+                except (KeyError, bundle.BundleError) as e:
+                    data["content"] = f"[Could not read the context from the bundle: {e}]"
+            context = ContextInput()
+            self.setup_context(context)
+            context.set_data(data)
+        context.record.set_history(data.get("history"))
+        return context
+
+    def start_new_conversation(self):
+        """Forget what was sent, so the next copy sends every context in full"""
+        self.send_history.clear()
+        self.status_bar.showMessage("New conversation: the next copy sends every context in full", 3000)
+
+    def edit_redaction_literals(self):
+        """Edit the strings that are always masked, one per line"""
+        try:
+            text, ok = QInputDialog.getMultiLineText(
+                self, "Redaction Strings",
+                "Strings to mask wherever they appear, one per line:",
+                "\n".join(self.redaction_literals))
+            if ok:
+                self.redaction_literals = [line for line in text.splitlines() if line.strip()]
+                self.schedule_assembly()
+                self.status_bar.showMessage(f"Masking {len(self.redaction_literals)} custom string(s)", 3000)
+        except Exception as e:
+            print(f"Error editing redaction strings: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to edit redaction strings: {e}")
+
+    def toggle_perf_hud(self):
+        """Show or hide the performance HUD"""
+        try:
+            if self.perf_hud is None:
+                self.perf_hud = PerfHud(self)
+            if self.perf_hud.isVisible():
+                self.perf_hud.hide()
+            else:
+                self.perf_hud.show()
+                self.perf_hud.raise_()
+        except Exception as e:
+            print(f"Error showing performance HUD: {e}")
+
+    def show_memory_report(self):
+        """Show where the deck's memory goes"""
+        try:
+            if self.memory_dialog is None:
+                self.memory_dialog = MemoryDialog(self)
+            self.memory_dialog.show()
+            self.memory_dialog.raise_()
+            self.memory_dialog.refresh()
+        except Exception as e:
+            print(f"Error showing memory report: {e}")
+
+    def set_memory_log_interval(self, minutes: int):
+        """Log a memory snapshot every `minutes` minutes, 0 turns it off"""
+        self.memory_log_interval = max(0, minutes)
+        if self.memory_log_interval:
+            self.memory_log_timer.start(self.memory_log_interval * 60 * 1000)
+        else:
+            self.memory_log_timer.stop()
+
+    def log_memory_snapshot(self):
+        try:
+            state_dir = Path(user_data_dir("PromptDeck"))
+            state_dir.mkdir(parents=True, exist_ok=True)
+            # Skips the transient copies, those would build the prompt every time
+            append_log(build_report(self, measure_transients=False), str(state_dir / "memory.log"))
+        except Exception as e:
+            print(f"Error logging memory snapshot: {e}")
+
+    def set_clipboard_capture(self, enabled):
+        """Toggle keeping a history of texts copied in other apps"""
+        self.clipboard_watcher.set_enabled(enabled)
+        if self.clipboard_dialog is not None and self.clipboard_dialog.capture_box.isChecked() != bool(enabled):
+            self.clipboard_dialog.capture_box.setChecked(bool(enabled))
+        self.status_bar.showMessage(
+            "Capturing clipboard history" if enabled else "Clipboard capture off", 3000)
+
+    def show_clipboard_history(self):
+        """Show recent clipboard texts"""
+        try:
+            if self.clipboard_dialog is None:
+                self.clipboard_dialog = ClipboardDialog(self)
+            self.clipboard_dialog.refresh()
+            self.clipboard_dialog.show()
+            self.clipboard_dialog.raise_()
+        except Exception as e:
+            print(f"Error showing clipboard history: {e}")
+
+    def add_clipboard_context(self, entry=None):
+        """Add a clipboard history entry as a context, by default what's on the clipboard now"""
+        try:
+            if entry is None:
+                entry = self.clipboard_ring.add(QApplication.clipboard().text())
+                if entry is None:
+                    self.show_toast("No text on the clipboard")
+                    return None
+            context = self.add_context()
+            context.name_input.setText(f"Clipboard {time.strftime('%H:%M', time.localtime(entry.taken))}")
+            context.set_text(entry.text)
+            self.show_toast(f"Added clipboard text ({len(entry.text)} chars)")
+            return context
+        except Exception as e:
+            print(f"Error adding clipboard context: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to add clipboard text: {e}")
+            return None
+
     def show_toast(self, message, duration=2000):
         """Show a toast notification with message"""
         toast = ToastNotification(self, message, duration)
@@ -1032,11 +2052,8 @@ class PromptDeck(QMainWindow):
                 else:
                     self.context_container.setStyleSheet("background-color: rgba(232, 245, 233, 0.8); border: 2px solid #4CAF50; border-radius: 5px;")
                 
-                # Process all valid local files in the drop event
-                for url in urls:
-                    if url.isLocalFile():
-                        filepath = url.toLocalFile()
-                        self.handle_file_drop(filepath)
+                # Process all valid local files in the drop event as one batch
+                self.handle_file_drops([url.toLocalFile() for url in urls if url.isLocalFile()])
                 
                 # Reset after a short delay using managed timer
                 if hasattr(self, 'style_reset_timer') and self.style_reset_timer is not None and self.style_reset_timer.isActive():
@@ -1057,13 +2074,27 @@ class PromptDeck(QMainWindow):
             self.is_drag_active = False
             event.ignore()
     
+    def changeEvent(self, event):
+        # Coming back to the window: repos may have changed meanwhile, resolve them again ahead of a copy
+        if event.type() == QEvent.Type.ActivationChange and self.isActiveWindow():
+            self.schedule_assembly()
+        super().changeEvent(event)
+
     def closeEvent(self, event):
         try:
-            # Cancel any running threads
+            # Text still being written to disk isn't in the editor any more; let it finish so it's saved
+            while any(getattr(context, 'spilling', False) for context in self.contexts):
+                QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents, 50)
+            # Cancel background loads; workers finish their current chunk and exit
+            if self.ahead_token is not None:
+                self.ahead_token.cancel()
             for context in self.contexts:
-                if hasattr(context, 'file_thread') and hasattr(context.file_thread, 'isRunning') and context.file_thread.isRunning():
-                    context.file_thread.terminate()
-                    context.file_thread.wait()
+                if hasattr(context, 'cancel_load'):
+                    context.cancel_load()
+            loader_pool.shutdown()
+            extractors.shutdown_process_pool()
+            if self.bundle is not None:
+                self.bundle.close()
             
             # Save state before closing
             self.save_state()
@@ -1085,6 +2116,10 @@ class PromptDeck(QMainWindow):
             add_file_action = QAction("Add File Context", self)
             add_file_action.triggered.connect(self.add_file_context)
             menu.addAction(add_file_action)
+
+            add_git_action = QAction("Add Git Diff Context", self)
+            add_git_action.triggered.connect(self.add_git_context)
+            menu.addAction(add_git_action)
             
             menu.addSeparator()
             
@@ -1095,6 +2130,87 @@ class PromptDeck(QMainWindow):
             preview_action = QAction("Preview Formatted Text", self)
             preview_action.triggered.connect(self.preview_formatted_text)
             menu.addAction(preview_action)
+
+            pack_action = QAction("Pack to Token Budget...", self)
+            pack_action.triggered.connect(self.show_pack_dialog)
+            menu.addAction(pack_action)
+
+            dedupe_action = QAction("Skip Duplicate Contexts", self)
+            dedupe_action.setCheckable(True)
+            dedupe_action.setChecked(self.dedupe_contexts)
+            dedupe_action.toggled.connect(self.set_dedupe_contexts)
+            menu.addAction(dedupe_action)
+
+            redact_action = QAction("Redact Secrets", self)
+            redact_action.setCheckable(True)
+            redact_action.setChecked(self.redact_secrets)
+            redact_action.toggled.connect(self.set_redact_secrets)
+            menu.addAction(redact_action)
+
+            literals_action = QAction("Redaction Strings...", self)
+            literals_action.triggered.connect(self.edit_redaction_literals)
+            menu.addAction(literals_action)
+
+            elide_action = QAction("Elide Unchanged Contexts", self)
+            elide_action.setCheckable(True)
+            elide_action.setChecked(self.elide_unchanged)
+            elide_action.toggled.connect(self.set_elide_unchanged)
+            menu.addAction(elide_action)
+
+            stable_action = QAction("Stable Contexts First", self)
+            stable_action.setCheckable(True)
+            stable_action.setChecked(self.stable_order)
+            stable_action.toggled.connect(self.set_stable_order)
+            menu.addAction(stable_action)
+
+            payload_action = QAction("Export API Payload...", self)
+            payload_action.triggered.connect(self.export_payload)
+            menu.addAction(payload_action)
+
+            export_bundle_action = QAction("Export Deck Bundle...", self)
+            export_bundle_action.triggered.connect(self.export_bundle)
+            menu.addAction(export_bundle_action)
+
+            open_bundle_action = QAction("Open Deck Bundle...", self)
+            open_bundle_action.triggered.connect(self.import_bundle)
+            menu.addAction(open_bundle_action)
+
+            conversation_action = QAction("Start New Conversation", self)
+            conversation_action.setEnabled(bool(self.send_history.targets))
+            conversation_action.triggered.connect(self.start_new_conversation)
+            menu.addAction(conversation_action)
+
+            outputs_action = QAction("Include Notebook Outputs", self)
+            outputs_action.setCheckable(True)
+            outputs_action.setChecked(bool(extractors.options.get("notebook_outputs")))
+            outputs_action.toggled.connect(self.set_notebook_outputs)
+            menu.addAction(outputs_action)
+            
+            perf_action = QAction("Performance HUD", self)
+            perf_action.setCheckable(True)
+            perf_action.setChecked(self.perf_hud is not None and self.perf_hud.isVisible())
+            perf_action.triggered.connect(self.toggle_perf_hud)
+            menu.addAction(perf_action)
+
+            memory_action = QAction("Memory Report...", self)
+            memory_action.triggered.connect(self.show_memory_report)
+            menu.addAction(memory_action)
+
+            menu.addSeparator()
+
+            clipboard_action = QAction("Add Clipboard as Context", self)
+            clipboard_action.triggered.connect(lambda: self.add_clipboard_context())
+            menu.addAction(clipboard_action)
+
+            capture_action = QAction("Capture Clipboard", self)
+            capture_action.setCheckable(True)
+            capture_action.setChecked(self.clipboard_watcher.enabled)
+            capture_action.toggled.connect(self.set_clipboard_capture)
+            menu.addAction(capture_action)
+
+            history_action = QAction("Clipboard History...", self)
+            history_action.triggered.connect(self.show_clipboard_history)
+            menu.addAction(history_action)
             
             menu.addSeparator()
             
@@ -0,0 +1,163 @@
+"""
+Masking secrets before the prompt leaves the deck (off unless the user
+turns on "Redact Secrets").
+
+Every context (and the main prompt) is scanned for API keys, tokens,
+private keys, passwords in URLs and `password = ...` style assignments, plus
+any literal strings the user added. All of them are compiled into one regex,
+so each text is scanned once no matter how many patterns there are; only
+the (rare) matches are checked against the patterns one by one:
+
+    text, found = redact(text, literals)     # found: {"github_token": 2, ...}
+
+Only the secret itself is replaced (`password = "[REDACTED:password]"`), so
+the prompt still reads naturally. Results are cached by content hash, so
+copying an unchanged deck again doesn't rescan it.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from .file_cache import content_hash
+from .perf import perf
+
+CACHE_SIZE = 256
+# Longer texts (stored text contexts, see spill.py) are masked again each time instead of held
+MAX_CACHED_CHARS = 4 * 1024 * 1024
+
+# Pattern name -> (label, regex). A `value` group marks the part to mask;
+# without one the whole match is masked. Every regex starts with a literal
+# (word boundaries are lookbehinds after it), which lets the regex engine skip
+# ahead to candidate positions instead of trying each one.
+PATTERNS = OrderedDict([
+    ("private_key", ("private key",
+                     r"-----BEGIN (?:[A-Z0-9]+ )*PRIVATE KEY-----[\s\S]*?-----END (?:[A-Z0-9]+ )*PRIVATE KEY-----")),
+    ("aws_access_key", ("AWS access key", r"A[KS]IA(?<![A-Za-z0-9]A[KS]IA)[0-9A-Z]{16}\b")),
+    ("github_token", ("GitHub token",
+                      r"gh[pousr]_(?<![A-Za-z0-9]gh[pousr]_)[A-Za-z0-9]{36,255}|github_pat_[A-Za-z0-9_]{22,255}")),
+    ("slack_token", ("Slack token", r"xox[abposr]-(?<![A-Za-z0-9]xox[abposr]-)[A-Za-z0-9-]{10,}")),
+    ("api_key", ("API key", r"sk-(?<![\w-]sk-)(?:ant-|proj-)?[A-Za-z0-9_-]{20,}")),
+    ("stripe_key", ("Stripe key", r"[rs]k_live_[A-Za-z0-9]{16,}")),
+    ("google_api_key", ("Google API key", r"AIza(?<![A-Za-z0-9]AIza)[0-9A-Za-z_-]{35}")),
+    ("jwt", ("JWT", r"eyJ(?<![\w-]eyJ)[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{8,}")),
+    ("url_password", ("password in URL", r"://[^\s:/@]+:(?P<value>[^\s:/@]{3,})@")),
+    ("bearer_token", ("bearer token", r"[Bb]earer\s+(?P<value>[A-Za-z0-9._~+/-]{16,}=*)")),
+    # Any `: value` or `= value`; kept only when the key before it looks secret (SECRET_KEY)
+    ("password", ("password or secret", r"[:=]\s*[\"']?(?P<value>[^\s\"'`,;()\[\]{}<>]{8,})")),
+])
+
+LITERAL = "literal"
+
+# Keys whose values are masked: password, DB_PASSWORD, "apiKey", client_secret, ...
+SECRET_KEY = re.compile(r"(?i:passw(?:or)?d|pwd|secret|token|api_?key|access_?key|private_?key|credentials?)"
+                        r"[\w.-]*[\"']?\s*$")
+SECRET_KEY_WINDOW = 64
+
+# Assigned values that are references or placeholders rather than secrets
+REFERENCE_PATTERN = re.compile(r"^(?:[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)+|[A-Za-z_]+|[$%&*].*|x{4,}|\*{4,})$")
+
+# Values masked by the generic "password or secret" pattern must look random: three kinds of
+# characters (lower, upper, digits, symbols other than SEPARATORS), or LONG_VALUE characters with
+# a digit and MIN_ENTROPY bits per character (hex digests, generated tokens)
+SEPARATORS = "_-.:/"
+LONG_VALUE = 16
+MIN_ENTROPY = 3.5
+
+
+def looks_random(value: str) -> bool:
+    """Whether an assigned value looks like a secret rather than an ordinary setting"""
+    kinds = (any(c.islower() for c in value) + any(c.isupper() for c in value) +
+             any(c.isdigit() for c in value) +
+             any(not c.isalnum() and c not in SEPARATORS for c in value))
+    if kinds >= 3:
+        return True
+    if len(value) < LONG_VALUE or not any(c.isdigit() for c in value):
+        return False
+    counts = Counter(value)
+    entropy = -sum(n / len(value) * math.log2(n / len(value)) for n in counts.values())
+    return entropy >= MIN_ENTROPY
+
+
+class _Scanner:
+    """All patterns and literals compiled into one regex, plus each pattern on its own"""
+
+    def __init__(self, literals: Tuple[str, ...]):
+        self.literals = literals
+        self.patterns = [(name, re.compile(pattern)) for name, (_, pattern) in PATTERNS.items()]
+        # Without capturing groups, the engine can reject most branches by their first character
+        branches = [pattern.replace("(?P<value>", "(?:") for _, (_, pattern) in PATTERNS.items()]
+        if literals:
+            # Longest first, so a literal containing another one wins
+            branches.extend(re.escape(s) for s in sorted(literals, key=len, reverse=True))
+        self.combined = re.compile("|".join(f"(?:{branch})" for branch in branches))
+
+    def classify(self, match) -> Tuple[str, Optional["re.Match"]]:
+        """Which pattern a match of the combined regex came from, and its own match"""
+        # Alternatives are tried in order, so the first pattern matching here is the one
+        for name, pattern in self.patterns:
+            own = pattern.match(match.string, match.start())
+            if own is not None:
+                return name, own
+        return LITERAL, None
+
+
+_scanner: Optional[_Scanner] = None
+_cache: "OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[str, Dict[str, int]]]" = OrderedDict()
+
+
+def scanner(literals: Tuple[str, ...]) -> _Scanner:
+    """Compiled once per set of literals"""
+    global _scanner
+    if _scanner is None or _scanner.literals != literals:
+        _scanner = _Scanner(literals)
+    return _scanner
+
+
+def redact(text: str, literals: Iterable[str] = ()) -> Tuple[str, Dict[str, int]]:
+    """Mask the secrets in `text`; returns the masked text and the count per pattern name"""
+    literals = tuple(sorted({s for s in literals if s}))
+    if not text:
+        return text, {}
+    key = (content_hash(text), literals)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        perf.cache_hit("redaction")
+        return cached
+    perf.cache_miss("redaction")
+
+    scan = scanner(literals)
+    found = Counter()
+
+    def mask(match) -> str:
+        name, own = scan.classify(match)
+        if own is None or "value" not in own.re.groupindex:
+            found[name] += 1
+            return f"[REDACTED:{name}]"
+
+        whole = match.group(0)
+        start, end = own.start("value") - match.start(), own.end("value") - match.start()
+        value = whole[start:end]
+        if name == "password" and (
+                not SECRET_KEY.search(match.string, max(0, match.start() - SECRET_KEY_WINDOW), match.start())
+                or REFERENCE_PATTERN.match(value) or not looks_random(value)):
+            # An ordinary assignment; its value may still hold a token
+            return whole[:start] + scan.combined.sub(mask, value) + whole[end:]
+        found[name] += 1
+        return whole[:start] + f"[REDACTED:{name}]" + whole[end:]
+
+    result = (scan.combined.sub(mask, text), dict(found))
+    if len(text) <= MAX_CACHED_CHARS:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def describe(found: Dict[str, int]) -> str:
+    """'GitHub token (2), password in URL (1)'"""
+    labels = {name: label for name, (label, _) in PATTERNS.items()}
+    labels[LITERAL] = "custom string"
+    return ", ".join(f"{labels.get(name, name)} ({count})"
+                     for name, count in sorted(found.items(), key=lambda item: -item[1]))
@@ -0,0 +1,119 @@
+"""
+What each target was last sent, for eliding unchanged contexts.
+
+When iterating with a chat model the same deck is copied turn after turn.
+The history remembers, per target (the clipboard or a chat site) and per
+context, what was sent last time. With elision on, a context that hasn't
+changed since is replaced by a short marker, and one that changed a little
+is sent as a unified diff against the previous send:
+
+    blocks, report = history.elide("Claude", blocks)
+    ...
+    history.record("Claude", sent_blocks)
+
+The history lives in memory only; "Start New Conversation" clears it.
+"""
+import difflib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .context_block import ContextBlock
+from .file_cache import content_hash
+
+CLIPBOARD = "Clipboard"
+
+UNCHANGED_MARKER = "[Unchanged since the previous message]"
+DIFF_HEADER = "[Changed since the previous message, diff against what was sent then:]"
+
+# Texts above this are only remembered by hash, so they're resent in full when they change
+MAX_DIFF_CHARS = 256 * 1024
+# A diff is only sent when it's at most this fraction of the full text
+MAX_DIFF_RATIO = 0.5
+
+
+class _Sent:
+    """One context as it was sent"""
+
+    __slots__ = ("digest", "content")
+
+    def __init__(self, content: str):
+        self.digest = content_hash(content)
+        self.content: Optional[str] = content if len(content) <= MAX_DIFF_CHARS else None
+
+
+class SendHistory:
+    """Per target, what each context (by id) was last sent as"""
+
+    def __init__(self):
+        self.targets: Dict[str, Dict[int, _Sent]] = {}
+
+    def elide(self, target: str, blocks: List[ContextBlock]) -> Tuple[List[ContextBlock], List[str]]:
+        """
+        Replace blocks unchanged since the last send to `target` with a marker,
+        and changed ones with a diff when that's much shorter.
+        Returns the new block list and a description of each replacement.
+        """
+        sent = self.targets.get(target, {})
+        result = []
+        report = []
+        for block in blocks:
+            previous = sent.get(block.context_id)
+            if previous is None or not block.content:
+                result.append(block)
+                continue
+            # Blocks of unchanged contexts usually hold the very same string
+            if previous.content is block.content or previous.digest == content_hash(block.content):
+                result.append(self.replace(block, UNCHANGED_MARKER))
+                report.append(f"{block.name or 'context'} unchanged")
+                continue
+            diff = _diff(previous.content, block.content)
+            if diff is None:
+                result.append(block)
+            else:
+                result.append(self.replace(block, f"{DIFF_HEADER}\n```diff\n{diff}```"))
+                report.append(f"{block.name or 'context'} as a diff")
+        return result, report
+
+    @staticmethod
+    def replace(block: ContextBlock, content: str) -> ContextBlock:
+        # raw is left empty so dedupe and packing don't treat it as the context's text
+        return ContextBlock(block.name, content, raw="", priority=block.priority,
+                            shrink=block.shrink, context_id=block.context_id)
+
+    def record(self, target: str, blocks: Iterable[ContextBlock], skipped: Iterable[int] = ()):
+        """
+        Remember `blocks` (before elision) as sent to `target`. Contexts in
+        `skipped` weren't sent in full (cut to fit a budget), so they're
+        forgotten and sent whole next time.
+        """
+        sent = self.targets.setdefault(target, {})
+        for block in blocks:
+            if block.context_id is not None and block.content:
+                previous = sent.get(block.context_id)
+                if previous is None or previous.content is not block.content:
+                    sent[block.context_id] = _Sent(block.content)
+        for context_id in skipped:
+            sent.pop(context_id, None)
+
+    def clear(self, target: Optional[str] = None):
+        """Forget what was sent to `target`, or to every target"""
+        if target is None:
+            self.targets.clear()
+        else:
+            self.targets.pop(target, None)
+
+    def texts(self) -> List[str]:
+        """Every remembered text, for the memory report"""
+        return [entry.content for sent in self.targets.values() for entry in sent.values()
+                if entry.content is not None]
+
+
+def _diff(old: Optional[str], new: str) -> Optional[str]:
+    """A unified diff from `old` to `new`, or None if sending `new` whole is as good"""
+    if old is None or len(new) > MAX_DIFF_CHARS:
+        return None
+    lines = difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True),
+                                 "previous", "current", n=2)
+    diff = "".join(line if line.endswith("\n") else line + "\n" for line in lines)
+    if not diff or len(diff) > len(new) * MAX_DIFF_RATIO:
+        return None
+    return diff
@@ -0,0 +1,270 @@
+"""
+Snippets: a region of a file instead of the whole file.
+
+A snippet is one of
+    "120-180"               a line range (1-based, inclusive)
+    "Parser.parse"          a symbol, found by parsing Python files with `ast`
+                            (other languages fall back to a definition regex)
+    "/^def main/../^if /"   a region from a line matching the first regex up
+                            to and including the line matching the second one
+
+Snippets are resolved each time the file is read. Line ranges remember the
+text of their first line and move with it when code above is added or
+removed. Resolution is cached per file signature, so unchanged files are
+never re-parsed.
+"""
+import ast
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .file_cache import FileSignature, canonical_path
+from .perf import perf
+
+CACHE_SIZE = 256
+
+LINES_PATTERN = re.compile(r"^\s*(?:lines?\s*)?(\d+)\s*(?:[-:]\s*(\d+))?\s*$", re.IGNORECASE)
+REGEX_PATTERN = re.compile(r"^\s*/(.+?)/\s*(?:\.\.\s*/(.+)/)?\s*$")
+SYMBOL_PATTERN = re.compile(r"^\s*[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*\s*$")
+
+
+class SnippetError(ValueError):
+    """The snippet doesn't parse or can't be found in the file"""
+
+
+class SnippetSpec:
+    """What part of a file a context includes"""
+
+    __slots__ = ("kind", "start", "end", "anchor", "symbol", "start_regex", "end_regex")
+
+    def __init__(self, kind: str, start: int = 0, end: int = 0, anchor: str = "",
+                 symbol: str = "", start_regex: str = "", end_regex: str = ""):
+        self.kind = kind  # "lines", "symbol" or "regex"
+        self.start = start
+        self.end = end
+        self.anchor = anchor
+        self.symbol = symbol
+        self.start_regex = start_regex
+        self.end_regex = end_regex
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["SnippetSpec"]:
+        """Parse the user's snippet text; empty means the whole file"""
+        if not text or not text.strip():
+            return None
+        match = LINES_PATTERN.match(text)
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else start
+            if start < 1 or end < start:
+                raise SnippetError(f"Invalid line range: {text}")
+            return cls("lines", start=start, end=end)
+        match = REGEX_PATTERN.match(text)
+        if match:
+            for pattern in match.groups():
+                if pattern:
+                    try:
+                        re.compile(pattern)
+                    except re.error as e:
+                        raise SnippetError(f"Invalid regex /{pattern}/: {e}")
+            return cls("regex", start_regex=match.group(1), end_regex=match.group(2) or "")
+        if SYMBOL_PATTERN.match(text):
+            return cls("symbol", symbol=text.strip())
+        raise SnippetError(f"Not a line range, symbol or /regex/: {text}")
+
+    def describe(self) -> str:
+        """The text form accepted by parse()"""
+        if self.kind == "lines":
+            return f"{self.start}-{self.end}" if self.end != self.start else str(self.start)
+        if self.kind == "regex":
+            return f"/{self.start_regex}/" + (f"../{self.end_regex}/" if self.end_regex else "")
+        return self.symbol
+
+    @property
+    def key(self) -> Tuple:
+        return (self.kind, self.start, self.end, self.symbol, self.start_regex, self.end_regex)
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> Optional["SnippetSpec"]:
+        if not data or data.get("kind") not in ("lines", "symbol", "regex"):
+            return None
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+
+class Snippet:
+    """A resolved snippet: its text and where it was found (1-based lines)"""
+
+    __slots__ = ("text", "start", "end")
+
+    def __init__(self, text: str, start: int, end: int):
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def describe(self) -> str:
+        return f"lines {self.start}-{self.end}"
+
+
+#
+# Symbols
+#
+def _python_symbols(text: str) -> Dict[str, Tuple[int, int]]:
+    """Map qualified names (Class.method) to their line range, decorators included"""
+    symbols = {}
+    tree = ast.parse(text)
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = prefix + child.name
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                end = getattr(child, "end_lineno", None) or _block_end(text.split("\n"), child.lineno)
+                symbols.setdefault(name, (start, end))
+                visit(child, name + ".")
+            elif isinstance(child, (ast.Assign, ast.AnnAssign)) and not prefix:
+                targets = child.targets if isinstance(child, ast.Assign) else [child.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        end = getattr(child, "end_lineno", None) or child.lineno
+                        symbols.setdefault(target.id, (child.lineno, end))
+    visit(tree, "")
+    return symbols
+
+
+def _block_end(lines: List[str], start: int) -> int:
+    """Last line of an indented block (or brace block) starting at `start` (1-based)"""
+    first = lines[start - 1]
+    indent = len(first) - len(first.lstrip())
+    last = start
+    depth = first.count("{") - first.count("}")
+    for number in range(start + 1, len(lines) + 1):
+        line = lines[number - 1]
+        if not line.strip():
+            continue
+        if depth > 0:
+            depth += line.count("{") - line.count("}")
+            last = number
+            if depth <= 0:
+                break
+            continue
+        if len(line) - len(line.lstrip()) <= indent and not line.lstrip().startswith((")", "]")):
+            break
+        last = number
+    return last
+
+
+def _find_definition(lines: List[str], symbol: str) -> Optional[Tuple[int, int]]:
+    """Language-agnostic fallback: find `def/class/function/fn/func <name>`"""
+    name = re.escape(symbol.split(".")[-1])
+    pattern = re.compile(
+        rf"^\s*(?:[\w@<>\[\],]+\s+)*(?:def|class|function|fn|func|struct|interface|enum|trait|impl|type)"
+        rf"\s+(?:\([^)]*\)\s*)?{name}\b")
+    for number, line in enumerate(lines, 1):
+        if pattern.match(line):
+            return number, _block_end(lines, number)
+    return None
+
+
+#
+# Resolution
+#
+_symbol_cache: "OrderedDict[Tuple[str, FileSignature], Dict[str, Tuple[int, int]]]" = OrderedDict()
+_resolve_cache: "OrderedDict[Tuple[str, FileSignature, Tuple], Snippet]" = OrderedDict()
+# Snippets are also resolved on the loader pool, when the prompt is built ahead
+_cache_lock = threading.Lock()
+
+
+def _lookup(cache: OrderedDict, key):
+    with _cache_lock:
+        return cache.get(key)
+
+
+def _remember(cache: OrderedDict, key, value):
+    with _cache_lock:
+        cache[key] = value
+        if len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+    return value
+
+
+def _symbols_for(path: str, signature: FileSignature, text: str) -> Dict[str, Tuple[int, int]]:
+    key = (canonical_path(path), signature)
+    symbols = _lookup(_symbol_cache, key)
+    if symbols is None:
+        try:
+            symbols = _python_symbols(text)
+        except (SyntaxError, ValueError):
+            symbols = {}
+        _remember(_symbol_cache, key, symbols)
+    return symbols
+
+
+def _reanchor(spec: SnippetSpec, lines: List[str]) -> Tuple[int, int]:
+    """Move a line range to where its first line went, nearest match wins"""
+    start, end = spec.start, spec.end
+    if not spec.anchor:
+        return start, end
+    if 0 < start <= len(lines) and lines[start - 1].strip() == spec.anchor:
+        return start, end
+    matches = [n for n, line in enumerate(lines, 1) if line.strip() == spec.anchor]
+    if not matches:
+        return start, end
+    moved = min(matches, key=lambda n: abs(n - start))
+    return moved, moved + (end - start)
+
+
+def resolve_snippet(path: str, signature: FileSignature, text: str, spec: SnippetSpec,
+                    extracted: bool = False) -> Snippet:
+    """
+    Resolve `spec` against the current `text` of `path` (`extracted`: the
+    text is HTML page text, see FileCache.read). A line range spec is
+    updated in place when it had to be re-anchored.
+    Raises SnippetError if the region can't be found.
+    """
+    key = (canonical_path(path), signature, spec.key, extracted)
+    cached = _lookup(_resolve_cache, key)
+    if cached is not None:
+        perf.cache_hit("snippets")
+        return cached
+    perf.cache_miss("snippets")
+
+    lines = text.split("\n")
+
+    if spec.kind == "lines":
+        start, end = _reanchor(spec, lines)
+        if start > len(lines):
+            raise SnippetError(f"File has only {len(lines)} lines")
+        end = min(end, len(lines))
+        spec.start, spec.end = start, end
+        spec.anchor = lines[start - 1].strip()
+        # The key may have changed after re-anchoring
+        key = (canonical_path(path), signature, spec.key, extracted)
+
+    elif spec.kind == "symbol":
+        found = None
+        if path.lower().endswith((".py", ".pyw", ".pyi")):
+            found = _symbols_for(path, signature, text).get(spec.symbol)
+        if found is None:
+            found = _find_definition(lines, spec.symbol)
+        if found is None:
+            raise SnippetError(f"Symbol not found: {spec.symbol}")
+        start, end = found
+
+    else:
+        start_pattern = re.compile(spec.start_regex)
+        start = next((n for n, line in enumerate(lines, 1) if start_pattern.search(line)), None)
+        if start is None:
+            raise SnippetError(f"No line matches /{spec.start_regex}/")
+        if spec.end_regex:
+            end_pattern = re.compile(spec.end_regex)
+            end = next((n for n in range(start + 1, len(lines) + 1)
+                        if end_pattern.search(lines[n - 1])), len(lines))
+        else:
+            end = _block_end(lines, start)
+
+    snippet = Snippet("\n".join(lines[start - 1:end]), start, end)
+    return _remember(_resolve_cache, key, snippet)
@@ -0,0 +1,120 @@
+"""
+Disk-backed text for contexts too large to edit.
+
+Qt lays out an editor's whole document, so a text context holding hundreds
+of MB would freeze the window and keep the text in memory several times
+over. Text over SPILL_CHARS (a paste, a loaded file, restored content) is
+written to a spill file instead:
+
+    <data dir>/spill/<hash>.txt     the text as UTF-8, named by its content hash
+
+The context keeps only the path and the character count. It shows the file
+through a paged read-only view (FileCache.read_page), and the deck reads it
+only when the prompt is built. Spills up to KEEP_RENDERED_CHARS are built
+ahead like typed text; larger ones are read on the loader pool the first
+time the prompt is copied, and reused until the context changes. Files are named by content, so a duplicated
+context shares its spill, and prune() removes the ones no context uses
+(except the ones written this session, which may still be on their way
+into a context).
+"""
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from appdirs import user_data_dir
+
+from .file_cache import canonical_path
+
+# Text contexts over this many characters are stored on disk
+SPILL_CHARS = 100000
+# Larger spills aren't built ahead, a copy reads them
+KEEP_RENDERED_CHARS = 4 * 1024 * 1024
+# Text is written and read this many characters at a time, so a cancelled write stops early
+CHUNK_CHARS = 1024 * 1024
+SUFFIX = ".txt"
+# Files written since then are never pruned: their contexts may not have them yet
+SESSION_START = time.time()
+
+
+def spill_dir() -> Path:
+    return Path(user_data_dir("PromptDeck")) / "spill"
+
+
+def write_spill(parts: Iterable[str], token=None, directory: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Write the concatenated `parts` to a spill file and return (path,
+    characters), with universal newlines like text read from a file.
+    Raises LoadCancelled if the loader `token` is cancelled meanwhile;
+    nothing is left behind then.
+    """
+    folder = Path(directory) if directory else spill_dir()
+    folder.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha1()
+    chars = 0
+    fd, temp = tempfile.mkstemp(suffix=".part", dir=str(folder))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for part in parts:
+                start = 0
+                while start < len(part):
+                    if token is not None:
+                        token.check()
+                    end = start + CHUNK_CHARS
+                    if part[end - 1:end] == "\r":
+                        end += 1  # Keeps a \r\n in one chunk
+                    chunk = part[start:end].replace("\r\n", "\n").replace("\r", "\n")
+                    data = chunk.encode("utf-8", errors="replace")
+                    digest.update(data)
+                    f.write(data)
+                    chars += len(chunk)
+                    start = end
+        path = folder / (digest.hexdigest()[:20] + SUFFIX)
+        # Same text as an existing spill: the same file
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return str(path), chars
+
+
+def read_spill(path: str, token=None) -> str:
+    """
+    The whole text of a spill file. It's read each time rather than kept in
+    the file cache, which would hold on to a big one.
+    """
+    chunks = []
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        while True:
+            if token is not None:
+                token.check()
+            chunk = f.read(CHUNK_CHARS)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return "".join(chunks)
+
+
+def prune(in_use: Iterable[str], directory: Optional[str] = None) -> int:
+    """
+    Remove the spill files not in `in_use`; returns how many. Writes in
+    progress (.part files) and files written this session are kept.
+    """
+    folder = Path(directory) if directory else spill_dir()
+    if not folder.is_dir():
+        return 0
+    keep = {canonical_path(path) for path in in_use if path}
+    removed = 0
+    for path in folder.iterdir():
+        if path.suffix != SUFFIX or canonical_path(str(path)) in keep:
+            continue
+        try:
+            if not path.is_file() or path.stat().st_mtime >= SESSION_START:
+                continue
+            path.unlink()
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,71 @@
+"""
+Prefix-cache friendly ordering of the prompt.
+
+LLM providers cache prompt prefixes: a request starting with the same bytes
+as a recent one is cheaper and faster. The deck's usual order puts the main
+prompt, the part edited most, first, so every edit invalidates everything
+after it. In stable order contexts go first, sorted by when their text last
+changed (oldest first, deck order among equals), and the main prompt last.
+Unchanged inputs always give byte-identical output.
+
+The same order is used to export the deck as a message array for scripted
+API use, with cache breakpoints after the last context and at the biggest
+jumps in how recently contexts changed:
+
+    payload = build_payload(main_text, blocks, changed_at)
+"""
+import json
+from typing import Dict, List
+
+from .context_block import ContextBlock
+
+# Providers allow a few cache breakpoints per request
+MAX_BREAKPOINTS = 4
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _changed_at(block: ContextBlock, changed_at: Dict[int, float]) -> float:
+    # Contexts without a history count as just changed
+    return changed_at.get(block.context_id, float("inf"))
+
+
+def stable_order(blocks: List[ContextBlock], changed_at: Dict[int, float]) -> List[ContextBlock]:
+    """`blocks` from least to most recently changed; `changed_at` maps context ids to times"""
+    return sorted(blocks, key=lambda block: _changed_at(block, changed_at))
+
+
+def breakpoints(blocks: List[ContextBlock], changed_at: Dict[int, float]) -> List[int]:
+    """
+    Indices of the (stable ordered) blocks to put a cache breakpoint after:
+    the last one, and the ones followed by the biggest jumps in change time.
+    Only depends on the change times, so it's the same on every export
+    until a context changes.
+    """
+    if not blocks:
+        return []
+    times = [_changed_at(block, changed_at) for block in blocks]
+    gaps = [(times[i + 1] - times[i], i) for i in range(len(blocks) - 1) if times[i + 1] > times[i]]
+    # Biggest gaps first, earlier ones first among equals
+    gaps.sort(key=lambda gap: (-gap[0], gap[1]))
+    chosen = {i for _, i in gaps[:MAX_BREAKPOINTS - 1]}
+    chosen.add(len(blocks) - 1)
+    return sorted(chosen)
+
+
+def build_payload(main_text: str, blocks: List[ContextBlock], changed_at: Dict[int, float]) -> Dict:
+    """A messages payload: one user message, a text part per context, the main prompt last"""
+    cached = set(breakpoints(blocks, changed_at))
+    content = []
+    for index, block in enumerate(blocks):
+        part = {"type": "text", "text": f"{block.name}:\n{block.content}"}
+        if index in cached:
+            part["cache_control"] = dict(CACHE_CONTROL)
+        content.append(part)
+    if main_text:
+        content.append({"type": "text", "text": main_text})
+    return {"messages": [{"role": "user", "content": content}]}
+
+
+def dump_payload(payload: Dict) -> str:
+    return json.dumps(payload, indent=2, ensure_ascii=False) + "\n"
@@ -82,13 +82,13 @@ name_input_style = """
         """
 
 content_input_style = """
-            QTextEdit {
+            QPlainTextEdit {
                 border: 1px solid #e0e0e0;
                 border-radius: 4px;
                 padding: 6px;
                 background-color: white;
             }
-            QTextEdit:focus {
+            QPlainTextEdit:focus {
                 border: 1px solid #6c8baf;
                 background-color: white;
             }
@@ -101,6 +101,15 @@ copy_color = "#6c8baf"
 duplicate_color = "#3498db"
 clear_all_color = "#e67e22"
 
+# Syntax highlighting in code contexts
+syntax_colors = {
+    "keyword": "#2c5d8f",
+    "string": "#27ae60",
+    "comment": "#95a5a6",
+    "number": "#e67e22",
+    "tag": "#3498db",
+}
+
 # Drag handle style
 drag_handle_style = """
             QFrame {
@@ -0,0 +1,214 @@
+"""
+Prompt templates with typed variables.
+
+Placeholders use double braces, with an optional type and default value:
+
+    {{ticket}}
+    {{retries:int=3}}
+    {{verbose:bool=false}}
+    {{lang:choice(python|go|rust)=python}}
+
+A variable has one declaration for the whole deck (see collect_variables):
+a default given in the main prompt also fills a bare {{name}} in a context.
+A backslash keeps double braces as they are, for pasted Jinja, Handlebars or
+Go templates: \\{{name}} is sent as {{name}}.
+
+Templates are compiled once per source string and cached. A compiled template
+remembers the last value of each variable, so re-rendering after a change only
+re-formats the segments that use the changed variable.
+"""
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .perf import perf
+
+VARIABLE_PATTERN = re.compile(
+    r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)"   # name
+    r"(?:\s*:\s*([a-z]+)(?:\(([^)]*)\))?)?"  # optional type and choices
+    r"(?:\s*=\s*([^}]*?))?"               # optional default
+    r"\s*\}\}"
+)
+# "\{{" is sent as "{{" and never starts a placeholder
+ESCAPED_BRACES = "\\{{"
+TOKEN_PATTERN = re.compile(re.escape(ESCAPED_BRACES) + "|" + VARIABLE_PATTERN.pattern)
+
+VARIABLE_TYPES = ("str", "int", "float", "bool", "choice")
+
+# Number of compiled templates kept around (one per distinct source string)
+TEMPLATE_CACHE_SIZE = 256
+
+
+class TemplateVariable:
+    """A typed variable declared by a placeholder"""
+
+    __slots__ = ("name", "type", "default", "choices")
+
+    def __init__(self, name: str, var_type: str = "str", default: Optional[str] = None,
+                 choices: Tuple[str, ...] = ()):
+        self.name = name
+        self.type = var_type if var_type in VARIABLE_TYPES else "str"
+        self.default = default
+        self.choices = choices
+
+    @property
+    def key(self) -> Tuple:
+        """Everything that affects how the variable is formatted"""
+        return (self.name, self.type, self.default, self.choices)
+
+    def coerce(self, value: Any) -> Any:
+        """Convert a raw value (from the panel or state.json) to this variable's type"""
+        if value is None:
+            return None
+        try:
+            if self.type == "int":
+                return int(value)
+            if self.type == "float":
+                return float(value)
+            if self.type == "bool":
+                if isinstance(value, str):
+                    return value.strip().lower() in ("1", "true", "yes", "on")
+                return bool(value)
+            return str(value)
+        except (TypeError, ValueError):
+            return None
+
+    def format(self, value: Any) -> Optional[str]:
+        """Format a value for insertion into the prompt, None if unset"""
+        if value is None or value == "":
+            value = self.default
+        value = self.coerce(value)
+        if value is None:
+            return None
+        if self.type == "bool":
+            return "true" if value else "false"
+        return str(value)
+
+
+class CompiledTemplate:
+    """
+    A template split into literal text and variable segments.
+
+    `segments` alternates between literal strings and indices into
+    `placeholders`; rendered variable segments are cached per value.
+    """
+
+    __slots__ = ("source", "segments", "placeholders", "variables",
+                 "_last_values", "_rendered")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.segments: List[Any] = []
+        # (variable, original placeholder text) for each variable segment
+        self.placeholders: List[Tuple[TemplateVariable, str]] = []
+        self.variables: "OrderedDict[str, TemplateVariable]" = OrderedDict()
+
+        position = 0
+        for match in TOKEN_PATTERN.finditer(source):
+            if match.start() > position:
+                self.segments.append(source[position:match.start()])
+            position = match.end()
+            if match.group(0) == ESCAPED_BRACES:
+                self.segments.append("{{")
+                continue
+            name, var_type, choices, default = match.groups()
+            variable = self.variables.get(name)
+            if variable is None:
+                choice_tuple = tuple(c.strip() for c in choices.split("|")) if choices else ()
+                variable = TemplateVariable(name, var_type or "str",
+                                            default.strip() if default is not None else None,
+                                            choice_tuple)
+                self.variables[name] = variable
+            self.segments.append(len(self.placeholders))
+            self.placeholders.append((variable, match.group(0)))
+        if position < len(source):
+            self.segments.append(source[position:])
+
+        self._last_values: Dict[str, Any] = {}
+        self._rendered: List[str] = [text for _, text in self.placeholders]
+
+    def render(self, values: Dict[str, Any], declared: Optional[Dict[str, TemplateVariable]] = None) -> str:
+        """
+        Render the template, re-formatting only variables whose value (or
+        declaration) changed. Variables are formatted by their `declared`
+        declaration (the deck's, from collect_variables) if given.
+        """
+        if not self.placeholders:
+            return "".join(self.segments)
+
+        changed = set()
+        for name, variable in self.variables.items():
+            if declared is not None:
+                variable = declared.get(name, variable)
+            value = (values.get(name), variable)
+            last = self._last_values.get(name)
+            if last is None or last[0] != value[0] or last[1].key != variable.key:
+                self._last_values[name] = value
+                changed.add(name)
+
+        if changed:
+            for index, (variable, original) in enumerate(self.placeholders):
+                if variable.name in changed:
+                    value, declaration = self._last_values[variable.name]
+                    formatted = declaration.format(value)
+                    # Leave unresolved placeholders visible so they get noticed
+                    self._rendered[index] = original if formatted is None else formatted
+
+        return "".join(segment if isinstance(segment, str) else self._rendered[segment]
+                       for segment in self.segments)
+
+
+_template_cache: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+
+
+def compile_template(source: str) -> CompiledTemplate:
+    """Return the compiled template for `source`, compiling it on first use"""
+    template = _template_cache.get(source)
+    if template is not None:
+        _template_cache.move_to_end(source)
+        perf.cache_hit("templates")
+        return template
+    perf.cache_miss("templates")
+
+    template = CompiledTemplate(source)
+    _template_cache[source] = template
+    if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+        _template_cache.popitem(last=False)
+    return template
+
+
+def render_template(source: str, values: Dict[str, Any],
+                    declared: Optional[Dict[str, TemplateVariable]] = None) -> str:
+    """
+    Render `source` with `values`, formatting variables by the deck's
+    `declared` ones if given; text without placeholders is returned as-is
+    """
+    if "{{" not in source:
+        return source
+    return compile_template(source).render(values, declared)
+
+
+def collect_variables(sources: List[str]) -> "OrderedDict[str, TemplateVariable]":
+    """
+    Collect variable declarations from several templates, one per name: the
+    first placeholder wins, except that a bare {{name}} takes the type and
+    default of the first placeholder that gives them
+    """
+    variables: "OrderedDict[str, TemplateVariable]" = OrderedDict()
+    for source in sources:
+        if not source or "{{" not in source:
+            continue
+        for name, variable in compile_template(source).variables.items():
+            first = variables.get(name)
+            if first is None:
+                variables[name] = variable
+            elif first.default is None and variable.default is not None:
+                bare = first.type == "str" and not first.choices
+                variables[name] = TemplateVariable(name, variable.type if bare else first.type, variable.default,
+                                                   variable.choices if bare else first.choices)
+    return variables
+
+
+def declarations_key(variables: Dict[str, TemplateVariable]) -> Tuple:
+    """A key of the deck's declarations, for caches of rendered text"""
+    return tuple(variable.key for variable in variables.values())
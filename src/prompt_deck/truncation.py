@@ -0,0 +1,316 @@
+"""
+Size limits for file contexts.
+
+A truncation keeps part of a text that's over a character (or token) budget:
+
+    "head 20000"          the first 20000 characters
+    "tail 8k tokens"      the last ~8000 tokens, for logs
+    "head+tail 20000"     the start and the end, half the budget each
+    "sample 20000"        runs of lines spread evenly over the text, for data files
+
+Cuts fall on line boundaries (a single line longer than the budget is cut
+inside it) and the result, markers for the cuts included, fits the budget.
+
+Files are truncated while they're read, reading only the bytes that are kept:
+the start for head, a seek from the end for tail and short windows spread
+over the file for sample, so a 200 MB log costs no more than its last few KB.
+Files without a truncation of their own get DEFAULT_TRUNCATION once they're
+over MAX_FILE_SIZE.
+"""
+import re
+from typing import Dict, Optional, Tuple
+
+MODES = {
+    "head": "Start",
+    "tail": "End",
+    "head+tail": "Start and end",
+    "sample": "Sampled lines",
+}
+
+# Files above this size are truncated even without a truncation of their own
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB limit
+DEFAULT_BUDGET = 1024 * 1024  # First MB
+
+MIN_BUDGET = 256  # Characters
+# Room kept for one cut marker
+MARKER_RESERVE = 48
+
+# sample: one window per SAMPLE_WINDOW_CHARS of budget, within these bounds
+SAMPLE_WINDOW_CHARS = 2000
+SAMPLE_MIN_WINDOWS = 2
+SAMPLE_MAX_WINDOWS = 200
+SAMPLE_GAP = "[...]\n"
+
+# Files are read in chunks so a cancelled load stops early
+READ_CHUNK_SIZE = 1024 * 1024
+# UTF-8 encodes a character in at most this many bytes
+MAX_CHAR_BYTES = 4
+
+SPEC_PATTERN = re.compile(
+    r"^\s*(head\s*\+\s*tail|head|tail|sample)\s+(\d+(?:\.\d+)?)\s*(k|m)?\s*"
+    r"(tokens?|chars?|characters?)?\s*$", re.IGNORECASE)
+
+
+class TruncationError(ValueError):
+    """The truncation doesn't parse"""
+
+
+class Truncation:
+    """Which part of an over-budget text to keep"""
+
+    __slots__ = ("mode", "budget", "unit")
+
+    def __init__(self, mode: str, budget: int, unit: str = "chars"):
+        self.mode = mode  # One of MODES
+        self.budget = budget
+        self.unit = unit  # "chars" or "tokens"
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["Truncation"]:
+        """Parse the user's truncation text; empty means the default limit"""
+        if not text or not text.strip():
+            return None
+        match = SPEC_PATTERN.match(text)
+        if not match:
+            raise TruncationError(f"Not a truncation like 'tail 20000' or 'head 8k tokens': {text}")
+        mode = re.sub(r"\s+", "", match.group(1).lower())
+        budget = float(match.group(2)) * {"k": 1000, "m": 1000000}.get((match.group(3) or "").lower(), 1)
+        unit = "tokens" if (match.group(4) or "").lower().startswith("token") else "chars"
+        spec = cls(mode, int(budget), unit)
+        if spec.max_chars < MIN_BUDGET:
+            raise TruncationError(f"Budget too small, keep at least {MIN_BUDGET} characters: {text}")
+        return spec
+
+    def describe(self) -> str:
+        """The text form accepted by parse()"""
+        budget = f"{self.budget // 1000}k" if self.budget >= 1000 and self.budget % 1000 == 0 else str(self.budget)
+        return f"{self.mode} {budget}" + (" tokens" if self.unit == "tokens" else "")
+
+    @property
+    def max_chars(self) -> int:
+        # Imported here: packer depends on file_cache, which depends on this module
+        from .packer import CHARS_PER_TOKEN
+        return self.budget * CHARS_PER_TOKEN if self.unit == "tokens" else self.budget
+
+    @property
+    def key(self) -> Tuple:
+        return (self.mode, self.max_chars)
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> Optional["Truncation"]:
+        if not data or data.get("mode") not in MODES:
+            return None
+        try:
+            return cls(data["mode"], int(data["budget"]), data.get("unit", "chars"))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+DEFAULT_TRUNCATION = Truncation("head", DEFAULT_BUDGET)
+
+
+#
+# Sources: where the kept parts are read from
+#
+class _TextSource:
+    """A text in memory; positions are characters"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.size = len(text)
+
+    def forward(self, start: int, chars: int) -> Tuple[str, int]:
+        """At least `chars` + 1 characters from `start` (fewer at the end), and where they end"""
+        end = min(self.size, start + chars + 1)
+        return self.text[start:end], end
+
+    def backward(self, chars: int) -> Tuple[str, int]:
+        """At least `chars` + 1 characters up to the end (fewer at the start), and where they start"""
+        start = max(0, self.size - chars - 1)
+        return self.text[start:], start
+
+    def amount(self, size: int) -> str:
+        return f"{size:,} characters"
+
+
+class _FileSource:
+    """An open binary file of UTF-8 text; positions are bytes"""
+
+    def __init__(self, f, size: int, token=None):
+        self.f = f
+        self.size = size
+        self.token = token
+
+    def read(self, start: int, nbytes: int) -> bytes:
+        self.f.seek(start)
+        chunks = []
+        while nbytes > 0:
+            if self.token is not None:
+                self.token.check()
+            chunk = self.f.read(min(READ_CHUNK_SIZE, nbytes))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            nbytes -= len(chunk)
+        return b"".join(chunks)
+
+    def forward(self, start: int, chars: int) -> Tuple[str, int]:
+        data = b""
+        end = start
+        while True:
+            # Every character is at least one byte, so this never reads past what's needed
+            more = self.read(end, chars + 1 - len(_decode(data, start == 0, False)))
+            data += more
+            end += len(more)
+            at_end = not more or end >= self.size
+            text = _decode(data, start == 0, at_end)
+            if at_end or len(text) > chars:
+                return text, end
+
+    def backward(self, chars: int) -> Tuple[str, int]:
+        data = b""
+        start = self.size
+        while start > 0:
+            text = _decode(data, False, True)
+            if len(text) > chars:
+                break
+            nbytes = min(start, chars + 1 - len(text))
+            start -= nbytes
+            data = self.read(start, nbytes) + data
+        return _decode(data, start == 0, True), start
+
+    def amount(self, size: int) -> str:
+        if size >= 1024 * 1024:
+            return f"{size / (1024 * 1024):.1f} MB"
+        if size >= 1024:
+            return f"{size / 1024:.1f} KB"
+        return f"{size} bytes"
+
+
+def _decode(data: bytes, at_start: bool, at_end: bool) -> str:
+    """Decode a slice of a UTF-8 file, dropping characters cut by the slice"""
+    if not at_start:
+        # Skip continuation bytes of a character that started before the slice
+        skip = 0
+        while skip < min(len(data), MAX_CHAR_BYTES - 1) and data[skip] & 0xC0 == 0x80:
+            skip += 1
+        data = data[skip:]
+    if not at_end:
+        # Drop a character whose last bytes are after the slice
+        for back in range(1, min(len(data), MAX_CHAR_BYTES) + 1):
+            byte = data[-back]
+            if byte & 0xC0 != 0x80:
+                length = 4 if byte >= 0xF0 else 3 if byte >= 0xE0 else 2 if byte >= 0xC0 else 1
+                if length > back:
+                    data = data[:-back]
+                break
+    # Universal newlines, like reading in text mode
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _source_size(text: str, source) -> int:
+    """Size of `text` in the source's positions"""
+    return len(text.encode("utf-8")) if isinstance(source, _FileSource) else len(text)
+
+
+#
+# Cuts
+#
+def _cut_head(text: str, chars: int, more: bool) -> str:
+    """Whole lines from the start of `text` within `chars`"""
+    if not more and len(text) <= chars:
+        return text
+    kept = text[:chars]
+    newline = kept.rfind("\n")
+    return kept[:newline + 1] if newline > 0 else kept
+
+
+def _cut_tail(text: str, chars: int, more: bool) -> str:
+    """Whole lines from the end of `text` within `chars`"""
+    if not more and len(text) <= chars:
+        return text
+    kept = text[-chars:]
+    if len(text) > chars and text[-chars - 1] == "\n":
+        return kept
+    newline = kept.find("\n")
+    return kept[newline + 1:] if 0 <= newline < len(kept) - 1 else kept
+
+
+def _marker(source, omitted: int) -> str:
+    return f"[... {source.amount(max(0, omitted))} omitted ...]"
+
+
+def _head(source, chars: int) -> str:
+    text, end = source.forward(0, chars)
+    kept = _cut_head(text, chars, end < source.size)
+    return kept.rstrip("\n") + "\n" + _marker(source, source.size - _source_size(kept, source))
+
+
+def _tail(source, chars: int) -> str:
+    text, start = source.backward(chars)
+    kept = _cut_tail(text, chars, start > 0)
+    return _marker(source, source.size - _source_size(kept, source)) + "\n" + kept
+
+
+def _head_tail(source, chars: int) -> str:
+    head_text, end = source.forward(0, chars // 2)
+    head = _cut_head(head_text, chars // 2, True)
+    tail_text, start = source.backward(chars - chars // 2)
+    tail = _cut_tail(tail_text, chars - chars // 2, True)
+    omitted = source.size - _source_size(head, source) - _source_size(tail, source)
+    return head.rstrip("\n") + "\n" + _marker(source, omitted) + "\n" + tail
+
+
+def _sample(source, chars: int) -> str:
+    windows = max(SAMPLE_MIN_WINDOWS, min(SAMPLE_MAX_WINDOWS, chars // SAMPLE_WINDOW_CHARS))
+    header = f"[Lines sampled from {windows} evenly spaced parts of {source.amount(source.size)}]\n"
+    # Each window may get a newline added after its last line
+    per_window = (chars - len(header)) // windows - len(SAMPLE_GAP) - 1
+    parts = [header]
+    for window in range(windows):
+        start = window * (source.size - per_window) // (windows - 1)
+        if start == 0:
+            text, end = source.forward(0, per_window)
+        else:
+            # Start one position early to tell whether `start` begins a line
+            text, end = source.forward(start - 1, per_window + 1)
+            newline = text.find("\n")
+            text = text[newline + 1:] if newline != -1 else text
+        kept = _cut_head(text, per_window, end < source.size)
+        if window:
+            parts.append(SAMPLE_GAP)
+        parts.append(kept if kept.endswith("\n") or window == windows - 1 else kept + "\n")
+    return "".join(parts)
+
+
+CUTS = {"head": _head, "tail": _tail, "head+tail": _head_tail, "sample": _sample}
+
+
+def _truncate(source, spec: Truncation) -> str:
+    # Markers are part of the budget
+    reserve = MARKER_RESERVE * (2 if spec.mode == "head+tail" else 1)
+    return CUTS[spec.mode](source, spec.max_chars - reserve)
+
+
+def truncate_text(text: str, spec: Truncation) -> str:
+    """`text` cut down to the budget of `spec`"""
+    if len(text) <= spec.max_chars:
+        return text
+    return _truncate(_TextSource(text), spec)
+
+
+def read_truncated(path: str, spec: Truncation, size: int, token=None) -> str:
+    """
+    Read the part of a UTF-8 file kept by `spec`. Raises LoadCancelled if the
+    loader `token` is cancelled while reading.
+    """
+    if size <= spec.max_chars * MAX_CHAR_BYTES + MARKER_RESERVE:
+        # Small enough that the kept parts could overlap, cut in memory
+        with open(path, "rb") as f:
+            text = _decode(_FileSource(f, size, token).read(0, size), True, True)
+        return truncate_text(text, spec)
+    with open(path, "rb") as f:
+        return _truncate(_FileSource(f, size, token), spec)
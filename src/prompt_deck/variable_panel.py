@@ -0,0 +1,125 @@
+from PyQt6.QtWidgets import (QWidget, QFormLayout, QLineEdit, QSpinBox, QDoubleSpinBox,
+                             QCheckBox, QComboBox, QLabel)
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QFont
+
+from typing import Any, Dict
+
+from .styles import FONT_FAMILY, name_input_style
+from .templating import TemplateVariable
+
+
+class VariablePanel(QWidget):
+    """
+    Shows one editor per template variable found in the deck.
+
+    Editors are typed: spin boxes for int/float, a checkbox for bool and a
+    combo box for choice variables. Values survive variables disappearing
+    and reappearing, so deleting a placeholder by accident doesn't lose them.
+    """
+
+    # Emitted whenever any variable value changes
+    valuesChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.values: Dict[str, Any] = {}
+        self.variables: Dict[str, TemplateVariable] = {}
+        self.editors: Dict[str, QWidget] = {}
+
+        self.form = QFormLayout(self)
+        self.form.setContentsMargins(0, 4, 0, 0)
+        self.form.setSpacing(4)
+        self.setVisible(False)
+
+    def set_values(self, values: Dict[str, Any]):
+        """Set values (e.g. from saved state) without emitting valuesChanged"""
+        self.values = dict(values)
+        for name, editor in self.editors.items():
+            self._write_editor(editor, self.variables[name], self.values.get(name))
+
+    def set_variables(self, variables: Dict[str, TemplateVariable]):
+        """Rebuild the editors if the set or types of variables changed"""
+        signature = [(v.name, v.type, v.default, v.choices) for v in variables.values()]
+        current = [(v.name, v.type, v.default, v.choices) for v in self.variables.values()]
+        if signature == current:
+            return
+
+        while self.form.rowCount():
+            self.form.removeRow(0)
+        self.editors = {}
+        self.variables = dict(variables)
+
+        for name, variable in self.variables.items():
+            editor = self._create_editor(variable)
+            self._write_editor(editor, variable, self.values.get(name))
+            if variable.type != "str" and self.values.get(name) in (None, ""):
+                # Typed editors always show a value, so render what is shown
+                self.values[name] = self._read_editor(editor)
+            label = QLabel(name)
+            label.setFont(QFont(FONT_FAMILY, 9))
+            label.setStyleSheet("color: #2c3e50;")
+            self.form.addRow(label, editor)
+            self.editors[name] = editor
+
+        self.setVisible(bool(self.variables))
+
+    def _create_editor(self, variable: TemplateVariable) -> QWidget:
+        name = variable.name
+        if variable.type == "int":
+            editor = QSpinBox()
+            editor.setRange(-2**31, 2**31 - 1)
+            editor.valueChanged.connect(lambda value, n=name: self._on_edited(n, value))
+        elif variable.type == "float":
+            editor = QDoubleSpinBox()
+            editor.setRange(-1e12, 1e12)
+            editor.setDecimals(4)
+            editor.valueChanged.connect(lambda value, n=name: self._on_edited(n, value))
+        elif variable.type == "bool":
+            editor = QCheckBox()
+            editor.toggled.connect(lambda value, n=name: self._on_edited(n, value))
+        elif variable.type == "choice":
+            editor = QComboBox()
+            editor.addItems(list(variable.choices))
+            editor.currentTextChanged.connect(lambda value, n=name: self._on_edited(n, value))
+        else:
+            editor = QLineEdit()
+            editor.setStyleSheet(name_input_style)
+            if variable.default is not None:
+                editor.setPlaceholderText(variable.default)
+            editor.textChanged.connect(lambda value, n=name: self._on_edited(n, value))
+        editor.setFont(QFont(FONT_FAMILY, 9))
+        return editor
+
+    def _write_editor(self, editor: QWidget, variable: TemplateVariable, value: Any):
+        """Show `value` (or the variable's default) in an editor without feedback"""
+        if value is None or value == "":
+            value = variable.default if variable.type != "str" else value
+        value = variable.coerce(value)
+
+        editor.blockSignals(True)
+        try:
+            if isinstance(editor, (QSpinBox, QDoubleSpinBox)):
+                editor.setValue(value if value is not None else 0)
+            elif isinstance(editor, QCheckBox):
+                editor.setChecked(bool(value))
+            elif isinstance(editor, QComboBox):
+                index = editor.findText(str(value)) if value is not None else -1
+                editor.setCurrentIndex(max(index, 0))
+            else:
+                editor.setText("" if value is None else str(value))
+        finally:
+            editor.blockSignals(False)
+
+    def _read_editor(self, editor: QWidget) -> Any:
+        if isinstance(editor, (QSpinBox, QDoubleSpinBox)):
+            return editor.value()
+        if isinstance(editor, QCheckBox):
+            return editor.isChecked()
+        if isinstance(editor, QComboBox):
+            return editor.currentText()
+        return editor.text()
+
+    def _on_edited(self, name: str, value: Any):
+        self.values[name] = value
+        self.valuesChanged.emit()
@@ -0,0 +1,23 @@
+from prompt_deck.compaction import strip_comments, strip_license_header
+
+
+def test_regex_literal_is_not_a_comment():
+    text = 'const re = /\\/*foo/;\nlet a = 1; // c\nconst u = "http://x";\n/* block */\nlet b = 2;\n'
+    assert strip_comments(text, "c") == 'const re = /\\/*foo/;\nlet a = 1;\nconst u = "http://x";\nlet b = 2;\n'
+
+
+def test_division_is_not_a_regex():
+    assert strip_comments("int x = a / b; /* c */ int y = 4 / 2; // d\n", "c") == "int x = a / b;  int y = 4 / 2;\n"
+
+
+def test_license_header_is_stripped():
+    text = "/*\n * Copyright (c) 2020 Someone\n * Permission is hereby granted, free of charge...\n */\nint f();\n"
+    assert strip_license_header(text, "c") == "int f();\n"
+    assert strip_license_header("# SPDX-License-Identifier: MIT\n# Copyright © 2021 A\nx = 1\n", "python") == "x = 1\n"
+
+
+def test_comment_mentioning_a_license_is_kept():
+    text = "// This function's license check\nint f();\n"
+    assert strip_license_header(text, "c") == text
+    text = "// Validate the license key\n// and fail without a warranty\nint f();\n"
+    assert strip_license_header(text, "c") == text
@@ -0,0 +1,9 @@
+from prompt_deck.file_cache import FileCache
+
+
+def test_html_is_read_verbatim_unless_extraction_is_asked_for(tmp_path):
+    page = tmp_path / "page.html"
+    page.write_text("<html><body><script>x = 1;</script><p>Hello</p></body></html>\n")
+    cache = FileCache()
+    assert cache.read(str(page))[0].startswith("<html>")
+    assert cache.read(str(page), opt_in=True)[0].strip() == "Hello"
@@ -0,0 +1,7 @@
+from prompt_deck.redaction import redact
+
+
+def test_generic_secret_needs_a_random_value():
+    assert redact('password = "hunter2!"')[1] == {"password": 1}
+    assert redact("token_count: max_length_tokens")[1] == {}
+    assert redact("max_tokens = 12345678")[1] == {}
@@ -0,0 +1,13 @@
+from prompt_deck.templating import collect_variables, render_template
+
+
+def test_default_applies_to_every_source():
+    sources = ["Hi {{name=bob}}", "Context for {{name}}"]
+    declared = collect_variables(sources)
+    assert render_template(sources[1], {}, declared) == "Context for bob"
+    assert render_template(sources[1], {"name": "al"}, declared) == "Context for al"
+
+
+def test_escaped_braces_are_kept():
+    assert render_template("{{ title }} and \\{{name}}", {"title": "x"}) == "x and {{name}}"
+    assert not collect_variables(["\\{{name}}"])